@@ -0,0 +1,158 @@
+"""Cálculos do dashboard (shares, coeficiente de concentração, evolução e saldo).
+
+Funções puras sobre DataFrames com as colunas já renomeadas para o padrão da
+API (``year``, ``monthNumber``, ``coNcm``, ``metricFOB``...). Não dependem do
+Streamlit, então podem ser testadas e perfiladas isoladamente.
+"""
+import numpy as np
+import pandas as pd
+
+from armazenamento import nomes_por_codigo
+
+RESOLUCOES = {'Mensal': 'M', 'Trimestral': 'Q', 'Anual': 'Y'}
+LIMITES_RESOLUCAO = [(60, 'Mensal'), (180, 'Trimestral')]
+
+
+def datas_mensais(anos, meses) -> np.ndarray:
+    """Primeiro dia de cada (ano, mês), calculado em inteiros sem passar por strings."""
+    meses_desde_1970 = (np.asarray(anos, dtype='int64') - 1970) * 12 + np.asarray(meses, dtype='int64') - 1
+    return meses_desde_1970.astype('datetime64[M]').astype('datetime64[ns]')
+
+
+def adicionar_data(df, coluna_ano='year', coluna_mes='monthNumber', destino='Data'):
+    df[destino] = datas_mensais(df[coluna_ano], df[coluna_mes])
+    return df
+
+
+def evolucao_mensal(df, coluna_valor='metricFOB', coluna_ano='year', coluna_mes='monthNumber') -> pd.DataFrame:
+    """Soma por mês; a data é montada só sobre as linhas já agregadas."""
+    if df.empty:
+        return pd.DataFrame({'Data': pd.Series(dtype='datetime64[ns]'), coluna_valor: pd.Series(dtype='float64')})
+    mensal = df.groupby([coluna_ano, coluna_mes], observed=True, sort=True)[coluna_valor].sum().reset_index()
+    return pd.DataFrame({'Data': datas_mensais(mensal[coluna_ano], mensal[coluna_mes]), coluna_valor: mensal[coluna_valor].to_numpy()})
+
+
+def resolucao_automatica(ano_inicio, mes_inicio, ano_fim, mes_fim):
+    """Resolução da série temporal conforme o tamanho do período (até 5 anos mensal, até 15 trimestral)."""
+    meses = (ano_fim - ano_inicio) * 12 + mes_fim - mes_inicio + 1
+    for limite, resolucao in LIMITES_RESOLUCAO:
+        if meses <= limite:
+            return resolucao
+    return 'Anual'
+
+
+def agregar_por_periodo(df, resolucao, coluna_data='Data') -> pd.DataFrame:
+    """Soma as colunas numéricas de uma série mensal por trimestre ou ano (início do período)."""
+    if resolucao == 'Mensal' or df.empty:
+        return df
+    inicio = df[coluna_data].dt.to_period(RESOLUCOES[resolucao]).dt.start_time.rename(coluna_data)
+    return df.drop(columns=[coluna_data]).groupby(inicio, sort=True).sum(numeric_only=True).reset_index()
+
+
+def percentual(numerador, denominador):
+    """numerador / denominador * 100, com 0 onde o denominador não é positivo."""
+    numerador = np.asarray(numerador, dtype='float64')
+    denominador = np.asarray(denominador, dtype='float64')
+    return np.divide(numerador * 100, denominador, out=np.zeros_like(numerador), where=denominador > 0)
+
+
+def indicadores_por_produto(df_pais, df_mundo, mapa_cod_para_ncm) -> pd.DataFrame:
+    """Share na pauta e coeficiente de concentração de cada NCM."""
+    df_final_shares = (
+        pd.to_numeric(df_pais['metricFOB'], errors='coerce')
+        .groupby(df_pais['coNcm'], observed=True).sum()
+        .rename('Valor FOB País').reset_index()
+    )
+    df_final_shares['Produto'] = nomes_por_codigo(df_final_shares['coNcm'], mapa_cod_para_ncm, usar_codigo_ausente=True)
+    valor_total_pais = df_final_shares['Valor FOB País'].sum()
+    df_final_shares['Share na Pauta (%)'] = percentual(df_final_shares['Valor FOB País'], np.full(len(df_final_shares), valor_total_pais))
+
+    if df_mundo is not None and not df_mundo.empty:
+        total_mundo = pd.to_numeric(df_mundo['metricFOB'], errors='coerce').groupby(df_mundo['coNcm'], observed=True).sum()
+        # Alinhamento pelo código (vale para categorias distintas nos dois lados)
+        total_mundo.index = total_mundo.index.astype(str)
+        df_final_shares['Valor FOB Mundo'] = total_mundo.reindex(df_final_shares['coNcm'].astype(str)).fillna(0).to_numpy()
+        df_final_shares['Coeficiente de Concentração de Produtos (%)'] = percentual(
+            df_final_shares['Valor FOB País'], df_final_shares['Valor FOB Mundo'])
+    return df_final_shares
+
+
+def calcular_indicadores(df_pais, df_mundo, mapa_cod_para_ncm, df_mensal=None) -> dict:
+    """Agregados da análise de Exportação/Importação: evolução mensal, total e indicadores por produto.
+
+    ``df_pais`` e ``df_mundo`` já devem estar filtrados por produto; ``df_mensal``
+    é opcional e permite montar a evolução a partir de um rollup sem NCM.
+    """
+    evolucao = evolucao_mensal(df_pais if df_mensal is None else df_mensal)
+    return {
+        'vazio': df_pais.empty,
+        'evolucao': evolucao,
+        'total': evolucao['metricFOB'].sum(),
+        'shares': indicadores_por_produto(df_pais, df_mundo, mapa_cod_para_ncm),
+    }
+
+
+def preparar_saldo(df_raw, mapa_cod_para_ncm) -> pd.DataFrame:
+    """Renomeia e formata o DataFrame (já filtrado por produto) para a análise de saldo."""
+    if df_raw is None or df_raw.empty:
+        return pd.DataFrame()
+
+    df_final = df_raw.rename(columns={'metricFOB': 'Valor FOB (US$)', 'year': 'Ano', 'monthNumber': 'Mês', 'state': 'UF'})
+    if 'coNcm' in df_final.columns:
+        df_final['Produto'] = nomes_por_codigo(df_final['coNcm'], mapa_cod_para_ncm, usar_codigo_ausente=True)
+        df_final = df_final.drop(columns=['ncm'], errors='ignore')
+    df_final['Valor FOB (US$)'] = pd.to_numeric(df_final['Valor FOB (US$)'], errors='coerce')
+    return adicionar_data(df_final, 'Ano', 'Mês')
+
+
+def _soma_ou_vazio(df, chaves, nome):
+    if df.empty:
+        return pd.Series(dtype='float64', name=nome)
+    return df.groupby(chaves, observed=True)['Valor FOB (US$)'].sum().rename(nome)
+
+
+def evolucao_saldo(df_exp, df_imp) -> pd.DataFrame:
+    """Exportação, importação e saldo por mês."""
+    df_evolucao = pd.concat([_soma_ou_vazio(df_exp, 'Data', 'Exportação'),
+                             _soma_ou_vazio(df_imp, 'Data', 'Importação')], axis=1).fillna(0)
+    df_evolucao['Saldo'] = df_evolucao['Exportação'] - df_evolucao['Importação']
+    df_evolucao.index.name = 'Data'
+    return df_evolucao.sort_index().reset_index()
+
+
+def saldo_por_produto(df_exp, df_imp, rotulos=('Exportação', 'Importação', 'Saldo')) -> pd.DataFrame:
+    """Exportação, importação e saldo por NCM."""
+    exportacao, importacao, saldo = rotulos
+    chaves = ['coNcm', 'Produto']
+    if df_exp.empty and df_imp.empty:
+        return pd.DataFrame({coluna: pd.Series(dtype='object' if coluna in chaves else 'float64')
+                             for coluna in chaves + [exportacao, importacao, saldo]})
+    df_exp_produto = _soma_ou_vazio(df_exp, chaves, exportacao)
+    df_imp_produto = _soma_ou_vazio(df_imp, chaves, importacao)
+    # Códigos categóricos com categorias diferentes em cada fluxo são alinhados como texto
+    for serie in (df_exp_produto, df_imp_produto):
+        if isinstance(serie.index, pd.MultiIndex):
+            serie.index = pd.MultiIndex.from_arrays([serie.index.get_level_values(nivel).astype(str) for nivel in chaves], names=chaves)
+    df_saldo_produto = pd.concat([df_exp_produto, df_imp_produto], axis=1).fillna(0)
+    df_saldo_produto[saldo] = df_saldo_produto[exportacao] - df_saldo_produto[importacao]
+    df_saldo_produto.index.names = chaves
+    return df_saldo_produto.reset_index()
+
+
+def calcular_saldo(df_exp_produto, df_imp_produto, df_exp_mensal=None, df_imp_mensal=None) -> dict:
+    """Todos os agregados da análise de saldo de uma só vez.
+
+    Recebe as saídas de ``preparar_saldo`` por produto e, opcionalmente, por
+    mês (quando vêm de um rollup menor). Devolve a evolução mensal, o saldo
+    por produto e os totais, prontos para as abas do dashboard.
+    """
+    df_exp_mensal = df_exp_produto if df_exp_mensal is None else df_exp_mensal
+    df_imp_mensal = df_imp_produto if df_imp_mensal is None else df_imp_mensal
+    df_evolucao = evolucao_saldo(df_exp_mensal, df_imp_mensal)
+    valor_export, valor_import = df_evolucao['Exportação'].sum(), df_evolucao['Importação'].sum()
+    return {
+        'vazio': df_exp_produto.empty and df_imp_produto.empty,
+        'evolucao': df_evolucao,
+        'por_produto': saldo_por_produto(df_exp_produto, df_imp_produto),
+        'totais': {'Exportação': valor_export, 'Importação': valor_import, 'Saldo': valor_export - valor_import},
+    }
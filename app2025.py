@@ -1,17 +1,24 @@
 import streamlit as st
 import pandas as pd
-import requests
 import warnings
-import plotly.express as px
-import plotly.graph_objects as go
 import re
 from datetime import datetime
 import os
-import zipfile 
+from armazem_compartilhado import ArmazemDados
+from cache_resultados import CacheResultados, gerar_chave
+from consultas import Consultas
+import analise
+import armazenamento
+import graficos
+import instrumentacao
+import referencias
+import sincronizacao
+import tabelas
+from indice_ncm import normalizar_termos
 
 ## Config Inicial
-warnings.filterwarnings("ignore", category=requests.packages.urllib3.exceptions.InsecureRequestWarning)
-BASE_URL = "https://api-comexstat.mdic.gov.br"
+# InsecureRequestWarning do urllib3, filtrado pela mensagem para não importar requests a cada início
+warnings.filterwarnings("ignore", message="Unverified HTTPS request")
 ANO_ATUAL = datetime.now().year
 
 try:
@@ -19,106 +26,143 @@ try:
 except NameError: # Ocorre quando executado interativamente
     DIRETORIO_ATUAL = os.getcwd()
 DIRETORIO_DADOS = os.path.join(DIRETORIO_ATUAL, "dados")
-CAMINHO_NCM_TARIFADOS = os.path.join(DIRETORIO_DADOS, "lista_ncm_tarifados.csv")
+CAMINHO_NCM_TARIFADOS = os.path.join(DIRETORIO_DADOS, referencias.NOME_NCM_TARIFADOS)
+DIRETORIO_CACHE = os.environ.get("COMEX_CACHE_DIR", os.path.join(DIRETORIO_ATUAL, "cache"))
+LIMITE_CACHE_MEMORIA_MB = int(os.environ.get("COMEX_CACHE_MEMORIA_MB", 512))
+LIMITE_CACHE_DISCO_MB = int(os.environ.get("COMEX_CACHE_DISCO_MB", 2048))
+# Instrumentação: log JSON Lines das etapas e painel de desempenho na barra lateral
+CAMINHO_LOG_DESEMPENHO = os.environ.get("COMEX_LOG_DESEMPENHO")
+PAINEL_DESEMPENHO = os.environ.get("COMEX_PAINEL_DESEMPENHO", "0") == "1"
 
 st.set_page_config(
     page_title="Dashboard de Análise de Impacto",
     layout="wide",
     initial_sidebar_state="expanded"
 )
+if CAMINHO_LOG_DESEMPENHO:
+    instrumentacao.configurar_log(CAMINHO_LOG_DESEMPENHO)
+instrumentacao.iniciar_execucao()
 
 # 1. FUNÇÕES DE CARREGAMENTO E PROCESSAMENTO ---
-@st.cache_data
-def carregar_tabelas_auxiliares(diretorio_dados):
+# cache_resource devolve o mesmo objeto a todas as sessões (sem pickle/cópia); os resultados não devem ser alterados
+@st.cache_resource
+def obter_referencias(diretorio_dados):
+    """Mapas, listas da barra lateral e índice de NCM, montados uma vez por processo (ver ``referencias``)."""
     try:
-        df_paises = pd.read_csv(os.path.join(diretorio_dados, "PAIS.csv"), sep=';', encoding='latin-1', dtype={'CO_PAIS': str})
-        df_ufs = pd.read_csv(os.path.join(diretorio_dados, "UF.csv"), sep=';', encoding='latin-1', dtype={'CO_UF': str})
-        df_ncm = pd.read_csv(os.path.join(diretorio_dados, "NCM.csv"), sep=';', encoding='latin-1', dtype={'CO_NCM': str})
-
-        # Filtros para limpar os dados
-        df_paises = df_paises[~df_paises['NO_PAIS'].isin(['Bancos Centrais', 'A Designar'])]
-        ufs_validas = [
-            'AC', 'AL', 'AP', 'AM', 'BA', 'CE', 'DF', 'ES', 'GO', 'MA', 
-            'MT', 'MS', 'MG', 'PA', 'PB', 'PR', 'PE', 'PI', 'RJ', 'RN', 
-            'RS', 'RO', 'RR', 'SC', 'SP', 'SE', 'TO'
-        ]
-        df_ufs = df_ufs[df_ufs['SG_UF'].isin(ufs_validas)]
-        return df_paises, df_ufs, df_ncm
+        return referencias.carregar(diretorio_dados)
     except FileNotFoundError as e:
         st.error(f"Erro: Arquivo auxiliar não encontrado no diretório 'dados'. Detalhe: {e}")
         st.stop()
 
-@st.cache_data
-def carregar_ncm_tarifados(caminho_arquivo):
-    try:
-        df = pd.read_csv(caminho_arquivo, dtype={'CO_NCM': str})
-        return set(df['CO_NCM'])
-    except FileNotFoundError:
-        st.warning(f"Arquivo do Monitor de Tarifados não encontrado: {caminho_arquivo}")
-        return set()
-
-@st.cache_data
-def carregar_dados_locais(tipo_fluxo: str, arquivo_sufixo: str):
-    nome_arquivo = f"{tipo_fluxo.lower()}_{arquivo_sufixo}.parquet"
-    caminho_completo = os.path.join(DIRETORIO_DADOS, nome_arquivo)
+@st.cache_resource
+def dados_verificados(diretorio_dados):
+    # A conferência da pasta pelo manifesto roda uma vez por processo, não a cada rerun
+    return sincronizacao.dados_completos(diretorio_dados)
+
+@st.cache_resource
+def obter_armazem(diretorio_dados):
+    return ArmazemDados(diretorio_dados)
+
+@st.cache_resource
+def obter_cache():
+    return CacheResultados(DIRETORIO_CACHE, LIMITE_CACHE_MEMORIA_MB, LIMITE_CACHE_DISCO_MB)
+
+def executar_consulta(consulta, *argumentos):
+    """Roda uma consulta do pipeline; sem os arquivos de dados, mostra o erro e interrompe o script."""
     try:
-        return pd.read_parquet(caminho_completo)
-    except FileNotFoundError:
-        st.error(f"Arquivo de dados '{nome_arquivo}' não encontrado. Verifique se os scripts de pré-processamento foram executados.")
+        return consulta(*argumentos)
+    except FileNotFoundError as erro:
+        st.error(f"Dados não encontrados ({erro}). Verifique se os scripts de pré-processamento foram executados.")
         st.stop()
 
-# Função auxiliar para processar dados de Saldo Comercial
-def processar_df_saldo(df_raw, lista_ncm_filtro):
-    """Filtra, renomeia e formata o DataFrame para a análise de saldo."""
-    if df_raw is None or df_raw.empty:
-        return pd.DataFrame()
-    
-    df_filtrado = df_raw.copy()
-    if lista_ncm_filtro:
-        df_filtrado = df_filtrado[df_filtrado['coNcm'].isin(lista_ncm_filtro)]
-    
-    if not df_filtrado.empty:
-        df_filtrado['ncm'] = df_filtrado['ncm'].fillna(df_filtrado['coNcm'])
-        df_final = df_filtrado.rename(columns={'ncm': 'Produto', 'metricFOB': 'Valor FOB (US$)', 'year': 'Ano', 'monthNumber': 'Mês', 'state': 'UF'})
-        df_final['Valor FOB (US$)'] = pd.to_numeric(df_final['Valor FOB (US$)'], errors='coerce')
-        df_final['Data'] = pd.to_datetime(df_final['Ano'].astype(str) + '-' + df_final['Mês'].astype(str))
-        return df_final
-    return pd.DataFrame()
-
-@st.cache_data
-def convert_df_to_csv(df):
-    df_to_save = df.copy()
-    if 'Data' in df_to_save.columns:
-        df_to_save['Data'] = df_to_save['Data'].dt.strftime('%Y-%m-%d')
-    return df_to_save.to_csv(index=False, sep=';', decimal=',', encoding='utf-8-sig')
-def baixar_e_descompactar_dados(url_dados):
-    caminho_zip = "dados.zip"
-    if not os.path.exists(DIRETORIO_DADOS):
+def obter_indicadores(resultado):
+    return executar_consulta(consultas.indicadores, resultado)
+
+def obter_saldo(resultado):
+    return executar_consulta(consultas.saldo, resultado)
+
+def extrair_lista_ncm(texto):
+    return [ncm.strip() for ncm in re.split(r'[,\n\s]+', texto or '') if ncm.strip()]
+
+def exibir_figura(nome, chave, montar):
+    """Exibe a figura, montada uma vez por resultado (e resolução) e reaproveitada entre reruns e sessões."""
+    with instrumentacao.etapa('renderizar', grafico=nome):
+        st.plotly_chart(obter_cache().obter(gerar_chave('figura', nome, chave), montar), use_container_width=True)
+
+def escolher_resolucao(resultado, chave_widget):
+    """Resolução automática da série pelo tamanho do período, com opção de detalhar por mês."""
+    automatica = analise.resolucao_automatica(*resultado['periodo'])
+    if automatica != 'Mensal' and st.toggle(f"Detalhar por mês (série {automatica.lower()} por padrão)", key=chave_widget):
+        return 'Mensal'
+    return automatica
+
+def exibir_tabela(df, chave, nome, ordenacao, coluna_padrao, nome_arquivo, formatar=None, posicoes=None):
+    """Tabela paginada e ordenada no servidor, com exportação do resultado inteiro em blocos.
+
+    ``chave`` identifica o conteúdo de ``df`` no cache; ``nome`` prefixa as
+    chaves dos widgets. Só a página visível é formatada e enviada ao navegador.
+    Com ``posicoes`` (função que devolve as linhas da análise), ``df`` são os
+    ``Lotes`` de onde as linhas são copiadas.
+    """
+    col_ordem, col_direcao, col_tamanho, col_pagina = st.columns(4)
+    coluna = col_ordem.selectbox("Ordenar por", list(ordenacao), index=list(ordenacao).index(coluna_padrao), key=f"{nome}_ordem")
+    decrescente = col_direcao.toggle("Decrescente", value=True, key=f"{nome}_decrescente")
+    tamanho = col_tamanho.selectbox("Linhas por página", tabelas.TAMANHOS_PAGINA, key=f"{nome}_tamanho")
+    ordem = obter_cache().obter(gerar_chave('ordem', chave, coluna, decrescente), lambda: tabelas.ordenar(
+        df, ordenacao[coluna], ascendente=not decrescente, posicoes=posicoes() if posicoes else None))
+    total = len(ordem)
+    if not total:
+        st.info("Nenhum dado para exibir.")
+        return
+    paginas = max(1, -(-total // tamanho))
+    numero = col_pagina.number_input(f"Página (de {paginas:,})", min_value=1, max_value=paginas, value=1, key=f"{nome}_pagina")
+
+    with instrumentacao.etapa('renderizar', total, tabela=nome) as registro:
+        df_pagina = tabelas.pagina(df, ordem, numero, tamanho, formatar)
+        st.dataframe(df_pagina, hide_index=True, use_container_width=True)
+        registro['linhas_saida'] = len(df_pagina)
+    inicio = (numero - 1) * tamanho
+    st.caption(f"Linhas {inicio + 1:,}–{min(inicio + tamanho, total):,} de {total:,}")
+
+    col_formato, col_botao = st.columns([3, 1])
+    formato = col_formato.radio("Formato do download", list(tabelas.FORMATOS), horizontal=True, key=f"{nome}_formato")
+    extensao = tabelas.FORMATOS[formato]['extensao']
+    # O arquivo é gerado sob demanda, em blocos, e reaproveitado por outras sessões com o mesmo recorte.
+    # O Streamlit lê o arquivo inteiro para a memória ao criar o botão de download, então ele só é
+    # oferecido no rerun em que foi pedido; clicar nele não provoca outro rerun (on_click="ignore").
+    if col_botao.button("Preparar download", key=f"{nome}_preparar", use_container_width=True):
+        caminho = obter_cache().obter_arquivo(
+            gerar_chave('exportacao', chave, coluna, decrescente, formato), extensao,
+            lambda caminho: tabelas.exportar(df, ordem, formato, caminho, formatar))
+        with open(caminho, 'rb') as arquivo:
+            st.download_button(f"📥 Baixar {formato}", arquivo, f"{nome_arquivo}.{extensao}", tabelas.FORMATOS[formato]['mime'],
+                               key=f"{nome}_baixar", on_click="ignore")
+        st.caption("O botão de download vale até a próxima interação com a página.")
+def preparar_dados(url_manifesto, url_dados_zip):
+    if not dados_verificados(DIRETORIO_DADOS):
         st.info(f"Preparando o ambiente pela primeira vez. Isso pode levar alguns minutos...")
-        with st.spinner(f"Baixando arquivos de dados..."):
-            # Baixar o arquivo
-            with requests.get(url_dados, stream=True) as r:
-                r.raise_for_status()
-                with open(caminho_zip, 'wb') as f:
-                    for chunk in r.iter_content(chunk_size=8192):
-                        f.write(chunk)
-        
-        with st.spinner("Descompactando arquivos..."):
-            with zipfile.ZipFile(caminho_zip, 'r') as zip_ref:
-                zip_ref.extractall(".") 
-            os.remove(caminho_zip)
+        with st.spinner(f"Baixando e verificando arquivos de dados..."):
+            # Partições, rollups e cópias IPC ficam para a thread de preparo abaixo
+            sincronizacao.sincronizar(DIRETORIO_DADOS, url_manifesto, url_dados_zip, preparar_derivados=False)
+        dados_verificados.clear()
+        obter_referencias.clear()
         st.success("Ambiente pronto! Carregando dashboard...")
+    if sincronizacao.preparar_em_segundo_plano(DIRETORIO_DADOS) is not None:
+        st.caption("Otimizando os dados em segundo plano: as consultas ficam mais rápidas quando terminar.")
 
 # 2. CARREGAMENTO INICIAL E MAPAS ---
-URL_DADOS_ZIP = "https://github.com/DaviSalva/dashcomexstat/releases/download/01.07-25/dados.zip" 
-baixar_e_descompactar_dados(URL_DADOS_ZIP)
-df_paises, df_ufs, df_ncm = carregar_tabelas_auxiliares(DIRETORIO_DADOS)
-set_ncm_tarifados = carregar_ncm_tarifados(CAMINHO_NCM_TARIFADOS)
-
-mapa_pais_para_cod = df_paises.set_index('NO_PAIS')['CO_PAIS'].to_dict()
-mapa_uf_para_cod = df_ufs.set_index('SG_UF')['CO_UF'].to_dict()
-mapa_cod_para_pais = df_paises.set_index('CO_PAIS')['NO_PAIS'].to_dict()
-mapa_cod_para_ncm = df_ncm.set_index('CO_NCM')['NO_NCM_POR'].to_dict()
+URL_RELEASE = "https://github.com/DaviSalva/dashcomexstat/releases/download/01.07-25"
+URL_MANIFESTO = f"{URL_RELEASE}/manifesto.json"
+URL_DADOS_ZIP = f"{URL_RELEASE}/dados.zip"
+# Em reruns, tudo aqui sai dos caches do processo; a etapa mede esse custo fixo de cada interação
+with instrumentacao.etapa('inicializar'):
+    preparar_dados(URL_MANIFESTO, URL_DADOS_ZIP)
+    refs = obter_referencias(DIRETORIO_DADOS)
+    if refs.ncm_tarifados is None:
+        st.warning(f"Arquivo do Monitor de Tarifados não encontrado: {CAMINHO_NCM_TARIFADOS}")
+    set_ncm_tarifados = refs.ncm_tarifados or set()
+    mapa_pais_para_cod = refs.mapa_pais_para_cod
+    consultas = Consultas(obter_armazem(DIRETORIO_DADOS), obter_cache(), refs.mapa_cod_para_pais, refs.mapa_cod_para_ncm, set_ncm_tarifados)
 
 # 3. SIDEBAR DE FILTROS ---
 with st.sidebar:
@@ -140,90 +184,59 @@ with st.sidebar:
     mes_fim = col2.selectbox("Mês Fim", range(1, 13), format_func=lambda x: f"{x:02d}", index=datetime.now().month - 1)
     
     st.divider()
-    lista_paises = ['Mundo'] + sorted(df_paises['NO_PAIS'].tolist())
+    lista_paises = refs.lista_paises
     try:
         index_eua = lista_paises.index('Estados Unidos')
     except ValueError:
         index_eua = 0
     pais_selecionado = st.selectbox("País Parceiro:", lista_paises, index=index_eua)
-    lista_ufs = ['Todos'] + sorted(df_ufs['SG_UF'].tolist())
-    uf_selecionada = st.selectbox("UF de Origem/Destino (Brasil):", lista_ufs)
+    uf_selecionada = st.selectbox("UF de Origem/Destino (Brasil):", refs.lista_ufs)
     
     st.divider()
     st.markdown("##### Filtro de Produtos (Opcional)")
-    lista_ncm_texto = st.text_area("Cole uma lista de NCMs:", height=150, help="Separe os códigos por vírgula ou quebra de linha.")
+    lista_ncm_texto = st.text_area("Cole uma lista de NCMs:", height=150, help="Separe os códigos por vírgula ou quebra de linha. Aceita NCM (8 dígitos) ou prefixos de capítulo (2), SH4 (4) e SH6 (6).")
 
-    if st.button("Analisar Período", use_container_width=True, type="primary"):
+    analise_solicitada = st.button("Analisar Período", use_container_width=True, type="primary")
+    if analise_solicitada:
         st.session_state.clear()
         if datetime(ano_inicio, mes_inicio, 1) > datetime(ano_fim, mes_fim, 1):
             st.error("A data de início não pode ser posterior à data de fim.")
             st.stop()
         
         with st.spinner("Buscando e processando dados..."):
+            termos_ncm, termos_invalidos = normalizar_termos(extrair_lista_ncm(lista_ncm_texto))
             st.session_state['resultado'] = {
                 'tipo': tipo_fluxo_label, 'uf_selecionada': uf_selecionada,
                 'lista_ncm_texto': lista_ncm_texto, 'pais_selecionado': pais_selecionado,
                 'monitor_tarifados': monitor_tarifados
             }
             
-            periodo_selecionado_inicio = datetime(ano_inicio, mes_inicio, 1)
-            periodo_selecionado_fim = datetime(ano_fim, mes_fim, 1)
-            usa_historico = periodo_selecionado_inicio <= datetime(ANO_ATUAL - 1, 12, 31)
-            usa_dados_ano_corrente = periodo_selecionado_fim >= datetime(ANO_ATUAL, 1, 1)
+            # Os dados são lidos sob demanda por consultas.recorte, do menor rollup que atende cada gráfico
+            st.session_state['resultado'].update({
+                'periodo': (ano_inicio, mes_inicio, ano_fim, mes_fim),
+                'cod_pais': mapa_pais_para_cod.get(pais_selecionado) if pais_selecionado != 'Mundo' else None,
+                'sg_uf': uf_selecionada if uf_selecionada != 'Todos' else None,
+                'lista_ncm_filtro': termos_ncm,
+                'ncm_ignorados': termos_invalidos + refs.indice_ncm.sem_correspondencia(termos_ncm),
+                'versao_dados': armazenamento.versao_dados(DIRETORIO_DADOS),
+            })
+            obter_armazem(DIRETORIO_DADOS).verificar_versao(st.session_state['resultado']['versao_dados'])
+            # A sessão guarda só os filtros; os resultados ficam no cache compartilhado
+            if tipo_fluxo_label == 'Saldo Comercial':
+                obter_saldo(st.session_state['resultado'])
+            else:
+                obter_indicadores(st.session_state['resultado'])
 
-            cod_pais = mapa_pais_para_cod.get(pais_selecionado)
-            sg_uf = uf_selecionada if uf_selecionada != 'Todos' else None
-            
-            fluxos_para_buscar = []
-            if tipo_fluxo_label in ['Exportação', 'Saldo Comercial']: fluxos_para_buscar.append('export')
-            if tipo_fluxo_label in ['Importação', 'Saldo Comercial']: fluxos_para_buscar.append('import')
-
-            for fluxo in fluxos_para_buscar:
-                df_historico_final, df_ano_corrente_final = pd.DataFrame(), pd.DataFrame()
-
-                # Processamento de dados históricos (até ANO_ATUAL - 1)
-                if usa_historico:
-                    df_hist_bruto = carregar_dados_locais(fluxo, "historico")
-                    query = f"CO_ANO >= {ano_inicio} and CO_ANO <= {ano_fim}"
-                    df_filtrado = df_hist_bruto.query(query)
-                    if pais_selecionado != 'Mundo': df_filtrado = df_filtrado[df_filtrado['CO_PAIS'] == cod_pais]
-                    if uf_selecionada != 'Todos': df_filtrado = df_filtrado[df_filtrado['SG_UF_NCM'] == sg_uf]
-                    
-                    df_historico_final = df_filtrado.rename(columns={'CO_ANO': 'year', 'CO_MES': 'monthNumber', 'CO_NCM': 'coNcm', 'CO_PAIS': 'coPais', 'SG_UF_NCM': 'state', 'VL_FOB': 'metricFOB', 'KG_LIQUIDO': 'metricKG'})
-                    df_historico_final['country'] = df_historico_final['coPais'].map(mapa_cod_para_pais)
-                    df_historico_final['ncm'] = df_historico_final['coNcm'].map(mapa_cod_para_ncm)
-
-                # Processamento de dados do ano corrente (ANO_ATUAL)
-                if usa_dados_ano_corrente:
-                    df_atual_bruto = carregar_dados_locais(fluxo, f"historico_{ANO_ATUAL}")
-                    df_filtrado_atual = df_atual_bruto
-                    if pais_selecionado != 'Mundo': df_filtrado_atual = df_filtrado_atual[df_filtrado_atual['CO_PAIS'] == cod_pais]
-                    if uf_selecionada != 'Todos': df_filtrado_atual = df_filtrado_atual[df_filtrado_atual['SG_UF_NCM'] == sg_uf]
-                    
-                    df_ano_corrente_final = df_filtrado_atual.rename(columns={'CO_ANO': 'year', 'CO_MES': 'monthNumber', 'CO_NCM': 'coNcm', 'CO_PAIS': 'coPais', 'SG_UF_NCM': 'state', 'VL_FOB': 'metricFOB', 'KG_LIQUIDO': 'metricKG'})
-                    df_ano_corrente_final['country'] = df_ano_corrente_final['coPais'].map(mapa_cod_para_pais)
-                    df_ano_corrente_final['ncm'] = df_ano_corrente_final['coNcm'].map(mapa_cod_para_ncm)
-                
-                df_final = pd.concat([df_historico_final, df_ano_corrente_final], ignore_index=True)
-                query_final = f"not ((year == {ano_inicio} and monthNumber < {mes_inicio}) or (year == {ano_fim} and monthNumber > {mes_fim}))"
-                df_final = df_final.query(query_final)
+    with st.expander("Uso de memória dos dados"):
+        st.dataframe(obter_armazem(DIRETORIO_DADOS).uso_memoria(), hide_index=True)
+        st.caption("Cache de resultados")
+        st.dataframe(pd.Series(obter_cache().estatisticas(), name='Valor'))
 
-                st.session_state['resultado'][f'df_{fluxo}'] = df_final
-            
-            # Carregamento dos totais mundiais para cálculo de coeficiente
-            if tipo_fluxo_label in ['Exportação', 'Importação']:
-                fluxo_world = 'export' if tipo_fluxo_label == 'Exportação' else 'import'
-                df_mundo_hist_final = carregar_dados_locais(fluxo_world, "world_totals")
-                query_world = f"CO_ANO >= {ano_inicio} and CO_ANO <= {ano_fim}"
-                df_mundo_hist_final = df_mundo_hist_final.query(query_world).rename(columns={'CO_ANO': 'year', 'CO_MES': 'monthNumber', 'CO_NCM': 'coNcm', 'VL_FOB_MUNDO': 'metricFOB'})
-                
-                df_mundo_atual_final = pd.DataFrame()
-                if usa_dados_ano_corrente:
-                     df_mundo_atual_final = carregar_dados_locais(fluxo_world, f"world_totals_{ANO_ATUAL}")
-                
-                df_mundo_combinado = pd.concat([df_mundo_hist_final, df_mundo_atual_final], ignore_index=True)
-                df_mundo_combinado = df_mundo_combinado.query(query_final)
-                st.session_state['resultado']['df_mundo'] = df_mundo_combinado
+    if PAINEL_DESEMPENHO:
+        with st.expander("Desempenho do pipeline"):
+            st.dataframe(instrumentacao.resumo_por_etapa(), hide_index=True)
+            st.caption("Etapas das execuções mais recentes")
+            st.dataframe(instrumentacao.etapas_recentes().iloc[::-1].head(100), hide_index=True)
 
 
 # 4. PÁGINA PRINCIPAL ---
@@ -235,8 +248,9 @@ else:
     resultado = st.session_state['resultado']
     tipo_resultado = resultado.get('tipo', 'Exportação')
     pais_selecionado = resultado.get('pais_selecionado')
-    lista_ncm_texto = resultado.get('lista_ncm_texto', '')
-    lista_ncm_filtro = [ncm.strip() for ncm in re.split(r'[,\n\s]+', lista_ncm_texto) if ncm.strip()]
+    lista_ncm_filtro = resultado['lista_ncm_filtro']
+    if resultado.get('ncm_ignorados'):
+        st.warning(f"NCMs sem correspondência (formato inválido ou código inexistente): {', '.join(resultado['ncm_ignorados'])}")
 
     tab_analise, tab_tabelas = st.tabs(["📊 Análise Gráfica", "📋 Tabelas Consolidadas"])
 
@@ -245,53 +259,27 @@ else:
         if tipo_resultado in ['Exportação', 'Importação']:
             sub_tab1, sub_tab2 = st.tabs(["Visão Geral e Evolução", "Análise Detalhada por Produto"])
             
-            df_pais_raw = resultado.get('df_export' if tipo_resultado == 'Exportação' else 'df_import', pd.DataFrame())
-            df_mundo_raw = resultado.get('df_mundo', pd.DataFrame())
+            indicadores = obter_indicadores(resultado)
             
-            # Aplicação de filtro do Monitor de Tarifados, se ativo
             if tipo_resultado == 'Exportação' and resultado.get('monitor_tarifados', False):
                 if set_ncm_tarifados:
-                    registros_antes = len(df_pais_raw)
-                    df_pais_raw = df_pais_raw[df_pais_raw['coNcm'].isin(set_ncm_tarifados)]
-                    if not df_mundo_raw.empty:
-                        df_mundo_raw = df_mundo_raw[df_mundo_raw['coNcm'].isin(set_ncm_tarifados)]
-                    st.success(f"**Monitor de Tarifados ATIVO.** Exibindo dados para **{len(df_pais_raw)}** de **{registros_antes}** registros.")
+                    registros_depois, registros_antes = indicadores['registros']
+                    st.success(f"**Monitor de Tarifados ATIVO.** Exibindo dados para **{registros_depois}** de **{registros_antes}** registros.")
                 else:
                     st.warning("Monitor de Tarifados está ativo, mas a lista de NCMs não pôde ser carregada.")
             
-            # Aplicação do filtro de NCMs do text_area
-            if lista_ncm_filtro:
-                df_pais_raw = df_pais_raw[df_pais_raw['coNcm'].isin(lista_ncm_filtro)]
-                df_pais_raw = df_pais_raw.copy()
-            
-            if df_pais_raw.empty:
+            if indicadores['vazio']:
                 st.warning("Nenhum dado encontrado para os filtros selecionados.")
             else:
-                # Cálculo shares e coeficientes
-                df_pais_raw['metricFOB'] = pd.to_numeric(df_pais_raw['metricFOB'], errors='coerce')
-                total_pais_por_produto = df_pais_raw.groupby('coNcm')['metricFOB'].sum().reset_index().rename(columns={'metricFOB': 'Valor FOB País'})
-                df_final_shares = pd.merge(total_pais_por_produto, df_ncm[['CO_NCM', 'NO_NCM_POR']], left_on='coNcm', right_on='CO_NCM', how='left').rename(columns={'NO_NCM_POR': 'Produto'})
-                df_final_shares['Produto'] = df_final_shares['Produto'].fillna(df_final_shares['coNcm'])
-                valor_total_pais_filtrado = df_final_shares['Valor FOB País'].sum()
-                df_final_shares['Share na Pauta (%)'] = (df_final_shares['Valor FOB País'] / valor_total_pais_filtrado) * 100 if valor_total_pais_filtrado > 0 else 0
-                
-                if not df_mundo_raw.empty:
-                    df_mundo_raw['metricFOB'] = pd.to_numeric(df_mundo_raw['metricFOB'], errors='coerce')
-                    total_mundo_por_produto = df_mundo_raw.groupby('coNcm')['metricFOB'].sum().reset_index().rename(columns={'metricFOB': 'Valor FOB Mundo'})
-                    df_final_shares = pd.merge(df_final_shares, total_mundo_por_produto, on='coNcm', how='left')
-                    df_final_shares['Valor FOB Mundo'] = df_final_shares['Valor FOB Mundo'].fillna(0)
-                    df_final_shares['Coeficiente de Concentração de Produtos (%)'] = df_final_shares.apply(
-                        lambda row: (row['Valor FOB País'] / row['Valor FOB Mundo']) * 100 if row['Valor FOB Mundo'] > 0 else 0,
-                        axis=1)
+                df_final_shares = indicadores['shares']
 
                 with sub_tab1:
                     st.header(f"Visão Geral: {tipo_resultado} para {pais_selecionado}")
-                    st.metric(f"Valor Total - {tipo_resultado}", f"US$ {df_pais_raw['metricFOB'].sum():,.2f}")
-                    st.subheader("Evolução Mensal (Valor FOB US$)")
-                    df_pais_raw['Data'] = pd.to_datetime(df_pais_raw['year'].astype(str) + '-' + df_pais_raw['monthNumber'].astype(str))
-                    evolucao_mensal = df_pais_raw.groupby('Data')['metricFOB'].sum().reset_index()
-                    fig_linha = px.line(evolucao_mensal, x='Data', y='metricFOB', labels={'metricFOB': 'Valor FOB (US$)'}, markers=True)
-                    st.plotly_chart(fig_linha, use_container_width=True)
+                    st.metric(f"Valor Total - {tipo_resultado}", f"US$ {indicadores['total']:,.2f}")
+                    resolucao = escolher_resolucao(resultado, 'resolucao_indicadores')
+                    st.subheader(f"Evolução {resolucao} (Valor FOB US$)")
+                    exibir_figura('evolucao', (consultas.chave_indicadores(resultado), resolucao), lambda: graficos.figura_evolucao(
+                        analise.agregar_por_periodo(indicadores['evolucao'], resolucao)))
                 
                 with sub_tab2:
                     st.header("Análise Detalhada por Produto")
@@ -307,14 +295,13 @@ else:
                     """)
                         
                         st.subheader(f"Share na Pauta Brasil-{pais_selecionado} (Top 10 Produtos)")
-                        fig_pauta = px.bar(df_top_10.sort_values('Share na Pauta (%)'), x='Share na Pauta (%)', y='Produto', orientation='h', text_auto='.2f')
-                        st.plotly_chart(fig_pauta, use_container_width=True)
+                        exibir_figura('pauta', consultas.chave_indicadores(resultado), lambda: graficos.figura_top_produtos(df_top_10, 'Share na Pauta (%)'))
                         
                         st.divider()
                         if 'Coeficiente de Concentração de Produtos (%)' in df_final_shares.columns:
                             st.subheader(f"Coeficiente de Concentração Brasil-{pais_selecionado} (Top 10)")
-                            fig_mercado = px.bar(df_top_10.sort_values('Coeficiente de Concentração de Produtos (%)'), x='Coeficiente de Concentração de Produtos (%)', y='Produto', orientation='h', text_auto='.2f')
-                            st.plotly_chart(fig_mercado, use_container_width=True)
+                            exibir_figura('mercado', consultas.chave_indicadores(resultado), lambda: graficos.figura_top_produtos(
+                                df_top_10, 'Coeficiente de Concentração de Produtos (%)'))
                     else:
                         st.info("Nenhum dado para exibir nesta aba.")
 
@@ -322,17 +309,14 @@ else:
         elif tipo_resultado == 'Saldo Comercial':
             sub_tab1, sub_tab2 = st.tabs(["Visão Geral e Evolução", "Análise de Saldo Detalhada"])
             
-            df_final_exp = processar_df_saldo(resultado.get('df_export'), lista_ncm_filtro)
-            df_final_imp = processar_df_saldo(resultado.get('df_import'), lista_ncm_filtro)
+            saldo = obter_saldo(resultado)
 
-            if df_final_exp.empty and df_final_imp.empty:
+            if saldo['vazio']:
                 st.warning("Nenhum dado encontrado para os filtros selecionados.")
             else:
                 with sub_tab1:
                     st.header(f"Visão Geral: {tipo_resultado} com {pais_selecionado}")
-                    valor_export = df_final_exp['Valor FOB (US$)'].sum()
-                    valor_import = df_final_imp['Valor FOB (US$)'].sum()
-                    saldo_total = valor_export - valor_import
+                    valor_export, valor_import, saldo_total = saldo['totais']['Exportação'], saldo['totais']['Importação'], saldo['totais']['Saldo']
                     
                     col1, col2, col3 = st.columns(3)
                     col1.metric("Exportação Total (US$)", f"{valor_export:,.2f}")
@@ -340,71 +324,35 @@ else:
                     col3.metric("Saldo Comercial (US$)", f"{saldo_total:,.2f}", 
                                 delta="Superávit" if saldo_total >= 0 else "Déficit", 
                                 delta_color="normal" if saldo_total >= 0 else "inverse")
-                    
-                    df_evolucao_exp = df_final_exp.groupby('Data')['Valor FOB (US$)'].sum().rename('Exportação')
-                    df_evolucao_imp = df_final_imp.groupby('Data')['Valor FOB (US$)'].sum().rename('Importação')
-                    df_evolucao = pd.concat([df_evolucao_exp, df_evolucao_imp], axis=1).fillna(0)
-                    df_evolucao['Saldo'] = df_evolucao['Exportação'] - df_evolucao['Importação']
-                    df_evolucao.reset_index(inplace=True)
 
                     st.subheader("Evolução Temporal - Exportação vs Importação")
-                    fig_linhas = go.Figure()
-                    fig_linhas.add_trace(go.Scatter(x=df_evolucao['Data'], y=df_evolucao['Exportação'], mode='lines+markers', name='Exportação', line=dict(color='green', width=2)))
-                    fig_linhas.add_trace(go.Scatter(x=df_evolucao['Data'], y=df_evolucao['Importação'], mode='lines+markers', name='Importação', line=dict(color='red', width=2)))
-                    fig_linhas.add_trace(go.Scatter(x=df_evolucao['Data'], y=df_evolucao['Saldo'], mode='lines+markers', name='Saldo', line=dict(color='blue', width=3, dash='dot')))
-                    fig_linhas.update_layout(xaxis_title="Período", yaxis_title="Valor FOB (US$)", hovermode='x unified')
-                    st.plotly_chart(fig_linhas, use_container_width=True)
+                    resolucao = escolher_resolucao(resultado, 'resolucao_saldo')
+                    exibir_figura('evolucao_saldo', (consultas.chave_saldo(resultado), resolucao), lambda: graficos.figura_evolucao_saldo(
+                        analise.agregar_por_periodo(saldo['evolucao'], resolucao)))
                     
                 with sub_tab2:
                     st.header("Análise de Saldo por Produto")
-                    df_exp_produto = df_final_exp.groupby(['coNcm','Produto'])['Valor FOB (US$)'].sum().rename('Exportação')
-                    df_imp_produto = df_final_imp.groupby(['coNcm','Produto'])['Valor FOB (US$)'].sum().rename('Importação')
-                    df_saldo_produto = pd.concat([df_exp_produto, df_imp_produto], axis=1).fillna(0)
-                    df_saldo_produto['Saldo'] = df_saldo_produto['Exportação'] - df_saldo_produto['Importação']
-                    df_saldo_produto.reset_index(inplace=True)
-                    
-                    df_top_15 = df_saldo_produto.reindex(df_saldo_produto['Saldo'].abs().nlargest(15).index).sort_values('Saldo')
                     st.subheader("Saldo Comercial por Produto (Top 15 com maior impacto)")
-                    fig_produto = go.Figure(go.Bar(
-                        x=df_top_15['Saldo'], y=df_top_15['Produto'], orientation='h',
-                        marker_color=['green' if s >= 0 else 'red' for s in df_top_15['Saldo']],
-                        text=[f"US$ {val:,.0f}" for val in df_top_15['Saldo']], textposition='outside'
-                    ))
-                    fig_produto.update_layout(title="Saldo por Produto (Verde = Superávit, Vermelho = Déficit)", xaxis_title="Valor FOB (US$)", yaxis_title="Produtos", height=600, showlegend=False)
-                    fig_produto.add_vline(x=0, line_dash="dash", line_color="black")
-                    st.plotly_chart(fig_produto, use_container_width=True)
+                    exibir_figura('saldo_produto', consultas.chave_saldo(resultado), lambda: graficos.figura_saldo_produto(saldo['por_produto']))
 
     with tab_tabelas:
         st.header(f"Tabela de Dados para: {tipo_resultado}")
         if tipo_resultado in ['Exportação', 'Importação']:
-            df_tabela = resultado.get('df_export' if tipo_resultado == 'Exportação' else 'df_import', pd.DataFrame())
-            if not df_tabela.empty:
-                df_display = df_tabela.copy()
-                df_display['Data'] = pd.to_datetime(df_display['year'].astype(str) + '-' + df_display['monthNumber'].astype(str))
-                colunas_map = {
-                    'coNcm': 'CO_NCM', 'year': 'Ano', 'monthNumber': 'Mês', 'ncm': 'Produto',
-                    'country': 'País', 'state': 'UF', 'metricFOB': 'Valor FOB (US$)', 'metricKG': 'Peso (KG)'
-                }
-                df_display = df_display.rename(columns=colunas_map)
-                ordem_exibicao = ['Data', 'CO_NCM', 'Produto', 'País', 'UF', 'Valor FOB (US$)', 'Peso (KG)']
-                df_display = df_display.reindex(columns=ordem_exibicao, fill_value='N/A')
-                st.dataframe(df_display.sort_values('Valor FOB (US$)', ascending=False))
-                st.download_button("📥 Baixar dados como CSV", convert_df_to_csv(df_display), f"dados_{tipo_resultado.lower()}.csv", "text/csv")
-            else:
-                st.info("Nenhum dado para exibir.")
+            fluxo_tabela = 'export' if tipo_resultado == 'Exportação' else 'import'
+            lotes = executar_consulta(consultas.lotes_tabela, resultado, fluxo_tabela)
+            exibir_tabela(lotes, consultas.chave_tabela(resultado, fluxo_tabela, lotes), 'tabela_fatos',
+                          tabelas.ordenacao_fatos(refs.mapa_cod_para_pais, refs.mapa_cod_para_ncm), 'Valor FOB (US$)',
+                          f"dados_{tipo_resultado.lower()}",
+                          formatar=lambda linhas: tabelas.formatar_fatos(linhas, refs.mapa_cod_para_pais, refs.mapa_cod_para_ncm),
+                          posicoes=lambda: consultas.posicoes_tabela(resultado, fluxo_tabela, lotes))
         
         elif tipo_resultado == 'Saldo Comercial':
-            df_exp_produto = processar_df_saldo(resultado.get('df_export'), lista_ncm_filtro)
-            df_imp_produto = processar_df_saldo(resultado.get('df_import'), lista_ncm_filtro)
-            if not df_exp_produto.empty or not df_imp_produto.empty:
-                df_exp_agrupado = df_exp_produto.groupby(['coNcm','Produto'])['Valor FOB (US$)'].sum().rename('Exportação (US$)')
-                df_imp_agrupado = df_imp_produto.groupby(['coNcm','Produto'])['Valor FOB (US$)'].sum().rename('Importação (US$)')
-                df_saldo_produto = pd.concat([df_exp_agrupado, df_imp_agrupado], axis=1).fillna(0)
-                df_saldo_produto['Saldo (US$)'] = df_saldo_produto['Exportação (US$)'] - df_saldo_produto['Importação (US$)']
-                df_saldo_produto.reset_index(inplace=True)
+            saldo = obter_saldo(resultado)
+            if not saldo['vazio']:
+                df_saldo_produto = saldo['por_produto'].rename(columns={'Exportação': 'Exportação (US$)', 'Importação': 'Importação (US$)', 'Saldo': 'Saldo (US$)'})
                 
-                st.dataframe(df_saldo_produto.sort_values('Saldo (US$)', ascending=False), use_container_width=True)
-                st.download_button("📥 Baixar tabela consolidada", convert_df_to_csv(df_saldo_produto), "saldo_comercial_consolidado.csv", 'text/csv')
+                exibir_tabela(df_saldo_produto, consultas.chave_saldo(resultado), 'tabela_saldo', {coluna: [coluna] for coluna in df_saldo_produto.columns},
+                              'Saldo (US$)', "saldo_comercial_consolidado")
             else:
                 st.info("Nenhum dado para exibir.")
     
@@ -419,4 +367,6 @@ else:
         
         **Instruções:**
         Utilize os filtros na barra lateral para ajustar o período, país, UF ou produtos específicos. Para analisar produtos específicos, cole os códigos NCM na área de texto.
-        """)
\ No newline at end of file
+        """)
+
+instrumentacao.finalizar_execucao(f"Analisar Período ({tipo_fluxo_label})" if analise_solicitada else "Rerun")
@@ -0,0 +1,181 @@
+"""Camada de dados compartilhada entre todas as sessões do dashboard.
+
+Os arquivos Arrow IPC gerados por ``armazenamento.exportar_ipc`` são abertos
+por memory-map uma única vez por processo. As tabelas resultantes apontam
+direto para as páginas do arquivo, então reruns e sessões diferentes leem os
+mesmos buffers imutáveis; só o recorte filtrado de cada consulta é copiado.
+Quando não há arquivos IPC, a consulta cai na leitura de parquet.
+
+``lotes`` vai um passo além para a tabela de fatos, que pode ter milhões de
+linhas: devolve os lotes do período sem filtrar, e o recorte vira só um
+vetor de posições, do qual cada página ou bloco copia as próprias linhas.
+"""
+import hashlib
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+import armazenamento
+
+COLUNAS_FILTRO = ['CO_ANO', 'CO_MES', 'CO_PAIS', 'SG_UF_NCM']
+
+
+def _assinatura(caminhos):
+    return tuple((caminho, info.st_ino, info.st_size, info.st_mtime_ns)
+                 for caminho, info in ((caminho, os.stat(caminho)) for caminho in caminhos))
+
+
+def _ler_estavel(caminhos, ler):
+    """Resultado de ``ler`` e a assinatura dos arquivos lidos, relendo se algum foi trocado no meio."""
+    while True:
+        antes = _assinatura(caminhos)
+        resultado = ler()
+        if _assinatura(caminhos) == antes:
+            return resultado, antes
+
+
+class Lotes:
+    """Lotes Arrow vistos como uma tabela só, endereçada pela posição da linha.
+
+    ``take`` copia apenas as linhas pedidas, lote a lote; ``Table.take``
+    juntaria antes cada coluna inteira num único bloco de memória.
+    """
+
+    def __init__(self, lotes, esquema, versao=None):
+        self.lotes = lotes
+        self.esquema = esquema
+        # Identifica os arquivos lidos: posições calculadas sobre outros lotes não valem aqui
+        self.versao = versao
+        self.limites = np.cumsum([0] + [lote.num_rows for lote in lotes])
+
+    def __len__(self):
+        return int(self.limites[-1])
+
+    def filtrar(self, filtro) -> np.ndarray:
+        """Posições das linhas que passam em ``filtro``, lendo só as colunas de filtro."""
+        colunas = [coluna for coluna in COLUNAS_FILTRO if coluna in self.esquema.names]
+        tipo = 'int32' if len(self) < 2**31 else 'int64'
+        posicoes = [np.empty(0, dtype=tipo)]
+        for inicio, lote in zip(self.limites, self.lotes):
+            linhas = pa.Table.from_batches([lote.select(colunas)])
+            linhas = linhas.append_column('_posicao', pa.array(np.arange(inicio, inicio + lote.num_rows, dtype=tipo)))
+            posicoes.append(linhas.filter(filtro)['_posicao'].to_numpy())
+        return np.concatenate(posicoes)
+
+    def take(self, posicoes, colunas=None) -> pa.Table:
+        """Linhas nas ``posicoes`` dadas, na mesma ordem; com ``colunas``, só essas colunas."""
+        posicoes = np.asarray(posicoes, dtype='int64')
+        esquema = self.esquema if colunas is None else pa.schema([self.esquema.field(coluna) for coluna in colunas])
+        numero_lote = np.searchsorted(self.limites, posicoes, side='right') - 1
+        agrupadas = np.argsort(numero_lote, kind='stable')
+        fronteiras = np.searchsorted(numero_lote[agrupadas], np.arange(len(self.lotes) + 1))
+        partes = []
+        for numero, (inicio, fim) in enumerate(zip(fronteiras[:-1], fronteiras[1:])):
+            if fim > inicio:
+                lote = self.lotes[numero] if colunas is None else self.lotes[numero].select(colunas)
+                partes.append(lote.take(pa.array(posicoes[agrupadas[inicio:fim]] - self.limites[numero])))
+        tabela = pa.Table.from_batches(partes, schema=esquema)
+        if np.any(np.diff(numero_lote) < 0):
+            # Volta da ordem por lote para a ordem pedida (só as linhas já copiadas)
+            inversa = np.empty_like(agrupadas)
+            inversa[agrupadas] = np.arange(len(agrupadas))
+            tabela = tabela.take(pa.array(inversa))
+        return tabela
+
+
+class ArmazemDados:
+    def __init__(self, diretorio_dados):
+        self.diretorio_dados = diretorio_dados
+        self._tabelas = {}
+        self._versao = None
+        self._trava = threading.Lock()
+
+    def verificar_versao(self, versao):
+        """Descarta os memory-maps abertos quando a pasta de dados foi atualizada."""
+        with self._trava:
+            if versao != self._versao:
+                self._tabelas.clear()
+                self._versao = versao
+
+    def _tabela_assinada(self, dataset, tipo_fluxo, ano):
+        """Tabela do ano (``None`` se o arquivo não existe) e a assinatura do arquivo mapeado."""
+        chave = (dataset, tipo_fluxo, ano)
+        with self._trava:
+            if chave not in self._tabelas:
+                caminho = armazenamento.caminho_ipc(self.diretorio_dados, dataset, tipo_fluxo, ano)
+                self._tabelas[chave] = (None, None)
+                if os.path.exists(caminho):
+                    self._tabelas[chave] = _ler_estavel(
+                        [caminho], lambda: pa.ipc.open_file(pa.memory_map(caminho, 'r')).read_all())
+            return self._tabelas[chave]
+
+    def _tabela_ano(self, dataset, tipo_fluxo, ano):
+        return self._tabela_assinada(dataset, tipo_fluxo, ano)[0]
+
+    def tem_ipc(self, dataset, tipo_fluxo):
+        return os.path.isdir(armazenamento.diretorio_ipc(self.diretorio_dados, dataset, tipo_fluxo))
+
+    def escolher_dataset(self, tipo_fluxo, dimensoes):
+        """Menor rollup gerado que contém as dimensões pedidas; senão, os fatos brutos."""
+        for nome, dimensoes_rollup in armazenamento.ROLLUPS.items():
+            if set(dimensoes) <= set(dimensoes_rollup) and (
+                    self.tem_ipc(nome, tipo_fluxo)
+                    or os.path.isdir(armazenamento.caminho_dataset(self.diretorio_dados, nome, tipo_fluxo))):
+                return nome
+        return 'fatos'
+
+    def _tabelas_periodo(self, dataset, tipo_fluxo, ano_inicio, ano_fim, assinadas=False):
+        if not self.tem_ipc(dataset, tipo_fluxo):
+            return []
+        tabelas = [self._tabela_assinada(dataset, tipo_fluxo, ano) for ano in range(ano_inicio, ano_fim + 1)]
+        return [tabela if assinadas else tabela[0] for tabela in tabelas if tabela[0] is not None]
+
+    def consultar(self, dataset, tipo_fluxo, ano_inicio, mes_inicio, ano_fim, mes_fim,
+                  cod_pais=None, sg_uf=None, colunas=None) -> pd.DataFrame:
+        tabelas = self._tabelas_periodo(dataset, tipo_fluxo, ano_inicio, ano_fim)
+        if not tabelas:
+            # Sem IPC (ou período sem dados): o parquet devolve o recorte, ainda que vazio, com o esquema certo
+            return armazenamento.ler_fatos(self.diretorio_dados, tipo_fluxo, ano_inicio, mes_inicio, ano_fim, mes_fim,
+                                           cod_pais, sg_uf, colunas=colunas, dataset=dataset)
+        filtro = armazenamento.filtro_consulta(ano_inicio, mes_inicio, ano_fim, mes_fim, cod_pais, sg_uf)
+        tabela = pa.concat_tables(tabelas).filter(filtro)
+        if colunas is not None:
+            tabela = tabela.select(colunas)
+        return tabela.to_pandas()
+
+    def lotes(self, dataset, tipo_fluxo, ano_inicio, mes_inicio, ano_fim, mes_fim, cod_pais=None, sg_uf=None) -> Lotes:
+        """Lotes que contêm o recorte; as linhas dele saem de ``Lotes.filtrar`` com o mesmo filtro.
+
+        Com IPC são os lotes dos memory-maps dos anos do período, sem cópia. Sem
+        IPC, o recorte é lido do parquet a cada chamada. A ``versao`` dos lotes
+        vem dos arquivos efetivamente lidos (e, no parquet, também do filtro).
+        """
+        assinadas = self._tabelas_periodo(dataset, tipo_fluxo, ano_inicio, ano_fim, assinadas=True)
+        if assinadas:
+            tabelas = [tabela for tabela, _ in assinadas]
+            origem = ('ipc', [assinatura for _, assinatura in assinadas])
+        else:
+            arquivos = armazenamento.abrir_dataset(self.diretorio_dados, dataset, tipo_fluxo).files
+            tabela, assinatura = _ler_estavel(arquivos, lambda: armazenamento.ler_tabela(
+                self.diretorio_dados, tipo_fluxo, ano_inicio, mes_inicio, ano_fim, mes_fim, cod_pais, sg_uf, dataset=dataset))
+            tabelas = [tabela]
+            origem = ('parquet', (ano_inicio, mes_inicio, ano_fim, mes_fim, cod_pais, sg_uf), assinatura)
+        versao = hashlib.sha256(repr((dataset, tipo_fluxo, origem)).encode()).hexdigest()[:16]
+        return Lotes([lote for tabela in tabelas for lote in tabela.to_batches()], tabelas[0].schema, versao)
+
+    def uso_memoria(self) -> pd.DataFrame:
+        """Resumo por dataset dos anos abertos, linhas e bytes mapeados."""
+        with self._trava:
+            linhas = [
+                {'Dataset': dataset, 'Fluxo': fluxo, 'Ano': ano, 'Linhas': tabela.num_rows, 'Bytes': tabela.nbytes}
+                for (dataset, fluxo, ano), (tabela, _) in self._tabelas.items() if tabela is not None
+            ]
+        if not linhas:
+            return pd.DataFrame(columns=['Dataset', 'Fluxo', 'Anos', 'Linhas', 'MB mapeados'])
+        resumo = pd.DataFrame(linhas).groupby(['Dataset', 'Fluxo']).agg(
+            Anos=('Ano', 'count'), Linhas=('Linhas', 'sum'), Bytes=('Bytes', 'sum')).reset_index()
+        resumo['MB mapeados'] = resumo.pop('Bytes') / 2**20
+        return resumo
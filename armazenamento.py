@@ -0,0 +1,321 @@
+"""Leitura e gravação das tabelas de fatos do ComexStat em parquet.
+
+Os arquivos planos gerados pelo pré-processamento (``export_historico.parquet``,
+``export_historico_{ANO}.parquet``, ``export_world_totals.parquet``...) são
+reorganizados em datasets particionados por fluxo e ano:
+
+    dados/fatos/fluxo=export/CO_ANO=2024/parte-0.parquet
+    dados/mundo/fluxo=export/CO_ANO=2024/parte-0.parquet
+
+Os meses do ano corrente baixados da API (``atualizacao_api``) entram como
+arquivos adicionais na partição do ano (``parte-2025-07.parquet``).
+
+Dentro de cada ano as linhas ficam ordenadas por país e UF, em row groups
+pequenos, para que os filtros de país e UF sejam resolvidos pelas
+estatísticas do parquet sem ler o arquivo inteiro.
+
+A partir dos fatos são montados rollups mensais (``ROLLUPS``) com o mesmo
+layout, usados quando a consulta não precisa de todas as dimensões. Cada
+linha de rollup guarda em ``REGISTROS`` quantas linhas de fatos somou.
+
+Os códigos (NCM, país, UF) são gravados como dicionário e ano/mês como
+inteiros pequenos, de modo que no pandas viram categorias e os filtros e
+junções comparam inteiros em vez de strings.
+"""
+import hashlib
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from referencias import NOME_COMPILADO
+
+DATASETS = {
+    'fatos': {'arquivo': 'historico', 'ordem': ['CO_PAIS', 'SG_UF_NCM', 'CO_NCM', 'CO_MES']},
+    'mundo': {'arquivo': 'world_totals', 'ordem': ['CO_NCM', 'CO_MES']},
+}
+# Totais mensais por dimensão, do menor para o maior
+ROLLUPS = {
+    'uf': ['SG_UF_NCM'],
+    'ncm': ['CO_NCM'],
+    'pais_uf': ['CO_PAIS', 'SG_UF_NCM'],
+    'pais_ncm': ['CO_PAIS', 'CO_NCM'],
+}
+DIMENSOES_FATOS = ['CO_PAIS', 'SG_UF_NCM', 'CO_NCM']
+METRICAS = ['VL_FOB', 'KG_LIQUIDO']
+COLUNA_REGISTROS = 'REGISTROS'
+LINHAS_POR_ROW_GROUP = 64_000
+
+# VL_FOB / KG_LIQUIDO continuam int64: valores mensais passam do limite de int32
+ESQUEMA_COMPACTO = {
+    'CO_ANO': pa.int16(),
+    'CO_MES': pa.int8(),
+    'CO_NCM': pa.dictionary(pa.int16(), pa.string()),
+    'CO_PAIS': pa.dictionary(pa.int16(), pa.string()),
+    'SG_UF_NCM': pa.dictionary(pa.int8(), pa.string()),
+    COLUNA_REGISTROS: pa.int32(),
+}
+PARTICIONAMENTO = ds.partitioning(pa.schema([('CO_ANO', ESQUEMA_COMPACTO['CO_ANO'])]), flavor='hive')
+
+
+def compactar(tabela: pa.Table) -> pa.Table:
+    """Converte as colunas conhecidas para o esquema compacto."""
+    for coluna, tipo in ESQUEMA_COMPACTO.items():
+        if coluna in tabela.column_names and tabela.schema.field(coluna).type != tipo:
+            posicao = tabela.column_names.index(coluna)
+            tabela = tabela.set_column(posicao, coluna, tabela[coluna].cast(tipo))
+    return tabela
+
+
+def nomes_por_codigo(codigos: pd.Series, mapa: dict, usar_codigo_ausente=False) -> pd.Series:
+    """Traduz códigos para nomes consultando o mapa uma vez por categoria.
+
+    O resultado também é categórico. Com ``usar_codigo_ausente`` o próprio
+    código é usado quando não há nome no mapa.
+    """
+    if not isinstance(codigos.dtype, pd.CategoricalDtype):
+        codigos = codigos.astype('category')
+    categorias = codigos.cat.categories
+    nomes = categorias.map(lambda codigo: mapa.get(codigo, codigo if usar_codigo_ausente else np.nan))
+    # Nomes repetidos entre códigos diferentes são unificados numa única categoria
+    novos_codigos, nomes_unicos = pd.factorize(nomes)
+    codigos_linha = codigos.cat.codes.to_numpy()
+    novos_codigos = np.append(novos_codigos, -1)[codigos_linha]
+    return pd.Series(pd.Categorical.from_codes(novos_codigos, categories=nomes_unicos), index=codigos.index, name=codigos.name)
+
+
+def _arquivos_planos(diretorio_dados, tipo_fluxo, arquivo):
+    """Lista o arquivo histórico e os arquivos de ano corrente de um fluxo."""
+    prefixo = f"{tipo_fluxo.lower()}_{arquivo}"
+    return sorted(
+        os.path.join(diretorio_dados, nome) for nome in os.listdir(diretorio_dados)
+        if nome.startswith(prefixo) and nome.endswith('.parquet') and _sufixo_valido(nome[len(prefixo):-len('.parquet')])
+    )
+
+
+def _sufixo_valido(sufixo):
+    # '' para o histórico, '_2025' para o ano corrente
+    return sufixo == '' or (sufixo.startswith('_') and sufixo[1:].isdigit())
+
+
+def versao_dados(diretorio_dados):
+    """Identificador do conteúdo atual da pasta de dados (muda a cada arquivo regravado).
+
+    Temporários e as referências compiladas (derivadas dos CSVs, que já
+    entram na conta) são ignorados.
+    """
+    assinatura = hashlib.sha256()
+    for raiz, diretorios, arquivos in os.walk(diretorio_dados):
+        diretorios[:] = sorted(nome for nome in diretorios if not nome.endswith('.tmp'))
+        for nome in sorted(arquivos):
+            if nome.endswith('.tmp') or (raiz == diretorio_dados and nome == NOME_COMPILADO):
+                continue
+            info = os.stat(os.path.join(raiz, nome))
+            assinatura.update(f"{os.path.relpath(os.path.join(raiz, nome), diretorio_dados)}:{info.st_size}:{info.st_mtime_ns};".encode())
+    return assinatura.hexdigest()[:16]
+
+
+def caminho_dataset(diretorio_dados, dataset, tipo_fluxo):
+    return os.path.join(diretorio_dados, dataset, f"fluxo={tipo_fluxo.lower()}")
+
+
+def abrir_dataset(diretorio_dados, dataset, tipo_fluxo):
+    """Abre o dataset particionado; na ausência dele, usa os arquivos planos."""
+    caminho = caminho_dataset(diretorio_dados, dataset, tipo_fluxo)
+    if os.path.isdir(caminho):
+        return ds.dataset(caminho, format='parquet', partitioning=PARTICIONAMENTO)
+    if dataset not in DATASETS:
+        raise FileNotFoundError(f"Dataset '{dataset}' do fluxo '{tipo_fluxo}' não foi gerado em {diretorio_dados}")
+    arquivos = _arquivos_planos(diretorio_dados, tipo_fluxo, DATASETS[dataset]['arquivo'])
+    if not arquivos:
+        raise FileNotFoundError(f"Nenhum arquivo de '{dataset}' para o fluxo '{tipo_fluxo}' em {diretorio_dados}")
+    return ds.dataset(arquivos, format='parquet')
+
+
+def filtro_periodo(ano_inicio, mes_inicio, ano_fim, mes_fim):
+    """Expressão de filtro equivalente ao recorte mês a mês do dashboard."""
+    ano, mes = pc.field('CO_ANO'), pc.field('CO_MES')
+    return (
+        (ano >= ano_inicio) & (ano <= ano_fim)
+        & ~((ano == ano_inicio) & (mes < mes_inicio))
+        & ~((ano == ano_fim) & (mes > mes_fim))
+    )
+
+
+def filtro_consulta(ano_inicio, mes_inicio, ano_fim, mes_fim, cod_pais=None, sg_uf=None):
+    filtro = filtro_periodo(ano_inicio, mes_inicio, ano_fim, mes_fim)
+    if cod_pais is not None:
+        filtro &= pc.field('CO_PAIS') == cod_pais
+    if sg_uf is not None:
+        filtro &= pc.field('SG_UF_NCM') == sg_uf
+    return filtro
+
+
+def ler_tabela(diretorio_dados, tipo_fluxo, ano_inicio, mes_inicio, ano_fim, mes_fim,
+               cod_pais=None, sg_uf=None, colunas=None, dataset='fatos') -> pa.Table:
+    """Lê apenas o recorte pedido, empurrando período, país e UF para o scan do parquet."""
+    filtro = filtro_consulta(ano_inicio, mes_inicio, ano_fim, mes_fim, cod_pais, sg_uf)
+    return compactar(abrir_dataset(diretorio_dados, dataset, tipo_fluxo).to_table(columns=colunas, filter=filtro))
+
+
+def ler_fatos(diretorio_dados, tipo_fluxo, ano_inicio, mes_inicio, ano_fim, mes_fim,
+              cod_pais=None, sg_uf=None, colunas=None, dataset='fatos'):
+    return ler_tabela(diretorio_dados, tipo_fluxo, ano_inicio, mes_inicio, ano_fim, mes_fim,
+                      cod_pais, sg_uf, colunas, dataset).to_pandas()
+
+
+def diretorio_ipc(diretorio_dados, dataset, tipo_fluxo):
+    return os.path.join(diretorio_dados, 'ipc', dataset, f"fluxo={tipo_fluxo.lower()}")
+
+
+def caminho_ipc(diretorio_dados, dataset, tipo_fluxo, ano):
+    return os.path.join(diretorio_ipc(diretorio_dados, dataset, tipo_fluxo), f"CO_ANO={ano}.arrow")
+
+
+def _anos(origem):
+    return sorted(pc.unique(origem.to_table(columns=['CO_ANO'])['CO_ANO']).to_pylist())
+
+
+def _gravar_por_ano(destino, anos, tabela_do_ano, gravar):
+    """Grava um arquivo por ano num diretório temporário e troca pelo destino ao final.
+
+    Os anos são processados um de cada vez, então a memória usada é a de um
+    ano de dados, e quem lê o destino nunca vê um dataset pela metade.
+    """
+    temporario = destino + '.tmp'
+    shutil.rmtree(temporario, ignore_errors=True)
+    os.makedirs(temporario)
+    for ano in anos:
+        gravar(tabela_do_ano(ano), temporario, ano)
+    shutil.rmtree(destino, ignore_errors=True)
+    os.replace(temporario, destino)
+    return anos
+
+
+def _sem_dicionario(tabela):
+    # sort_by não aceita colunas de dicionário
+    for posicao, campo in enumerate(tabela.schema):
+        if pa.types.is_dictionary(campo.type):
+            tabela = tabela.set_column(posicao, campo.name, tabela[campo.name].cast(campo.type.value_type))
+    return tabela
+
+
+def _substituir(caminho, gravar):
+    # Arquivos com prefixo '.' são ignorados pelos datasets do pyarrow enquanto não são renomeados
+    temporario = os.path.join(os.path.dirname(caminho), f".{os.path.basename(caminho)}.tmp")
+    gravar(temporario)
+    os.replace(temporario, caminho)
+
+
+def _gravar_parquet(ordem, nome_parte='parte-0'):
+    def gravar(tabela, diretorio, ano):
+        caminho_ano = os.path.join(diretorio, f"CO_ANO={ano}")
+        os.makedirs(caminho_ano, exist_ok=True)
+        chaves = [(coluna, 'ascending') for coluna in ordem if coluna in tabela.column_names]
+        tabela = compactar(_sem_dicionario(tabela).sort_by(chaves).drop_columns(['CO_ANO']))
+        _substituir(os.path.join(caminho_ano, f"{nome_parte}.parquet"), lambda caminho: pq.write_table(
+            tabela, caminho, row_group_size=LINHAS_POR_ROW_GROUP, compression='zstd'))
+    return gravar
+
+
+def _gravar_ipc(tabela, diretorio, ano):
+    # Um ano com várias partes chega com um dicionário por parte; o formato IPC aceita só um por coluna
+    tabela = compactar(tabela).unify_dictionaries()
+
+    def gravar(caminho):
+        with pa.OSFile(caminho, 'wb') as arquivo, pa.ipc.new_file(arquivo, tabela.schema) as escritor:
+            escritor.write_table(tabela, max_chunksize=LINHAS_POR_ROW_GROUP)
+
+    _substituir(os.path.join(diretorio, f"CO_ANO={ano}.arrow"), gravar)
+
+
+def particionar(diretorio_dados, dataset, tipo_fluxo):
+    """Regrava os arquivos planos de um fluxo como dataset particionado por ano."""
+    config = DATASETS[dataset]
+    arquivos = _arquivos_planos(diretorio_dados, tipo_fluxo, config['arquivo'])
+    if not arquivos:
+        raise FileNotFoundError(f"Nenhum arquivo de '{dataset}' para o fluxo '{tipo_fluxo}' em {diretorio_dados}")
+    origem = ds.dataset(arquivos, format='parquet')
+    return _gravar_por_ano(
+        caminho_dataset(diretorio_dados, dataset, tipo_fluxo), _anos(origem),
+        lambda ano: origem.to_table(filter=pc.field('CO_ANO') == ano), _gravar_parquet(config['ordem']))
+
+
+def _agregar_ano(origem, dimensoes, ano):
+    tabela = origem.to_table(columns=['CO_ANO', 'CO_MES', *dimensoes, *METRICAS], filter=pc.field('CO_ANO') == ano)
+    # Anos com partes anexadas trazem um dicionário por arquivo
+    agregado = tabela.unify_dictionaries().group_by(['CO_ANO', 'CO_MES', *dimensoes]).aggregate(
+        [(metrica, 'sum') for metrica in METRICAS] + [([], 'count_all')])
+    return agregado.rename_columns([COLUNA_REGISTROS if coluna == 'count_all' else coluna.removesuffix('_sum')
+                                    for coluna in agregado.column_names])
+
+
+def construir_rollup(diretorio_dados, nome, tipo_fluxo):
+    """Soma os fatos de um fluxo por mês e pelas dimensões do rollup."""
+    dimensoes = ROLLUPS[nome]
+    origem = abrir_dataset(diretorio_dados, 'fatos', tipo_fluxo)
+    return _gravar_por_ano(caminho_dataset(diretorio_dados, nome, tipo_fluxo), _anos(origem),
+                           lambda ano: _agregar_ano(origem, dimensoes, ano), _gravar_parquet(dimensoes + ['CO_MES']))
+
+
+def exportar_ipc(diretorio_dados, dataset, tipo_fluxo):
+    """Gera uma cópia Arrow IPC sem compressão de cada ano, para leitura por memory-map."""
+    origem = abrir_dataset(diretorio_dados, dataset, tipo_fluxo)
+    return _gravar_por_ano(diretorio_ipc(diretorio_dados, dataset, tipo_fluxo), _anos(origem),
+                           lambda ano: origem.to_table(filter=pc.field('CO_ANO') == ano), _gravar_ipc)
+
+
+def meses_presentes(diretorio_dados, dataset, tipo_fluxo, ano):
+    """Meses de ``ano`` que já existem no dataset particionado."""
+    origem = abrir_dataset(diretorio_dados, dataset, tipo_fluxo)
+    meses = origem.to_table(columns=['CO_MES'], filter=pc.field('CO_ANO') == ano)['CO_MES']
+    return set(pc.unique(meses).to_pylist())
+
+
+def anexar_meses(diretorio_dados, dataset, tipo_fluxo, tabela, nome_parte):
+    """Grava linhas novas como mais um arquivo em cada partição de ano, sem regravar os existentes.
+
+    Devolve os anos alterados, que precisam de ``atualizar_anos`` para
+    refletir nos rollups e nas cópias IPC.
+    """
+    destino = caminho_dataset(diretorio_dados, dataset, tipo_fluxo)
+    if not os.path.isdir(destino):
+        raise FileNotFoundError(f"Dataset '{dataset}' do fluxo '{tipo_fluxo}' não foi particionado em {diretorio_dados}")
+    anos = sorted(pc.unique(tabela['CO_ANO']).to_pylist())
+    gravar = _gravar_parquet(DATASETS[dataset]['ordem'], nome_parte)
+    for ano in anos:
+        gravar(tabela.filter(pc.field('CO_ANO') == ano), destino, ano)
+    return anos
+
+
+def atualizar_anos(diretorio_dados, tipo_fluxo, anos):
+    """Regera só os anos indicados das cópias IPC e dos rollups já existentes.
+
+    Cada arquivo é trocado por rename, então o dashboard continua lendo a
+    versão anterior até a nova estar completa.
+    """
+    for dataset in DATASETS:
+        _atualizar_ipc(diretorio_dados, dataset, tipo_fluxo, anos)
+    fatos = abrir_dataset(diretorio_dados, 'fatos', tipo_fluxo)
+    for nome, dimensoes in ROLLUPS.items():
+        destino = caminho_dataset(diretorio_dados, nome, tipo_fluxo)
+        if not os.path.isdir(destino):
+            continue
+        gravar = _gravar_parquet(dimensoes + ['CO_MES'])
+        for ano in anos:
+            gravar(_agregar_ano(fatos, dimensoes, ano), destino, ano)
+        _atualizar_ipc(diretorio_dados, nome, tipo_fluxo, anos)
+
+
+def _atualizar_ipc(diretorio_dados, dataset, tipo_fluxo, anos):
+    destino = diretorio_ipc(diretorio_dados, dataset, tipo_fluxo)
+    if not os.path.isdir(destino):
+        return
+    origem = abrir_dataset(diretorio_dados, dataset, tipo_fluxo)
+    for ano in anos:
+        _gravar_ipc(origem.to_table(filter=pc.field('CO_ANO') == ano), destino, ano)
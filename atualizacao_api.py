@@ -0,0 +1,210 @@
+"""Atualização incremental do ano corrente pela API do ComexStat.
+
+Os arquivos da release só mudam quando sai um novo ``dados.zip``/manifesto.
+Este módulo consulta a API apenas pelos meses que ainda não estão na pasta
+``dados`` e grava cada mês como mais um arquivo na partição do ano
+(``armazenamento.anexar_meses``), sem regravar o que já existe. Depois, só os
+anos alterados dos rollups e das cópias IPC são refeitos. Como a versão dos
+dados muda com os arquivos novos, o dashboard passa a usá-los no rerun
+seguinte, sem reinício.
+
+As requisições usam uma sessão com pool de conexões, no máximo
+``REQUISICOES_SIMULTANEAS`` em paralelo e novas tentativas com backoff
+exponencial (inclusive respeitando ``Retry-After`` em respostas 429/503).
+
+Pensado para rodar periodicamente (cron) ao lado do app. A URL da API pode
+apontar para um servidor local de testes.
+
+Uso:
+    python atualizacao_api.py [diretorio_dados] [url_api]
+"""
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import armazenamento
+import sincronizacao
+from preprocessamento import FLUXOS
+
+BASE_URL = "https://api-comexstat.mdic.gov.br"
+REQUISICOES_SIMULTANEAS = 3
+TENTATIVAS = 5
+TEMPO_LIMITE = 120
+
+# Campos da API -> colunas dos arquivos locais (mesma nomenclatura usada no dashboard)
+CAMPOS_API = {
+    'year': 'CO_ANO',
+    'monthNumber': 'CO_MES',
+    'coNcm': 'CO_NCM',
+    'coPais': 'CO_PAIS',
+    'state': 'SG_UF_NCM',
+    'metricFOB': 'VL_FOB',
+    'metricKG': 'KG_LIQUIDO',
+}
+CONSULTAS = {
+    'fatos': {
+        'detalhes': ['ncm', 'country', 'state'],
+        'metricas': ['metricFOB', 'metricKG'],
+        'colunas': ['CO_ANO', 'CO_MES', 'CO_NCM', 'CO_PAIS', 'SG_UF_NCM', 'VL_FOB', 'KG_LIQUIDO'],
+    },
+    'mundo': {
+        'detalhes': ['ncm'],
+        'metricas': ['metricFOB'],
+        'colunas': ['CO_ANO', 'CO_MES', 'CO_NCM', 'VL_FOB_MUNDO'],
+        'renomear': {'metricFOB': 'VL_FOB_MUNDO'},
+    },
+}
+LARGURA_CODIGOS = {'CO_NCM': 8, 'CO_PAIS': 3}
+# Anos com partes novas cujos rollups/IPC ainda não foram refeitos (execução interrompida)
+NOME_PENDENCIAS = 'atualizacao_pendente.json'
+
+
+class ErroAPI(Exception):
+    pass
+
+
+def criar_sessao():
+    """Sessão com pool do tamanho da concorrência e retentativas com backoff."""
+    tentativas = Retry(
+        total=TENTATIVAS, backoff_factor=1, status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=None,  # a consulta é um POST sem efeito colateral, pode ser repetida
+        respect_retry_after_header=True,
+    )
+    adaptador = HTTPAdapter(pool_connections=REQUISICOES_SIMULTANEAS, pool_maxsize=REQUISICOES_SIMULTANEAS,
+                            max_retries=tentativas)
+    sessao = requests.Session()
+    sessao.mount('https://', adaptador)
+    sessao.mount('http://', adaptador)
+    return sessao
+
+
+def ultimo_mes_disponivel(sessao, url_base=BASE_URL):
+    """(ano, mês) mais recente publicado na API."""
+    resposta = sessao.get(f"{url_base}/general/dates/updated", timeout=TEMPO_LIMITE)
+    resposta.raise_for_status()
+    dados = resposta.json()['data']
+    return int(dados['year']), int(dados['monthNumber'])
+
+
+def meses_pendentes(diretorio_dados, ano_api, mes_api, fluxos=FLUXOS):
+    """Meses publicados na API (ano atual e anterior) que faltam em cada dataset e fluxo."""
+    pendentes = []
+    for dataset in CONSULTAS:
+        for fluxo in fluxos:
+            for ano in (ano_api - 1, ano_api):
+                ultimo_mes = mes_api if ano == ano_api else 12
+                presentes = armazenamento.meses_presentes(diretorio_dados, dataset, fluxo, ano)
+                pendentes += [(dataset, fluxo, ano, mes) for mes in range(1, ultimo_mes + 1) if mes not in presentes]
+    return pendentes
+
+
+def _tabela_da_resposta(linhas, dataset):
+    consulta = CONSULTAS[dataset]
+    df = pd.DataFrame(linhas).rename(columns={**CAMPOS_API, **consulta.get('renomear', {})})
+    faltando = [coluna for coluna in consulta['colunas'] if coluna not in df.columns]
+    if faltando:
+        raise ErroAPI(f"Resposta da API sem os campos {faltando} (colunas recebidas: {list(df.columns)})")
+    df = df[consulta['colunas']]
+    for coluna in consulta['colunas']:
+        if coluna in armazenamento.ESQUEMA_COMPACTO and not pa.types.is_integer(armazenamento.ESQUEMA_COMPACTO[coluna]):
+            df[coluna] = df[coluna].astype(str).str.zfill(LARGURA_CODIGOS.get(coluna, 0))
+        else:
+            df[coluna] = pd.to_numeric(df[coluna], errors='raise').astype('int64')
+    return armazenamento.compactar(pa.Table.from_pandas(df, preserve_index=False))
+
+
+def baixar_mes(sessao, url_base, dataset, tipo_fluxo, ano, mes):
+    """Consulta um mês de um dataset; ``None`` se a API ainda não tem dados dele."""
+    consulta = CONSULTAS[dataset]
+    periodo = f"{ano}-{mes:02d}"
+    corpo = {
+        'flow': tipo_fluxo,
+        'monthDetail': True,
+        'period': {'from': periodo, 'to': periodo},
+        'filters': [],
+        'details': consulta['detalhes'],
+        'metrics': consulta['metricas'],
+    }
+    resposta = sessao.post(f"{url_base}/general", json=corpo, timeout=TEMPO_LIMITE)
+    resposta.raise_for_status()
+    linhas = resposta.json()['data']['list']
+    if not linhas:
+        return None
+    return _tabela_da_resposta(linhas, dataset)
+
+
+def _registrar_pendencias(diretorio_dados, anos_por_fluxo):
+    with open(os.path.join(diretorio_dados, NOME_PENDENCIAS), 'w', encoding='utf-8') as arquivo:
+        json.dump({fluxo: sorted(anos) for fluxo, anos in anos_por_fluxo.items()}, arquivo)
+
+
+def _atualizar_derivados(diretorio_dados):
+    """Refaz os rollups/IPC dos anos registrados como pendentes, se houver."""
+    caminho = os.path.join(diretorio_dados, NOME_PENDENCIAS)
+    if not os.path.exists(caminho):
+        return
+    with open(caminho, encoding='utf-8') as arquivo:
+        anos_por_fluxo = json.load(arquivo)
+    for fluxo, anos in anos_por_fluxo.items():
+        armazenamento.atualizar_anos(diretorio_dados, fluxo, anos)
+    os.remove(caminho)
+
+
+def verificar_particionado(diretorio_dados, fluxos=FLUXOS):
+    """``FileNotFoundError`` se algum dataset atualizado pela API ainda não foi particionado."""
+    faltando = [f"{dataset}/{fluxo}" for dataset in CONSULTAS for fluxo in fluxos
+                if not os.path.isdir(armazenamento.caminho_dataset(diretorio_dados, dataset, fluxo))]
+    if faltando:
+        raise FileNotFoundError(f"Datasets não particionados em {diretorio_dados} ({', '.join(faltando)}); "
+                                "rode preprocessamento.py antes de atualizar pela API")
+
+
+def atualizar(diretorio_dados, url_base=BASE_URL, sessao=None, fluxos=FLUXOS):
+    """Baixa e anexa os meses que faltam; devolve a lista de (dataset, fluxo, ano, mês) gravados.
+
+    A pasta precisa estar particionada (``preprocessamento.py``); isso é
+    conferido antes de qualquer acesso à API.
+    """
+    verificar_particionado(diretorio_dados, fluxos)
+    sessao = sessao or criar_sessao()
+    with sincronizacao.trava_dados(diretorio_dados):
+        _atualizar_derivados(diretorio_dados)  # execução anterior interrompida
+        ano_api, mes_api = ultimo_mes_disponivel(sessao, url_base)
+        pendentes = meses_pendentes(diretorio_dados, ano_api, mes_api, fluxos)
+        if not pendentes:
+            return []
+
+        with ThreadPoolExecutor(REQUISICOES_SIMULTANEAS) as executor:
+            tabelas = list(executor.map(lambda pendente: baixar_mes(sessao, url_base, *pendente), pendentes))
+
+        # Só grava com todas as consultas concluídas: uma falha no meio não deixa meses pela metade
+        gravados = [(pendente, tabela) for pendente, tabela in zip(pendentes, tabelas) if tabela is not None]
+        if not gravados:
+            return []
+        anos_por_fluxo = {}
+        for (_, fluxo, ano, _), _ in gravados:
+            anos_por_fluxo.setdefault(fluxo, set()).add(ano)
+        # A pendência é registrada antes de anexar, para os derivados serem refeitos mesmo após uma interrupção
+        _registrar_pendencias(diretorio_dados, anos_por_fluxo)
+        for (dataset, fluxo, ano, mes), tabela in gravados:
+            armazenamento.anexar_meses(diretorio_dados, dataset, fluxo, tabela, f"parte-{ano}-{mes:02d}")
+        _atualizar_derivados(diretorio_dados)
+        return [pendente for pendente, _ in gravados]
+
+
+if __name__ == "__main__":
+    diretorio = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.realpath(__file__)), "dados")
+    try:
+        gravados = atualizar(diretorio, sys.argv[2] if len(sys.argv) > 2 else BASE_URL)
+    except FileNotFoundError as erro:
+        sys.exit(str(erro))
+    for dataset, fluxo, ano, mes in gravados:
+        print(f"{dataset}/{fluxo}: {ano}-{mes:02d} anexado")
+    print(f"{len(gravados)} mês(es) anexado(s)")
@@ -0,0 +1,184 @@
+"""Cache de resultados de consultas compartilhado entre sessões e processos.
+
+Dois níveis:
+- memória: LRU limitado por bytes, dentro do processo do Streamlit;
+- disco: um arquivo pickle por chave num diretório local, que sobrevive a
+  reinícios e pode ser lido por várias réplicas do app na mesma máquina.
+  A gravação é atômica (arquivo temporário + rename), feita numa thread
+  separada para não atrasar a resposta, e o diretório é podado pelos
+  arquivos menos usados quando passa do limite. Resultados maiores que o
+  limite inteiro não vão para o disco.
+
+Arquivos prontos para download (``obter_arquivo``) ficam no mesmo diretório
+e dividem o limite de disco com os resultados.
+
+O diretório de cache deve ser de uso exclusivo do app, já que o conteúdo é
+desserializado com pickle.
+"""
+import hashlib
+import os
+import pickle
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+
+def tamanho_em_bytes(valor):
+    """Estimativa do espaço ocupado em memória por um resultado."""
+    if isinstance(valor, pd.DataFrame):
+        return int(valor.memory_usage(deep=True).sum())
+    if isinstance(valor, pd.Series):
+        return int(valor.memory_usage(deep=True))
+    if isinstance(valor, dict):
+        return sum(tamanho_em_bytes(item) for item in valor.values())
+    if isinstance(valor, (list, tuple)):
+        return sum(tamanho_em_bytes(item) for item in valor)
+    if hasattr(valor, 'nbytes'):  # arrays do numpy e índices que expõem o próprio tamanho
+        return int(valor.nbytes)
+    if isinstance(valor, (int, float, str, bytes, bool)) or valor is None:
+        return 64
+    # Demais objetos (figuras do plotly, por exemplo): o tamanho serializado
+    try:
+        return len(pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL))
+    except (pickle.PicklingError, TypeError, AttributeError):
+        return 64
+
+
+def gerar_chave(*partes):
+    return hashlib.sha256(repr(partes).encode('utf-8')).hexdigest()
+
+
+class CacheResultados:
+    def __init__(self, diretorio, limite_memoria_mb=512, limite_disco_mb=2048):
+        self.diretorio = diretorio
+        self.limite_memoria = limite_memoria_mb * 2**20
+        self.limite_disco = limite_disco_mb * 2**20
+        self._memoria = OrderedDict()
+        self._bytes_memoria = 0
+        self._trava = threading.Lock()
+        self.acertos_memoria = 0
+        self.acertos_disco = 0
+        self.falhas = 0
+        # Uma thread só: as gravações saem na ordem em que foram pedidas
+        self._gravador = ThreadPoolExecutor(1, thread_name_prefix='cache-disco')
+        os.makedirs(diretorio, exist_ok=True)
+
+    def _caminho(self, chave):
+        return os.path.join(self.diretorio, f"{chave}.pkl")
+
+    def _guardar_memoria(self, chave, valor):
+        tamanho = tamanho_em_bytes(valor)
+        if tamanho > self.limite_memoria:
+            return
+        with self._trava:
+            if chave in self._memoria:
+                self._bytes_memoria -= self._memoria.pop(chave)[1]
+            self._memoria[chave] = (valor, tamanho)
+            self._bytes_memoria += tamanho
+            while self._bytes_memoria > self.limite_memoria:
+                _, (_, tamanho_removido) = self._memoria.popitem(last=False)
+                self._bytes_memoria -= tamanho_removido
+
+    def _ler_disco(self, chave):
+        caminho = self._caminho(chave)
+        try:
+            with open(caminho, 'rb') as arquivo:
+                valor = pickle.load(arquivo)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+        os.utime(caminho)  # marca como usado recentemente para a poda do disco
+        return valor
+
+    def _gravar_atomico(self, caminho, gravar):
+        temporario = f"{caminho}.{uuid.uuid4().hex}.tmp"
+        try:
+            gravar(temporario)
+            os.replace(temporario, caminho)
+        finally:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+        self._podar_disco(preservar=os.path.basename(caminho))
+
+    def _gravar_disco(self, chave, valor):
+        conteudo = pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(conteudo) > self.limite_disco:
+            return  # ocuparia o disco todo e expulsaria todos os outros resultados
+
+        def gravar(caminho):
+            with open(caminho, 'wb') as arquivo:
+                arquivo.write(conteudo)
+        self._gravar_atomico(self._caminho(chave), gravar)
+
+    def concluir_gravacoes(self):
+        """Espera as gravações em disco pendentes (ex.: antes de encerrar um processo em lote)."""
+        self._gravador.submit(lambda: None).result()
+
+    def _podar_disco(self, preservar=None):
+        arquivos = []
+        for nome in os.listdir(self.diretorio):
+            if nome.endswith('.tmp') or nome == preservar:
+                continue
+            try:
+                info = os.stat(os.path.join(self.diretorio, nome))
+            except FileNotFoundError:  # removido por outra réplica
+                continue
+            arquivos.append((info.st_mtime, info.st_size, nome))
+        total = sum(tamanho for _, tamanho, _ in arquivos)
+        for _, tamanho, nome in sorted(arquivos):
+            if total <= self.limite_disco:
+                break
+            try:
+                os.remove(os.path.join(self.diretorio, nome))
+            except FileNotFoundError:
+                pass
+            total -= tamanho
+
+    def obter(self, chave, calcular):
+        """Devolve o resultado da chave, calculando e guardando em ambos os níveis se preciso.
+
+        O objeto devolvido é compartilhado entre sessões e não deve ser alterado.
+        """
+        with self._trava:
+            if chave in self._memoria:
+                self._memoria.move_to_end(chave)
+                self.acertos_memoria += 1
+                return self._memoria[chave][0]
+        valor = self._ler_disco(chave)
+        if valor is not None:
+            with self._trava:
+                self.acertos_disco += 1
+        else:
+            valor = calcular()
+            with self._trava:
+                self.falhas += 1
+            self._gravador.submit(self._gravar_disco, chave, valor)
+        self._guardar_memoria(chave, valor)
+        return valor
+
+    def obter_arquivo(self, chave, extensao, gravar):
+        """Caminho de um arquivo gerado por ``gravar(caminho)``, reaproveitado entre sessões."""
+        caminho = os.path.join(self.diretorio, f"{chave}.{extensao}")
+        if os.path.exists(caminho):
+            os.utime(caminho)
+            with self._trava:
+                self.acertos_disco += 1
+            return caminho
+        self._gravar_atomico(caminho, gravar)
+        with self._trava:
+            self.falhas += 1
+        return caminho
+
+    def estatisticas(self):
+        with self._trava:
+            consultas = self.acertos_memoria + self.acertos_disco + self.falhas
+            return {
+                'Itens em memória': len(self._memoria),
+                'MB em memória': self._bytes_memoria / 2**20,
+                'Acertos (memória)': self.acertos_memoria,
+                'Acertos (disco)': self.acertos_disco,
+                'Falhas': self.falhas,
+                'Taxa de acerto (%)': 100 * (consultas - self.falhas) / consultas if consultas else 0.0,
+            }
@@ -0,0 +1,183 @@
+"""Pipeline de consultas do dashboard, sem dependência do Streamlit.
+
+Recebe os filtros de uma análise (o dicionário ``resultado`` que o app guarda
+na sessão) e devolve os recortes e os agregados de Exportação/Importação e
+do Saldo Comercial. Os dados vêm do ``ArmazemDados`` e tudo que é calculado
+fica no ``CacheResultados``, com chaves que dependem só dos filtros e da
+versão dos dados. O app, os benchmarks e execuções em lote usam o mesmo
+pipeline.
+"""
+import analise
+import instrumentacao
+from armazenamento import COLUNA_REGISTROS, filtro_consulta, nomes_por_codigo
+from cache_resultados import gerar_chave
+from indice_ncm import IndiceLinhas
+
+COLUNAS_API = {'CO_ANO': 'year', 'CO_MES': 'monthNumber', 'CO_NCM': 'coNcm', 'CO_PAIS': 'coPais', 'SG_UF_NCM': 'state', 'VL_FOB': 'metricFOB', 'KG_LIQUIDO': 'metricKG', 'VL_FOB_MUNDO': 'metricFOB'}
+TIPOS = ('Exportação', 'Importação', 'Saldo Comercial')
+
+
+def contar_registros(df):
+    """Linhas de fatos representadas por ``df`` (nos rollups, a soma de ``REGISTROS``)."""
+    return int(df[COLUNA_REGISTROS].sum()) if COLUNA_REGISTROS in df.columns else len(df)
+
+
+def montar_resultado(tipo, periodo, cod_pais=None, sg_uf=None, lista_ncm_filtro=(), monitor_tarifados=False,
+                     versao_dados=None):
+    """Filtros de uma análise no mesmo formato que o app guarda na sessão."""
+    if tipo not in TIPOS:
+        raise ValueError(f"Tipo de análise inválido: {tipo!r} (use {', '.join(TIPOS)})")
+    return {
+        'tipo': tipo, 'periodo': tuple(periodo), 'cod_pais': cod_pais, 'sg_uf': sg_uf,
+        'lista_ncm_filtro': list(lista_ncm_filtro), 'monitor_tarifados': monitor_tarifados,
+        'versao_dados': versao_dados,
+    }
+
+
+class Consultas:
+    def __init__(self, armazem, cache, mapa_cod_para_pais, mapa_cod_para_ncm, ncm_tarifados=()):
+        self.armazem = armazem
+        self.cache = cache
+        self.mapa_cod_para_pais = mapa_cod_para_pais
+        self.mapa_cod_para_ncm = mapa_cod_para_ncm
+        self.ncm_tarifados = set(ncm_tarifados)
+
+    def carregar(self, tipo_fluxo, ano_inicio, mes_inicio, ano_fim, mes_fim, cod_pais=None, sg_uf=None, dataset='fatos'):
+        """Linhas do período e dos filtros; ``FileNotFoundError`` se o dataset não foi gerado."""
+        with instrumentacao.etapa('carregar', dataset=dataset, fluxo=tipo_fluxo) as registro:
+            df = self.armazem.consultar(dataset, tipo_fluxo, ano_inicio, mes_inicio, ano_fim, mes_fim, cod_pais, sg_uf)
+            registro['linhas_saida'] = len(df)
+        return df
+
+    def chave_recorte(self, resultado, fluxo, dimensoes, dataset):
+        """Dataset, filtros e chave de cache do recorte pedido."""
+        cod_pais, sg_uf = resultado['cod_pais'], resultado['sg_uf']
+        if dataset == 'mundo':
+            cod_pais, sg_uf = None, None
+        elif dataset is None:
+            dimensoes = set(dimensoes) | {'CO_PAIS'} if cod_pais is not None else set(dimensoes)
+            dimensoes = dimensoes | {'SG_UF_NCM'} if sg_uf is not None else dimensoes
+            dataset = self.armazem.escolher_dataset(fluxo, dimensoes)
+        chave = gerar_chave('recorte', fluxo, dataset, resultado['periodo'], cod_pais, sg_uf, resultado['versao_dados'])
+        return dataset, cod_pais, sg_uf, chave
+
+    def recorte(self, resultado, fluxo, dimensoes=(), dataset=None):
+        """Recorte da análise no menor dataset (rollup ou fatos) que tenha as dimensões pedidas.
+
+        O recorte vem do cache compartilhado entre sessões e não deve ser alterado.
+        """
+        dataset, cod_pais, sg_uf, chave = self.chave_recorte(resultado, fluxo, dimensoes, dataset)
+        def ler():
+            df = self.carregar(fluxo, *resultado['periodo'], cod_pais, sg_uf, dataset=dataset)
+            with instrumentacao.etapa('enriquecer', len(df), dataset=dataset, fluxo=fluxo) as registro:
+                df = df.rename(columns=COLUNAS_API)
+                if 'coPais' in df.columns: df['country'] = nomes_por_codigo(df['coPais'], self.mapa_cod_para_pais)
+                if 'coNcm' in df.columns and dataset != 'mundo': df['ncm'] = nomes_por_codigo(df['coNcm'], self.mapa_cod_para_ncm)
+                registro['linhas_saida'] = len(df)
+            return df
+        return self.cache.obter(chave, ler)
+
+    def chave_tabela(self, resultado, fluxo, lotes):
+        """Chave das posições e exportações da tabela: os filtros e a versão dos ``lotes`` lidos agora.
+
+        A ``versao_dados`` da sessão não serve: os lotes vêm do que o armazém tem
+        no momento (IPC gerado depois, meses anexados, pasta trocada).
+        """
+        return gerar_chave('tabela', fluxo, resultado['periodo'], resultado['cod_pais'], resultado['sg_uf'], lotes.versao)
+
+    def lotes_tabela(self, resultado, fluxo):
+        """Fatos do período para as Tabelas Consolidadas, como ``Lotes`` e fora do cache.
+
+        A tabela de fatos não passa por ``recorte``: as linhas da análise ficam
+        só como posições (``posicoes_tabela``) e cada página ou bloco de
+        exportação copia as próprias linhas dos lotes.
+        """
+        return self.armazem.lotes('fatos', fluxo, *resultado['periodo'], resultado['cod_pais'], resultado['sg_uf'])
+
+    def posicoes_tabela(self, resultado, fluxo, lotes):
+        with instrumentacao.etapa('carregar', len(lotes), dataset='fatos', fluxo=fluxo) as registro:
+            posicoes = lotes.filtrar(filtro_consulta(*resultado['periodo'], resultado['cod_pais'], resultado['sg_uf']))
+            registro['linhas_saida'] = len(posicoes)
+        return posicoes
+
+    def recorte_ncm(self, resultado, fluxo, *filtros_ncm, dataset=None):
+        """Recorte com NCM restrito aos produtos que atendem a todos os filtros (códigos ou prefixos).
+
+        O índice de linhas por NCM é montado uma vez por recorte e fica no cache
+        compartilhado; cada filtro custa proporcional às linhas selecionadas.
+        """
+        df = self.recorte(resultado, fluxo, ['CO_NCM'], dataset)
+        filtros_ncm = [filtro for filtro in filtros_ncm if filtro]
+        if not filtros_ncm or df.empty:
+            return df
+        with instrumentacao.etapa('filtrar', len(df), dataset=dataset or 'fatos', fluxo=fluxo) as registro:
+            chave = gerar_chave('indice_ncm', self.chave_recorte(resultado, fluxo, ['CO_NCM'], dataset)[-1])
+            indice = self.cache.obter(chave, lambda: IndiceLinhas(df['coNcm']))
+            df = df.take(indice.linhas(*filtros_ncm))
+            registro['linhas_saida'] = len(df)
+        return df
+
+    def filtros_indicadores(self, resultado):
+        fluxo = 'export' if resultado['tipo'] == 'Exportação' else 'import'
+        return fluxo, fluxo == 'export' and resultado['monitor_tarifados'] and bool(self.ncm_tarifados)
+
+    def chave_indicadores(self, resultado):
+        fluxo, filtra_tarifados = self.filtros_indicadores(resultado)
+        return gerar_chave('indicadores', fluxo, resultado['periodo'], resultado['cod_pais'], resultado['sg_uf'],
+                           tuple(resultado['lista_ncm_filtro']), filtra_tarifados, resultado['versao_dados'])
+
+    def indicadores(self, resultado):
+        """Agregados de Exportação/Importação, calculados uma vez por combinação de filtros (em cache compartilhado)."""
+        fluxo, filtra_tarifados = self.filtros_indicadores(resultado)
+        lista_ncm_filtro = resultado['lista_ncm_filtro']
+
+        def calcular():
+            # Monitor de Tarifados (se ativo) e lista de NCMs, resolvidos pelo índice de NCM
+            tarifados = sorted(self.ncm_tarifados) if filtra_tarifados else []
+            df_pais_raw = self.recorte_ncm(resultado, fluxo, tarifados, lista_ncm_filtro)
+            df_mundo_raw = self.recorte_ncm(resultado, fluxo, tarifados, dataset='mundo')
+            # Registros de fatos do recorte, antes e depois só do Monitor de Tarifados
+            registros_antes = contar_registros(self.recorte(resultado, fluxo, ['CO_NCM']))
+            registros_depois = contar_registros(
+                self.recorte_ncm(resultado, fluxo, tarifados) if lista_ncm_filtro else df_pais_raw)
+            # Sem filtro de produto, os totais mensais saem de um rollup sem a dimensão NCM
+            df_mensal = None if lista_ncm_filtro or filtra_tarifados else self.recorte(resultado, fluxo)
+            with instrumentacao.etapa('agregar', len(df_pais_raw), analise='indicadores') as registro:
+                indicadores = analise.calcular_indicadores(df_pais_raw, df_mundo_raw, self.mapa_cod_para_ncm, df_mensal)
+                registro['linhas_saida'] = len(indicadores['shares'])
+            indicadores['registros'] = (registros_depois, registros_antes)
+            return indicadores
+
+        return self.cache.obter(self.chave_indicadores(resultado), calcular)
+
+    def chave_saldo(self, resultado):
+        return gerar_chave('saldo', resultado['periodo'], resultado['cod_pais'], resultado['sg_uf'],
+                           tuple(resultado['lista_ncm_filtro']), resultado['versao_dados'])
+
+    def saldo(self, resultado):
+        """Agregados do Saldo Comercial, calculados uma vez por combinação de filtros (em cache compartilhado)."""
+        lista_ncm_filtro = resultado['lista_ncm_filtro']
+
+        def preparar(df):
+            with instrumentacao.etapa('enriquecer', len(df), analise='saldo') as registro:
+                df = analise.preparar_saldo(df, self.mapa_cod_para_ncm)
+                registro['linhas_saida'] = len(df)
+            return df
+
+        def calcular():
+            df_final_exp = preparar(self.recorte_ncm(resultado, 'export', lista_ncm_filtro))
+            df_final_imp = preparar(self.recorte_ncm(resultado, 'import', lista_ncm_filtro))
+            df_mensal_exp = df_mensal_imp = None
+            if not lista_ncm_filtro:
+                df_mensal_exp = preparar(self.recorte(resultado, 'export'))
+                df_mensal_imp = preparar(self.recorte(resultado, 'import'))
+            with instrumentacao.etapa('agregar', len(df_final_exp) + len(df_final_imp), analise='saldo') as registro:
+                saldo = analise.calcular_saldo(df_final_exp, df_final_imp, df_mensal_exp, df_mensal_imp)
+                registro['linhas_saida'] = len(saldo['por_produto'])
+            return saldo
+
+        return self.cache.obter(self.chave_saldo(resultado), calcular)
+
+    def analisar(self, resultado):
+        """Indicadores ou saldo, conforme o tipo da análise."""
+        return self.saldo(resultado) if resultado['tipo'] == 'Saldo Comercial' else self.indicadores(resultado)
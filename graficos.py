@@ -0,0 +1,52 @@
+"""Figuras Plotly do dashboard, montadas a partir dos agregados de ``analise``.
+
+As funções só montam a figura; o app guarda cada uma no cache compartilhado
+por resultado e resolução, então reruns, trocas de aba e outras sessões
+reaproveitam a mesma figura em vez de reconstruí-la.
+
+O plotly é importado na primeira figura montada, não na importação do
+módulo: a tela inicial do app e o modo em lote sem gráficos não pagam por ele.
+"""
+
+# Acima disso os marcadores só aumentam o payload sem ajudar a leitura
+PONTOS_COM_MARCADOR = 120
+
+
+def _modo(pontos):
+    return 'lines+markers' if pontos <= PONTOS_COM_MARCADOR else 'lines'
+
+
+def figura_evolucao(evolucao):
+    import plotly.express as px
+    return px.line(evolucao, x='Data', y='metricFOB', labels={'metricFOB': 'Valor FOB (US$)'},
+                   markers=len(evolucao) <= PONTOS_COM_MARCADOR)
+
+
+def figura_top_produtos(df_top, coluna):
+    import plotly.express as px
+    return px.bar(df_top.sort_values(coluna), x=coluna, y='Produto', orientation='h', text_auto='.2f')
+
+
+def figura_evolucao_saldo(df_evolucao):
+    import plotly.graph_objects as go
+    modo = _modo(len(df_evolucao))
+    fig_linhas = go.Figure()
+    fig_linhas.add_trace(go.Scatter(x=df_evolucao['Data'], y=df_evolucao['Exportação'], mode=modo, name='Exportação', line=dict(color='green', width=2)))
+    fig_linhas.add_trace(go.Scatter(x=df_evolucao['Data'], y=df_evolucao['Importação'], mode=modo, name='Importação', line=dict(color='red', width=2)))
+    fig_linhas.add_trace(go.Scatter(x=df_evolucao['Data'], y=df_evolucao['Saldo'], mode=modo, name='Saldo', line=dict(color='blue', width=3, dash='dot')))
+    fig_linhas.update_layout(xaxis_title="Período", yaxis_title="Valor FOB (US$)", hovermode='x unified')
+    return fig_linhas
+
+
+def figura_saldo_produto(df_saldo_produto, quantidade=15):
+    """Barras dos produtos com maior saldo em valor absoluto."""
+    import plotly.graph_objects as go
+    df_top = df_saldo_produto.reindex(df_saldo_produto['Saldo'].abs().nlargest(quantidade).index).sort_values('Saldo')
+    fig_produto = go.Figure(go.Bar(
+        x=df_top['Saldo'], y=df_top['Produto'], orientation='h',
+        marker_color=['green' if s >= 0 else 'red' for s in df_top['Saldo']],
+        text=[f"US$ {val:,.0f}" for val in df_top['Saldo']], textposition='outside'
+    ))
+    fig_produto.update_layout(title="Saldo por Produto (Verde = Superávit, Vermelho = Déficit)", xaxis_title="Valor FOB (US$)", yaxis_title="Produtos", height=600, showlegend=False)
+    fig_produto.add_vline(x=0, line_dash="dash", line_color="black")
+    return fig_produto
@@ -0,0 +1,107 @@
+"""Índice de NCMs para os filtros de produto (lista colada e Monitor de Tarifados).
+
+Os códigos NCM têm 8 dígitos e são hierárquicos: capítulo (2), SH4 (4),
+SH6 (6) e NCM (8). Tratados como inteiros, todo termo vira um intervalo
+``[início, fim)`` — ``'8471'`` cobre de 84710000 a 84719999 e um código
+completo cobre só ele mesmo — resolvido por busca binária numa lista
+ordenada de códigos.
+
+- ``IndiceNcm``: o catálogo do ``NCM.csv``, montado uma vez por processo,
+  usado para validar os termos digitados.
+- ``IndiceLinhas``: as linhas de um recorte agrupadas por código (os códigos
+  da categoria em ordenação estável, que para inteiros é linear). Filtrar por um conjunto de
+  termos percorre só as categorias e as linhas selecionadas, não o recorte
+  inteiro.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+DIGITOS_NCM = 8
+NIVEIS = {2: 'Capítulo', 4: 'SH4', 6: 'SH6', 8: 'NCM'}
+
+
+def normalizar_termos(termos):
+    """Separa os termos válidos (2, 4, 6 ou 8 dígitos, pontuação ignorada) dos inválidos."""
+    validos, invalidos = [], []
+    for termo in termos:
+        digitos = re.sub(r'[.\-/]', '', str(termo).strip())
+        if digitos.isdigit() and len(digitos) in NIVEIS:
+            validos.append(digitos)
+        elif digitos:
+            invalidos.append(str(termo).strip())
+    return list(dict.fromkeys(validos)), invalidos
+
+
+def intervalos(termos):
+    """Início e fim (exclusivo) de cada termo como arrays de inteiros."""
+    termos = list(termos)
+    if not termos:
+        vazio = np.empty(0, dtype='int64')
+        return vazio, vazio
+    escala = 10 ** (DIGITOS_NCM - np.fromiter((len(termo) for termo in termos), dtype='int64', count=len(termos)))
+    inicio = np.fromiter((int(termo) for termo in termos), dtype='int64', count=len(termos)) * escala
+    return inicio, inicio + escala
+
+
+def _como_inteiros(codigos):
+    return pd.to_numeric(pd.Series(codigos, dtype='object'), errors='coerce').fillna(-1).to_numpy(dtype='int64')
+
+
+def _concatenar_faixas(inicio, fim):
+    """``np.concatenate([np.arange(i, f) for i, f in zip(inicio, fim)])`` sem laço em Python."""
+    tamanhos = fim - inicio
+    deslocamentos = np.repeat(inicio - np.concatenate(([0], np.cumsum(tamanhos)[:-1])), tamanhos)
+    return np.arange(tamanhos.sum()) + deslocamentos
+
+
+def _posicoes_nos_intervalos(ordenados, termos):
+    """Posições de ``ordenados`` que caem em algum dos intervalos dos termos."""
+    inicio, fim = intervalos(termos)
+    # Termos sobrepostos ('84' e '8471') repetiriam posições
+    return np.unique(_concatenar_faixas(np.searchsorted(ordenados, inicio), np.searchsorted(ordenados, fim)))
+
+
+class IndiceNcm:
+    def __init__(self, codigos):
+        valores = _como_inteiros(codigos)
+        self._codigos = np.unique(valores[valores >= 0])
+
+    def __len__(self):
+        return len(self._codigos)
+
+    def sem_correspondencia(self, termos) -> list:
+        """Termos que não cobrem nenhum código do catálogo."""
+        inicio, fim = intervalos(termos)
+        vazios = np.searchsorted(self._codigos, inicio) == np.searchsorted(self._codigos, fim)
+        return [termo for termo, vazio in zip(termos, vazios) if vazio]
+
+
+class IndiceLinhas:
+    def __init__(self, codigos: pd.Series):
+        codigos = codigos.astype('category')
+        valores = _como_inteiros(codigos.cat.categories)
+        self._ordem_categorias = np.argsort(valores, kind='stable')
+        self._valores_ordenados = valores[self._ordem_categorias]
+        posicao_categoria = codigos.cat.codes.to_numpy()
+        # argsort estável de inteiros pequenos é um radix sort, linear no número de linhas
+        self._linhas = np.argsort(posicao_categoria, kind='stable').astype('int32')
+        contagem = np.bincount(posicao_categoria[posicao_categoria >= 0], minlength=len(valores))
+        # Linhas sem código (posição -1) ficam no início da ordenação e fora de qualquer categoria
+        self._limites = np.concatenate(([0], np.cumsum(contagem))) + np.count_nonzero(posicao_categoria < 0)
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in (self._ordem_categorias, self._valores_ordenados, self._linhas, self._limites))
+
+    def _categorias(self, termos):
+        posicoes = _posicoes_nos_intervalos(self._valores_ordenados, termos)
+        return self._ordem_categorias[posicoes]
+
+    def linhas(self, *filtros) -> np.ndarray:
+        """Posições, em ordem, das linhas cujo NCM atende a todos os filtros (listas de termos)."""
+        categorias = self._categorias(filtros[0])
+        for termos in filtros[1:]:
+            categorias = np.intersect1d(categorias, self._categorias(termos), assume_unique=True)
+        return np.sort(self._linhas[_concatenar_faixas(self._limites[categorias], self._limites[categorias + 1])])
@@ -0,0 +1,113 @@
+"""Medição das etapas do pipeline do dashboard: carregar → filtrar → enriquecer → agregar → renderizar.
+
+Cada etapa registra tempo de parede, linhas de entrada e de saída e a
+variação da memória residente do processo. A memória é aproximada: num
+servidor com várias sessões, a variação inclui o que outras threads
+alocaram no mesmo intervalo.
+
+As etapas de um mesmo rerun do script são agrupadas numa execução
+(``iniciar_execucao``/``finalizar_execucao``). As últimas execuções ficam
+em memória para o painel de desempenho, e cada etapa e execução também sai
+como uma linha JSON no logger ``comexstat.desempenho``
+(ver ``configurar_log``).
+"""
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+import pandas as pd
+
+EXECUCOES_GUARDADAS = 200
+
+logger = logging.getLogger('comexstat.desempenho')
+_execucao = contextvars.ContextVar('execucao', default=None)
+_historico = deque(maxlen=EXECUCOES_GUARDADAS)
+_trava = threading.Lock()
+
+
+def configurar_log(caminho):
+    """Grava os registros como JSON Lines em ``caminho`` (uma vez por processo)."""
+    if any(getattr(handler, 'baseFilename', None) == os.path.abspath(caminho) for handler in logger.handlers):
+        return
+    handler = logging.FileHandler(caminho, encoding='utf-8')
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+
+def memoria_residente_mb():
+    try:
+        with open('/proc/self/statm') as arquivo:
+            return int(arquivo.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError, AttributeError):  # fora do Linux
+        return None
+
+
+def _registrar(evento, dados):
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps({'evento': evento, 'instante': time.time(), **dados}, default=str, ensure_ascii=False))
+
+
+def iniciar_execucao():
+    _execucao.set({'execucao': uuid.uuid4().hex[:12], 'inicio': time.time(), 'etapas': []})
+
+
+@contextlib.contextmanager
+def etapa(nome, linhas_entrada=None, **detalhes):
+    """Mede o bloco; quem chama preenche ``registro['linhas_saida']`` (e outros detalhes) dentro dele."""
+    registro = {'etapa': nome, 'linhas_entrada': linhas_entrada, 'linhas_saida': None, **detalhes}
+    memoria_inicial = memoria_residente_mb()
+    inicio = time.perf_counter()
+    try:
+        yield registro
+    finally:
+        registro['segundos'] = time.perf_counter() - inicio
+        memoria_final = memoria_residente_mb()
+        registro['memoria_mb'] = None if memoria_inicial is None else memoria_final - memoria_inicial
+        execucao = _execucao.get()
+        if execucao is not None:
+            registro['execucao'] = execucao['execucao']
+            execucao['etapas'].append(registro)
+        _registrar('etapa', registro)
+
+
+def finalizar_execucao(rotulo):
+    """Fecha a execução corrente; reruns em que nenhuma etapa rodou não são guardados."""
+    execucao = _execucao.get()
+    _execucao.set(None)
+    if not execucao or not execucao['etapas']:
+        return None
+    execucao.update(rotulo=rotulo, segundos=time.time() - execucao['inicio'])
+    with _trava:
+        _historico.append(execucao)
+    _registrar('execucao', {'execucao': execucao['execucao'], 'rotulo': rotulo,
+                            'segundos': execucao['segundos'], 'etapas': len(execucao['etapas'])})
+    return execucao
+
+
+def etapas_recentes() -> pd.DataFrame:
+    """Todas as etapas das execuções guardadas, da mais antiga para a mais recente."""
+    with _trava:
+        linhas = [{'rotulo': execucao['rotulo'], **registro} for execucao in _historico for registro in execucao['etapas']]
+    return pd.DataFrame(linhas)
+
+
+def resumo_por_etapa() -> pd.DataFrame:
+    """Tempo médio e p95, linhas e memória por etapa nas execuções guardadas."""
+    etapas = etapas_recentes()
+    if etapas.empty:
+        return pd.DataFrame(columns=['Etapa', 'Ocorrências', 'Tempo médio (s)', 'Tempo p95 (s)', 'Linhas de saída (média)', 'Memória (MB, média)'])
+    etapas[['linhas_saida', 'memoria_mb']] = etapas[['linhas_saida', 'memoria_mb']].apply(pd.to_numeric, errors='coerce')
+    return etapas.groupby('etapa', sort=False).agg(**{
+        'Ocorrências': ('segundos', 'size'),
+        'Tempo médio (s)': ('segundos', 'mean'),
+        'Tempo p95 (s)': ('segundos', lambda segundos: segundos.quantile(0.95)),
+        'Linhas de saída (média)': ('linhas_saida', 'mean'),
+        'Memória (MB, média)': ('memoria_mb', 'mean'),
+    }).rename_axis('Etapa').reset_index()
@@ -0,0 +1,42 @@
+"""Prepara a pasta ``dados`` para o dashboard.
+
+Uso:
+    python preprocessamento.py [diretorio_dados]
+"""
+import os
+import sys
+
+import armazenamento
+import referencias
+
+FLUXOS = ['export', 'import']
+
+
+def datasets_pendentes(diretorio_dados):
+    """Se falta algum dataset derivado (partições, rollups ou cópias IPC) na pasta.
+
+    As cópias IPC de cada dataset são a última etapa dele, então a presença
+    de todas indica um preparo completo.
+    """
+    return any(not os.path.isdir(armazenamento.diretorio_ipc(diretorio_dados, dataset, fluxo))
+               for dataset in [*armazenamento.DATASETS, *armazenamento.ROLLUPS] for fluxo in FLUXOS)
+
+
+def preparar_datasets(diretorio_dados):
+    for dataset in armazenamento.DATASETS:
+        for fluxo in FLUXOS:
+            anos = armazenamento.particionar(diretorio_dados, dataset, fluxo)
+            print(f"{dataset}/{fluxo}: {len(anos)} anos particionados ({anos[0]}-{anos[-1]})")
+            armazenamento.exportar_ipc(diretorio_dados, dataset, fluxo)
+    for nome in armazenamento.ROLLUPS:
+        for fluxo in FLUXOS:
+            armazenamento.construir_rollup(diretorio_dados, nome, fluxo)
+            armazenamento.exportar_ipc(diretorio_dados, nome, fluxo)
+            print(f"rollup {nome}/{fluxo}: ok")
+    referencias.compilar(diretorio_dados)
+    print("referências compiladas: ok")
+
+
+if __name__ == "__main__":
+    diretorio = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.realpath(__file__)), "dados")
+    preparar_datasets(diretorio)
@@ -0,0 +1,123 @@
+"""Tabelas de referência do dashboard: países, UFs, NCMs e a lista do Monitor de Tarifados.
+
+Sem dependência do Streamlit; o app guarda o resultado em ``st.cache_resource``
+e o modo em lote carrega uma vez por processo.
+
+``carregar`` devolve as estruturas de consulta já montadas (mapas código ↔
+nome, listas da barra lateral e o índice de NCM). Elas ficam compiladas em
+``referencias.pkl`` ao lado dos CSVs e só são remontadas quando algum CSV
+muda, então um processo novo não relê nem reindexa a tabela de NCM.
+"""
+import os
+import pickle
+import uuid
+
+import pandas as pd
+
+from indice_ncm import DIGITOS_NCM, IndiceNcm, normalizar_termos
+
+PAISES_EXCLUIDOS = ['Bancos Centrais', 'A Designar']
+UFS_VALIDAS = [
+    'AC', 'AL', 'AP', 'AM', 'BA', 'CE', 'DF', 'ES', 'GO', 'MA',
+    'MT', 'MS', 'MG', 'PA', 'PB', 'PR', 'PE', 'PI', 'RJ', 'RN',
+    'RS', 'RO', 'RR', 'SC', 'SP', 'SE', 'TO'
+]
+NOME_NCM_TARIFADOS = 'lista_ncm_tarifados.csv'
+NOME_COMPILADO = 'referencias.pkl'
+ARQUIVOS_ORIGEM = ['PAIS.csv', 'UF.csv', 'NCM.csv', NOME_NCM_TARIFADOS]
+# Mude ao alterar os atributos de ``Referencias``: arquivos compilados antes disso são refeitos
+VERSAO_FORMATO = 2
+PAIS_MUNDO = 'Mundo'
+UF_TODOS = 'Todos'
+
+
+def carregar_tabelas_auxiliares(diretorio_dados):
+    """PAIS, UF e NCM já filtrados; ``FileNotFoundError`` se algum arquivo faltar."""
+    df_paises = pd.read_csv(os.path.join(diretorio_dados, "PAIS.csv"), sep=';', encoding='latin-1', dtype={'CO_PAIS': str})
+    df_ufs = pd.read_csv(os.path.join(diretorio_dados, "UF.csv"), sep=';', encoding='latin-1', dtype={'CO_UF': str})
+    df_ncm = pd.read_csv(os.path.join(diretorio_dados, "NCM.csv"), sep=';', encoding='latin-1', dtype={'CO_NCM': str})
+
+    # Filtros para limpar os dados
+    df_paises = df_paises[~df_paises['NO_PAIS'].isin(PAISES_EXCLUIDOS)]
+    df_ufs = df_ufs[df_ufs['SG_UF'].isin(UFS_VALIDAS)]
+    return df_paises, df_ufs, df_ncm
+
+
+def carregar_ncm_tarifados(caminho_arquivo):
+    """Códigos do Monitor de Tarifados, já normalizados; ``FileNotFoundError`` se a lista não existir.
+
+    Pontuação é ignorada, códigos com o zero à esquerda perdido (7 dígitos,
+    comum em listas que passaram por planilha) são completados e entradas
+    vazias ou inválidas são descartadas, como o filtro por ``isin`` fazia.
+    """
+    df = pd.read_csv(caminho_arquivo, dtype={'CO_NCM': str})
+    codigos = df['CO_NCM'].dropna().str.strip()
+    codigos = codigos.where(~(codigos.str.isdigit() & (codigos.str.len() == DIGITOS_NCM - 1)), codigos.str.zfill(DIGITOS_NCM))
+    validos, _ = normalizar_termos(codigos)
+    return set(validos)
+
+
+class Referencias:
+    """Estruturas de consulta derivadas das tabelas de referência (montadas uma vez, só leitura)."""
+
+    def __init__(self, df_paises, df_ufs, df_ncm, ncm_tarifados=None, assinatura=None):
+        self.assinatura = assinatura
+        self.mapa_pais_para_cod = dict(zip(df_paises['NO_PAIS'], df_paises['CO_PAIS']))
+        self.mapa_cod_para_pais = dict(zip(df_paises['CO_PAIS'], df_paises['NO_PAIS']))
+        self.mapa_uf_para_cod = dict(zip(df_ufs['SG_UF'], df_ufs['CO_UF']))
+        self.mapa_cod_para_ncm = dict(zip(df_ncm['CO_NCM'], df_ncm['NO_NCM_POR']))
+        self.lista_paises = [PAIS_MUNDO] + sorted(df_paises['NO_PAIS'].tolist())
+        self.lista_ufs = [UF_TODOS] + sorted(df_ufs['SG_UF'].tolist())
+        self.indice_ncm = IndiceNcm(df_ncm['CO_NCM'])
+        # None quando a lista do Monitor de Tarifados não existe (o app avisa)
+        self.ncm_tarifados = ncm_tarifados
+
+
+def _assinatura(diretorio_dados):
+    """Tamanho e data de modificação dos CSVs de origem (``None`` para os que faltam)."""
+    assinatura = [VERSAO_FORMATO]
+    for nome in ARQUIVOS_ORIGEM:
+        caminho = os.path.join(diretorio_dados, nome)
+        info = os.stat(caminho) if os.path.exists(caminho) else None
+        assinatura.append((nome, info.st_size, info.st_mtime_ns) if info else (nome, None))
+    return tuple(assinatura)
+
+
+def compilar(diretorio_dados):
+    """Monta as referências a partir dos CSVs e grava ``referencias.pkl``; devolve o resultado.
+
+    ``FileNotFoundError`` se PAIS, UF ou NCM faltarem. Uma pasta sem permissão
+    de escrita só impede a gravação; as referências são devolvidas assim mesmo.
+    """
+    assinatura = _assinatura(diretorio_dados)
+    df_paises, df_ufs, df_ncm = carregar_tabelas_auxiliares(diretorio_dados)
+    try:
+        ncm_tarifados = carregar_ncm_tarifados(os.path.join(diretorio_dados, NOME_NCM_TARIFADOS))
+    except FileNotFoundError:
+        ncm_tarifados = None
+    referencias = Referencias(df_paises, df_ufs, df_ncm, ncm_tarifados, assinatura)
+
+    caminho = os.path.join(diretorio_dados, NOME_COMPILADO)
+    temporario = f"{caminho}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(temporario, 'wb') as arquivo:
+            pickle.dump(referencias, arquivo, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporario, caminho)
+    except OSError:
+        pass
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+    return referencias
+
+
+def carregar(diretorio_dados):
+    """Referências compiladas da pasta, recompiladas se algum CSV de origem mudou."""
+    try:
+        with open(os.path.join(diretorio_dados, NOME_COMPILADO), 'rb') as arquivo:
+            referencias = pickle.load(arquivo)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError):
+        referencias = None
+    if getattr(referencias, 'assinatura', None) == _assinatura(diretorio_dados):
+        return referencias
+    return compilar(diretorio_dados)
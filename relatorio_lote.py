@@ -0,0 +1,263 @@
+"""Modo em lote: a mesma análise do dashboard para muitos parceiros, gravada em disco.
+
+Monta todas as combinações de período, tipo de análise (Exportação,
+Importação, Saldo Comercial), país e UF pedidas e as distribui num pool de
+processos. Cada processo abre o ``ArmazemDados`` uma única vez (as cópias
+IPC são memory-maps, então as páginas dos fatos são compartilhadas pelo
+sistema operacional entre os processos) e usa o mesmo pipeline do app
+(``consultas.Consultas``). As tarefas são entregues em blocos contíguos por
+período e tipo, de modo que o recorte do mundo e os rollups de um período
+são lidos uma vez por processo e reaproveitados por todos os países do
+bloco.
+
+Para cada combinação com dados é criada uma pasta
+``DESTINO/<período>/<tipo>/<código>_<país>[-<UF>]`` com as tabelas (CSV no formato
+brasileiro, CSV compactado ou Parquet) e os gráficos em HTML. O arquivo
+``DESTINO/resumo.csv`` lista todas as combinações, com os totais, o tempo
+de cada uma e a situação (gravada, sem dados ou o erro).
+
+Com ``--cache`` apontando para a pasta de cache do dashboard
+(``COMEX_CACHE_DIR``), os resultados calculados aqui ficam disponíveis para
+as sessões do app com os mesmos filtros.
+
+Uso:
+    python relatorio_lote.py DESTINO --periodo 2024-01:2025-07 [--periodo ...]
+        [--tipos exportacao,importacao,saldo] [--paises todos|Mundo,249,...] [--ufs todos|cada|SP,MG]
+        [--ncm 8471,1201] [--monitor-tarifados] [--formato csv|csv.gz|parquet] [--sem-graficos]
+        [--processos N] [--cache DIR] [--dados DIR]
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import analise
+import armazenamento
+import graficos
+import referencias
+import tabelas
+from armazem_compartilhado import ArmazemDados
+from cache_resultados import CacheResultados
+from consultas import Consultas, montar_resultado
+from indice_ncm import normalizar_termos
+
+DIRETORIO_DADOS = os.path.join(os.path.dirname(os.path.realpath(__file__)), "dados")
+LIMITE_CACHE_MEMORIA_MB = 1024
+LIMITE_CACHE_DISCO_MB = 4096
+TIPOS = {'exportacao': 'Exportação', 'importacao': 'Importação', 'saldo': 'Saldo Comercial'}
+FORMATOS = {dados['extensao']: nome for nome, dados in tabelas.FORMATOS.items()}
+PAIS_MUNDO = referencias.PAIS_MUNDO
+# Palavras-chave da linha de comando (não confundir com os rótulos da barra lateral em ``referencias``)
+TODOS_CLI = 'todos'
+CADA_CLI = 'cada'
+# Blocos por processo: mais blocos equilibram a carga, menos aproveitam melhor o cache de cada processo
+BLOCOS_POR_PROCESSO = 4
+
+_consultas = None
+
+
+def _nome_pasta(texto):
+    texto = unicodedata.normalize('NFKD', str(texto)).encode('ascii', 'ignore').decode()
+    return re.sub(r'[^A-Za-z0-9]+', '_', texto).strip('_').lower() or 'sem_nome'
+
+
+def _ler_periodo(texto):
+    """``'2024-01:2025-07'`` -> ``(2024, 1, 2025, 7)``."""
+    correspondencia = re.fullmatch(r'(\d{4})-(\d{1,2}):(\d{4})-(\d{1,2})', texto.strip())
+    if not correspondencia:
+        raise argparse.ArgumentTypeError(f"Período inválido: {texto!r} (use AAAA-MM:AAAA-MM)")
+    ano_inicio, mes_inicio, ano_fim, mes_fim = map(int, correspondencia.groups())
+    if not (1 <= mes_inicio <= 12 and 1 <= mes_fim <= 12) or (ano_inicio, mes_inicio) > (ano_fim, mes_fim):
+        raise argparse.ArgumentTypeError(f"Período inválido: {texto!r}")
+    return ano_inicio, mes_inicio, ano_fim, mes_fim
+
+
+def _iniciar_processo(diretorio_dados, diretorio_cache):
+    """Abre dados, referências e cache uma vez por processo do pool."""
+    global _consultas
+    compiladas = referencias.carregar(diretorio_dados)
+    _consultas = Consultas(
+        ArmazemDados(diretorio_dados),
+        CacheResultados(diretorio_cache, LIMITE_CACHE_MEMORIA_MB, LIMITE_CACHE_DISCO_MB),
+        compiladas.mapa_cod_para_pais,
+        compiladas.mapa_cod_para_ncm,
+        compiladas.ncm_tarifados or (),
+    )
+
+
+def _gravar_tabela(df, caminho_base, formato, coluna_ordem, ascendente=False):
+    caminho = f"{caminho_base}.{formato}"
+    tabelas.exportar(df, tabelas.ordenar(df, [coluna_ordem], ascendente), FORMATOS[formato], caminho)
+    return caminho
+
+
+def _gravar_figura(figura, caminho):
+    # O plotly.js vem da CDN: cada arquivo fica com poucos KB em vez de alguns MB
+    figura.write_html(caminho, include_plotlyjs='cdn')
+
+
+def _gravar_indicadores(indicadores, resultado, pasta, formato, graficos_html):
+    evolucao = indicadores['evolucao'].rename(columns={'metricFOB': 'Valor FOB (US$)'})
+    _gravar_tabela(evolucao, os.path.join(pasta, 'evolucao'), formato, 'Data', ascendente=True)
+    shares = indicadores['shares']
+    if not shares.empty:
+        _gravar_tabela(shares, os.path.join(pasta, 'produtos'), formato, 'Valor FOB País')
+    if graficos_html:
+        resolucao = analise.resolucao_automatica(*resultado['periodo'])
+        _gravar_figura(graficos.figura_evolucao(analise.agregar_por_periodo(indicadores['evolucao'], resolucao)),
+                       os.path.join(pasta, 'evolucao.html'))
+        if not shares.empty:
+            df_top_10 = shares.nlargest(10, 'Valor FOB País')
+            _gravar_figura(graficos.figura_top_produtos(df_top_10, 'Share na Pauta (%)'), os.path.join(pasta, 'pauta.html'))
+            if 'Coeficiente de Concentração de Produtos (%)' in shares.columns:
+                _gravar_figura(graficos.figura_top_produtos(df_top_10, 'Coeficiente de Concentração de Produtos (%)'),
+                               os.path.join(pasta, 'mercado.html'))
+    return {'Total (US$)': indicadores['total'], 'Produtos': len(shares)}
+
+
+def _gravar_saldo(saldo, resultado, pasta, formato, graficos_html):
+    _gravar_tabela(saldo['evolucao'], os.path.join(pasta, 'evolucao'), formato, 'Data', ascendente=True)
+    df_saldo_produto = saldo['por_produto'].rename(columns={'Exportação': 'Exportação (US$)', 'Importação': 'Importação (US$)', 'Saldo': 'Saldo (US$)'})
+    _gravar_tabela(df_saldo_produto, os.path.join(pasta, 'por_produto'), formato, 'Saldo (US$)')
+    if graficos_html:
+        resolucao = analise.resolucao_automatica(*resultado['periodo'])
+        _gravar_figura(graficos.figura_evolucao_saldo(analise.agregar_por_periodo(saldo['evolucao'], resolucao)),
+                       os.path.join(pasta, 'evolucao_saldo.html'))
+        _gravar_figura(graficos.figura_saldo_produto(saldo['por_produto']), os.path.join(pasta, 'saldo_produto.html'))
+    return {f"{chave} (US$)": valor for chave, valor in saldo['totais'].items()} | {'Produtos': len(saldo['por_produto'])}
+
+
+def processar(tarefa):
+    """Calcula e grava uma combinação; devolve a linha do resumo (erros não interrompem o lote)."""
+    resultado, pais, uf, pasta, formato, graficos_html = tarefa
+    linha = {'Período': '{}-{:02d}:{}-{:02d}'.format(*resultado['periodo']), 'Tipo': resultado['tipo'],
+             'País': pais, 'UF': uf or 'Todas', 'Situação': 'ok', 'Pasta': None}
+    inicio = time.perf_counter()
+    try:
+        saida = _consultas.analisar(resultado)
+        if saida['vazio']:
+            linha['Situação'] = 'sem dados'
+        else:
+            os.makedirs(pasta, exist_ok=True)
+            gravar = _gravar_saldo if resultado['tipo'] == 'Saldo Comercial' else _gravar_indicadores
+            linha.update(gravar(saida, resultado, pasta, formato, graficos_html), Pasta=pasta)
+    except Exception as erro:  # noqa: BLE001 - uma combinação com problema não deve derrubar as demais
+        linha['Situação'] = f"erro: {type(erro).__name__}: {erro}"
+    linha['Segundos'] = round(time.perf_counter() - inicio, 3)
+    return linha
+
+
+def _selecionar_paises(df_paises, texto):
+    if texto.strip().lower() == TODOS_CLI:
+        return sorted(zip(df_paises['CO_PAIS'], df_paises['NO_PAIS']), key=lambda par: par[1])
+    por_codigo = df_paises.set_index('CO_PAIS')['NO_PAIS'].to_dict()
+    por_nome = {nome.lower(): codigo for codigo, nome in por_codigo.items()}
+    selecionados = []
+    for termo in (termo.strip() for termo in texto.split(',') if termo.strip()):
+        if termo.lower() == PAIS_MUNDO.lower():
+            selecionados.append((None, PAIS_MUNDO))
+        elif termo.zfill(3) in por_codigo:
+            selecionados.append((termo.zfill(3), por_codigo[termo.zfill(3)]))
+        elif termo.lower() in por_nome:
+            selecionados.append((por_nome[termo.lower()], por_codigo[por_nome[termo.lower()]]))
+        else:
+            raise SystemExit(f"País não encontrado em PAIS.csv: {termo!r}")
+    return selecionados
+
+
+def _selecionar_ufs(df_ufs, texto):
+    ufs = []
+    for termo in (termo.strip() for termo in texto.split(',') if termo.strip()):
+        if termo.lower() == TODOS_CLI:
+            ufs.append(None)
+        elif termo.lower() == CADA_CLI:
+            ufs += sorted(df_ufs['SG_UF'])
+        elif termo.upper() in set(df_ufs['SG_UF']):
+            ufs.append(termo.upper())
+        else:
+            raise SystemExit(f"UF inválida: {termo!r}")
+    return list(dict.fromkeys(ufs))
+
+
+def montar_tarefas(destino, periodos, tipos, paises, ufs, lista_ncm_filtro, monitor_tarifados, formato,
+                   graficos_html, versao_dados):
+    """Uma tarefa por combinação, ordenadas por período e tipo (blocos que compartilham recortes)."""
+    tarefas = []
+    for periodo in periodos:
+        for tipo in tipos:
+            for cod_pais, pais in paises:
+                for uf in ufs:
+                    resultado = montar_resultado(tipo, periodo, cod_pais, uf, lista_ncm_filtro,
+                                                 monitor_tarifados and tipo == 'Exportação', versao_dados)
+                    pasta = os.path.join(destino, '{}-{:02d}_{}-{:02d}'.format(*periodo), _nome_pasta(tipo),
+                                         (f"{cod_pais}_" if cod_pais else '') + _nome_pasta(pais) + (f"-{uf}" if uf else ''))
+                    tarefas.append((resultado, pais, uf, pasta, formato, graficos_html))
+    return tarefas
+
+
+def executar(destino, tarefas, diretorio_dados=DIRETORIO_DADOS, processos=None, diretorio_cache=None):
+    """Roda as tarefas no pool e grava ``resumo.csv``; devolve o resumo."""
+    processos = processos or os.cpu_count() or 1
+    os.makedirs(destino, exist_ok=True)
+    linhas = []
+    referencias.carregar(diretorio_dados)  # compila antes do pool: os processos só leem o arquivo
+    with tempfile.TemporaryDirectory(prefix='comex-lote-') as diretorio_temporario:
+        with ProcessPoolExecutor(processos, initializer=_iniciar_processo,
+                                 initargs=(diretorio_dados, diretorio_cache or diretorio_temporario)) as executor:
+            bloco = max(1, len(tarefas) // (processos * BLOCOS_POR_PROCESSO))
+            for numero, linha in enumerate(executor.map(processar, tarefas, chunksize=bloco), start=1):
+                linhas.append(linha)
+                print(f"[{numero}/{len(tarefas)}] {linha['Tipo']} | {linha['País']} | {linha['UF']}: {linha['Situação']}", file=sys.stderr)
+    resumo = pd.DataFrame(linhas)
+    tabelas.gravar_csv([resumo], os.path.join(destino, 'resumo.csv'))
+    return resumo
+
+
+def _ler_argumentos():
+    parser = argparse.ArgumentParser(description="Gera em lote as análises do dashboard para vários parceiros.")
+    parser.add_argument('destino', help="pasta onde gravar tabelas, gráficos e resumo.csv")
+    parser.add_argument('--periodo', type=_ler_periodo, action='append', required=True,
+                        help="AAAA-MM:AAAA-MM (pode ser repetido)")
+    parser.add_argument('--tipos', default=','.join(TIPOS), help=f"entre {', '.join(TIPOS)}, separados por vírgula")
+    parser.add_argument('--paises', default=TODOS_CLI, help=f"'{TODOS_CLI}', ou códigos/nomes separados por vírgula (aceita 'Mundo')")
+    parser.add_argument('--ufs', default=TODOS_CLI, help=f"'{TODOS_CLI}' (sem filtro de UF), '{CADA_CLI}' (as 27 UFs) ou siglas")
+    parser.add_argument('--ncm', default='', help="NCMs ou prefixos (2, 4, 6 ou 8 dígitos) separados por vírgula")
+    parser.add_argument('--monitor-tarifados', action='store_true', help="restringe as exportações à lista de tarifados")
+    parser.add_argument('--formato', choices=list(FORMATOS), default='csv')
+    parser.add_argument('--sem-graficos', action='store_true')
+    parser.add_argument('--processos', type=int, default=None, help="padrão: número de CPUs")
+    parser.add_argument('--cache', default=None, help="pasta de cache (a do dashboard, para reaproveitar resultados)")
+    parser.add_argument('--dados', default=DIRETORIO_DADOS)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    argumentos = _ler_argumentos()
+    tipos = []
+    for termo in (termo.strip().lower() for termo in argumentos.tipos.split(',') if termo.strip()):
+        if termo not in TIPOS:
+            raise SystemExit(f"Tipo inválido: {termo!r} (use {', '.join(TIPOS)})")
+        tipos.append(TIPOS[termo])
+    df_paises, df_ufs, _ = referencias.carregar_tabelas_auxiliares(argumentos.dados)
+    termos_ncm, termos_invalidos = normalizar_termos(argumentos.ncm.split(','))
+    if termos_invalidos:
+        print(f"NCMs ignorados (formato inválido): {', '.join(termos_invalidos)}", file=sys.stderr)
+
+    inicio = time.perf_counter()
+    # Compila as referências antes de medir a versão dos dados, que inclui os arquivos da pasta
+    referencias.carregar(argumentos.dados)
+    versao = armazenamento.versao_dados(argumentos.dados)
+    tarefas = montar_tarefas(argumentos.destino, argumentos.periodo, tipos,
+                             _selecionar_paises(df_paises, argumentos.paises), _selecionar_ufs(df_ufs, argumentos.ufs),
+                             termos_ncm, argumentos.monitor_tarifados, argumentos.formato,
+                             not argumentos.sem_graficos, versao)
+    resumo = executar(argumentos.destino, tarefas, argumentos.dados, argumentos.processos, argumentos.cache)
+    gravadas = resumo['Pasta'].notna().sum()
+    print(f"{gravadas} de {len(resumo)} combinações gravadas em {argumentos.destino} "
+          f"({time.perf_counter() - inicio:.1f}s); detalhes em resumo.csv")
@@ -0,0 +1,272 @@
+"""Roda as consultas padrão do dashboard sem o Streamlit e mede tempo e memória.
+
+Cada consulta roda num processo novo (``spawn``), sobre uma pasta de dados
+gerada por ``gerar_dados.py`` (ou a pasta real, informando o período), pelo
+mesmo pipeline do app (``consultas.Consultas``). Para cada uma são medidos:
+
+- ``fria_s``: a primeira execução no processo, com cache vazio e os arquivos
+  IPC ainda não mapeados (o primeiro usuário depois de um reinício);
+- ``mediana_s``/``minimo_s``: ``--repeticoes`` execuções com cache de
+  resultados vazio, mas dados já mapeados (o custo de uma combinação nova
+  de filtros);
+- ``em_cache_s``: a mesma consulta servida pelo cache em memória;
+- ``pico_mb``: quanto o pico de memória residente do processo subiu na
+  execução fria; ``retida_mb``: quanto continuou ocupado depois dela
+  (cache e memory-maps);
+- ``etapas``: o tempo da execução fria por etapa do pipeline
+  (carregar, filtrar, enriquecer, agregar).
+
+Antes das consultas é medida a inicialização de um processo novo do app:
+montar as referências a partir dos CSVs (``compilar_s``), lê-las do arquivo
+compilado (``carregar_s``, o caminho normal) e quais módulos pesados já
+foram importados só por carregar os módulos do app (devem ficar para a
+primeira figura ou o primeiro download).
+
+O resultado de cada consulta (totais) também é guardado, para confirmar
+que uma otimização não mudou os números. Com ``--saida`` o relatório vai
+para um JSON, e ``--comparar`` mostra a variação em relação a um JSON
+anterior.
+
+Uso:
+    python scripts/benchmarks/executar.py DADOS [--repeticoes 3] [--consultas mundo_varios_anos,pais_uf]
+        [--saida atual.json] [--comparar anterior.json]
+        [--ano-inicio 1997 --ano-fim 2025 --meses-ano-fim 7]  (pastas sem sintetico.json)
+"""
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+sys.path.insert(0, RAIZ)
+
+import armazenamento  # noqa: E402
+import instrumentacao  # noqa: E402
+import referencias  # noqa: E402
+from armazem_compartilhado import ArmazemDados  # noqa: E402
+from cache_resultados import CacheResultados  # noqa: E402
+from consultas import Consultas, montar_resultado  # noqa: E402
+from gerar_dados import NOME_PARAMETROS  # noqa: E402
+
+REPETICOES = 3
+LIMITE_CACHE_MEMORIA_MB = 4096
+LIMITE_CACHE_DISCO_MB = 8192
+TAMANHO_LISTA_NCM = 1000
+PAIS_PADRAO = '249'  # Estados Unidos
+UF_PADRAO = 'SP'
+MODULOS_PESADOS = ('plotly', 'requests')
+
+
+def consultas_padrao(parametros, codigos_ncm):
+    """Filtros das consultas padrão, derivados do período dos dados."""
+    ano_inicio, ano_fim, mes_fim = parametros['ano_inicio'], parametros['ano_fim'], parametros['meses_ano_fim']
+
+    def ultimos(anos):
+        return max(ano_inicio, ano_fim - anos + 1), 1, ano_fim, mes_fim
+
+    # Lista grande: códigos completos espalhados pelo catálogo e alguns prefixos SH4
+    passo = max(1, len(codigos_ncm) // TAMANHO_LISTA_NCM)
+    lista_ncm = list(codigos_ncm[::passo][:TAMANHO_LISTA_NCM]) + sorted({codigo[:4] for codigo in codigos_ncm[::passo * 50]})
+    return {
+        'mundo_varios_anos': {'tipo': 'Importação', 'periodo': (ano_inicio, 1, ano_fim, mes_fim)},
+        'pais_uf': {'tipo': 'Exportação', 'periodo': ultimos(2), 'cod_pais': PAIS_PADRAO, 'sg_uf': UF_PADRAO},
+        'lista_ncm_grande': {'tipo': 'Exportação', 'periodo': ultimos(5), 'lista_ncm_filtro': lista_ncm},
+        'saldo_comercial': {'tipo': 'Saldo Comercial', 'periodo': ultimos(5), 'cod_pais': PAIS_PADRAO},
+        'monitor_tarifados': {'tipo': 'Exportação', 'periodo': ultimos(2), 'cod_pais': PAIS_PADRAO, 'monitor_tarifados': True},
+    }
+
+
+def _pico_mb():
+    """Pico de memória residente do processo até agora."""
+    import resource
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / 2**20 if sys.platform == 'darwin' else pico / 2**10  # bytes no macOS, KB no Linux
+
+
+def _resumo_resultado(saida):
+    """Totais da análise, para conferir que os números não mudaram entre execuções."""
+    if 'totais' in saida:
+        return {chave: float(valor) for chave, valor in saida['totais'].items()} | {'produtos': len(saida['por_produto'])}
+    return {'total': float(saida['total']), 'produtos': len(saida['shares']), 'linhas': int(saida['registros'][0])}
+
+
+def _etapas(execucao):
+    segundos = {}
+    for registro in execucao['etapas'] if execucao else []:
+        segundos[registro['etapa']] = round(segundos.get(registro['etapa'], 0) + registro['segundos'], 4)
+    return segundos
+
+
+def medir(diretorio_dados, nome, filtros, repeticoes):
+    """Executa uma consulta padrão neste processo e devolve as medidas."""
+    # As mesmas referências compiladas que o app usa
+    compiladas = referencias.carregar(diretorio_dados)
+    armazem = ArmazemDados(diretorio_dados)
+    resultado = montar_resultado(**filtros, versao_dados=armazenamento.versao_dados(diretorio_dados))
+
+    with tempfile.TemporaryDirectory(prefix='benchmark-cache-') as diretorio_cache:
+        def novas_consultas():
+            cache = CacheResultados(tempfile.mkdtemp(dir=diretorio_cache), LIMITE_CACHE_MEMORIA_MB, LIMITE_CACHE_DISCO_MB)
+            return Consultas(armazem, cache, compiladas.mapa_cod_para_pais, compiladas.mapa_cod_para_ncm,
+                             compiladas.ncm_tarifados or ())
+
+        consultas = novas_consultas()
+        pico_inicial, residente_inicial = _pico_mb(), instrumentacao.memoria_residente_mb()
+        instrumentacao.iniciar_execucao()
+        inicio = time.perf_counter()
+        saida = consultas.analisar(resultado)
+        fria = time.perf_counter() - inicio
+        execucao = instrumentacao.finalizar_execucao(nome)
+        consultas.cache.concluir_gravacoes()  # a gravação em disco não entra na medida seguinte
+        pico = _pico_mb() - pico_inicial
+        residente_final = instrumentacao.memoria_residente_mb()
+
+        inicio = time.perf_counter()
+        consultas.analisar(resultado)
+        em_cache = time.perf_counter() - inicio
+
+        tempos = []
+        for _ in range(repeticoes):
+            consultas = novas_consultas()
+            inicio = time.perf_counter()
+            consultas.analisar(resultado)
+            tempos.append(time.perf_counter() - inicio)
+            consultas.cache.concluir_gravacoes()
+
+    return {
+        'consulta': nome,
+        'fria_s': round(fria, 4),
+        'mediana_s': round(float(pd.Series(tempos).median()), 4) if tempos else None,
+        'minimo_s': round(min(tempos), 4) if tempos else None,
+        'em_cache_s': round(em_cache, 6),
+        'pico_mb': round(pico, 1),
+        'retida_mb': None if residente_inicial is None else round(residente_final - residente_inicial, 1),
+        'etapas': _etapas(execucao),
+        'resultado': _resumo_resultado(saida),
+        'filtros': {chave: valor for chave, valor in filtros.items() if chave != 'lista_ncm_filtro'}
+                   | ({'termos_ncm': len(filtros['lista_ncm_filtro'])} if 'lista_ncm_filtro' in filtros else {}),
+    }
+
+
+def medir_inicializacao(diretorio_dados):
+    """Custo fixo de um processo novo do app, fora as consultas."""
+    for modulo in ('consultas', 'graficos', 'sincronizacao', 'tabelas'):  # o que o app importa no início
+        importlib.import_module(modulo)
+    pesados = [nome for nome in MODULOS_PESADOS if nome in sys.modules]
+    inicio = time.perf_counter()
+    referencias.compilar(diretorio_dados)
+    compilar = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    referencias.carregar(diretorio_dados)
+    carregar = time.perf_counter() - inicio
+    return {'compilar_s': round(compilar, 4), 'carregar_s': round(carregar, 4), 'modulos_pesados_importados': pesados}
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def executar(diretorio_dados, parametros, nomes=None, repeticoes=REPETICOES):
+    codigos_ncm = pd.read_csv(os.path.join(diretorio_dados, 'NCM.csv'), sep=';', encoding='latin-1',
+                              dtype={'CO_NCM': str})['CO_NCM'].sort_values().tolist()
+    padrao = consultas_padrao(parametros, codigos_ncm)
+    desconhecidas = set(nomes or []) - set(padrao)
+    if desconhecidas:
+        raise ValueError(f"Consultas desconhecidas: {sorted(desconhecidas)} (disponíveis: {', '.join(padrao)})")
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        inicializacao = executor.submit(medir_inicializacao, diretorio_dados).result()
+    print(f"inicialização: referências em {inicializacao['carregar_s']:.3f}s "
+          f"(compilar: {inicializacao['compilar_s']:.3f}s)", file=sys.stderr)
+    resultados = []
+    for nome in nomes or padrao:
+        # Um processo por consulta: memória e caches não vazam de uma medida para a outra
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as executor:
+            resultados.append(executor.submit(medir, diretorio_dados, nome, padrao[nome], repeticoes).result())
+        print(f"{nome}: {resultados[-1]['fria_s']:.3f}s fria, {resultados[-1]['mediana_s']}s mediana", file=sys.stderr)
+    return {
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'commit': _commit(),
+        'ambiente': {'python': platform.python_version(), 'pandas': pd.__version__, 'pyarrow': pa.__version__,
+                     'processadores': os.cpu_count(), 'sistema': platform.platform()},
+        'dados': parametros,
+        'repeticoes': repeticoes,
+        'inicializacao': inicializacao,
+        'resultados': resultados,
+    }
+
+
+def tabela_relatorio(relatorio, anterior=None) -> pd.DataFrame:
+    """Uma linha por consulta; com um relatório anterior, a variação de tempo e memória e se os totais mudaram."""
+    colunas = ['consulta', 'fria_s', 'mediana_s', 'minimo_s', 'em_cache_s', 'pico_mb', 'retida_mb']
+    tabela = pd.DataFrame(relatorio['resultados'])[colunas]
+    if anterior is None:
+        return tabela
+    if anterior.get('dados') != relatorio['dados']:
+        print("Aviso: os relatórios foram gerados com dados diferentes", file=sys.stderr)
+    antes = pd.DataFrame(anterior['resultados']).set_index('consulta')
+    for coluna in ('fria_s', 'mediana_s', 'pico_mb'):
+        base = tabela['consulta'].map(antes[coluna]) if coluna in antes else None
+        tabela[f"Δ {coluna} (%)"] = None if base is None else ((tabela[coluna] / base - 1) * 100).round(1)
+    resultados_antes = antes['resultado'].to_dict() if 'resultado' in antes else {}
+    tabela['totais iguais'] = [resultados_antes.get(item['consulta']) == item['resultado'] if item['consulta'] in resultados_antes else None
+                               for item in relatorio['resultados']]
+    return tabela
+
+
+def _carregar_parametros(diretorio_dados, argumentos):
+    parametros = {}
+    caminho = os.path.join(diretorio_dados, NOME_PARAMETROS)
+    if os.path.exists(caminho):
+        with open(caminho, encoding='utf-8') as arquivo:
+            parametros = json.load(arquivo)
+    for chave in ('ano_inicio', 'ano_fim', 'meses_ano_fim'):
+        if getattr(argumentos, chave) is not None:
+            parametros[chave] = getattr(argumentos, chave)
+    faltando = [chave for chave in ('ano_inicio', 'ano_fim', 'meses_ano_fim') if chave not in parametros]
+    if faltando:
+        raise SystemExit(f"{caminho} não existe; informe --ano-inicio, --ano-fim e --meses-ano-fim")
+    return parametros
+
+
+def _ler_argumentos():
+    parser = argparse.ArgumentParser(description="Benchmark das consultas padrão do dashboard.")
+    parser.add_argument('dados', help="pasta de dados (de gerar_dados.py ou a real)")
+    parser.add_argument('--repeticoes', type=int, default=REPETICOES)
+    parser.add_argument('--consultas', type=lambda valor: [nome.strip() for nome in valor.split(',') if nome.strip()],
+                        help="subconjunto das consultas padrão, separado por vírgula")
+    parser.add_argument('--saida', help="grava o relatório completo em JSON")
+    parser.add_argument('--comparar', help="relatório JSON anterior para comparação")
+    parser.add_argument('--ano-inicio', type=int)
+    parser.add_argument('--ano-fim', type=int)
+    parser.add_argument('--meses-ano-fim', type=int)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    argumentos = _ler_argumentos()
+    relatorio = executar(argumentos.dados, _carregar_parametros(argumentos.dados, argumentos),
+                         argumentos.consultas, argumentos.repeticoes)
+    anterior = None
+    if argumentos.comparar:
+        with open(argumentos.comparar, encoding='utf-8') as arquivo:
+            anterior = json.load(arquivo)
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(tabela_relatorio(relatorio, anterior).to_string(index=False))
+    if argumentos.saida:
+        with open(argumentos.saida, 'w', encoding='utf-8') as arquivo:
+            json.dump(relatorio, arquivo, indent=2, ensure_ascii=False, default=str)
@@ -0,0 +1,204 @@
+"""Gera uma pasta ``dados`` sintética, no formato da release, para os benchmarks.
+
+Cria os mesmos arquivos que o dashboard lê — ``{fluxo}_historico.parquet``,
+``{fluxo}_historico_{ANO}.parquet`` (ano corrente, meses parciais),
+``{fluxo}_world_totals*.parquet``, ``PAIS.csv``, ``UF.csv``, ``NCM.csv`` e
+``lista_ncm_tarifados.csv`` — com o número de linhas de fatos escolhido
+(de 1 a centenas de milhões por fluxo). Com a mesma semente e os mesmos
+parâmetros os arquivos são idênticos, então os resultados de execuções
+diferentes podem ser comparados.
+
+As distribuições imitam a base real: poucos NCMs, países e UFs concentram a
+maior parte das linhas (pesos de Zipf), os códigos NCM são hierárquicos
+(capítulo, SH4, SH6) e os valores seguem uma log-normal. Os totais do mundo
+são a soma dos fatos por ano, mês e NCM. As linhas são geradas em lotes,
+então a memória usada não depende do tamanho total.
+
+Ao final a pasta é preparada com ``preprocessamento.preparar_datasets``
+(partições, rollups e cópias IPC), como na release, e os parâmetros usados
+ficam em ``sintetico.json`` para o ``executar.py``.
+
+Uso:
+    python scripts/benchmarks/gerar_dados.py DESTINO [--linhas 1000000] [--semente 0]
+        [--ano-inicio 1997] [--ano-fim 2025] [--meses-ano-fim 7] [--sem-preparar]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+sys.path.insert(0, RAIZ)
+
+import preprocessamento  # noqa: E402
+
+NOME_PARAMETROS = 'sintetico.json'
+LINHAS_POR_LOTE = 2_000_000
+QUANTIDADE_NCM = 10_000
+QUANTIDADE_PAISES = 250
+QUANTIDADE_TARIFADOS = 700
+EXPOENTE_ZIPF = 1.1
+# Parceiros com nome real (usados nas consultas padrão); os demais recebem nomes genéricos
+PAISES_CONHECIDOS = {'249': 'Estados Unidos', '160': 'China', '063': 'Argentina', '023': 'Alemanha', '399': 'Japão'}
+PAISES_EXCLUIDOS = {'995': 'Bancos Centrais', '999': 'A Designar'}
+UFS = {
+    'RO': '11', 'AC': '12', 'AM': '13', 'RR': '14', 'PA': '15', 'AP': '16', 'TO': '17', 'MA': '21', 'PI': '22',
+    'CE': '23', 'RN': '24', 'PB': '25', 'PE': '26', 'AL': '27', 'SE': '28', 'BA': '29', 'MG': '31', 'ES': '32',
+    'RJ': '33', 'SP': '35', 'PR': '41', 'SC': '42', 'RS': '43', 'MS': '50', 'MT': '51', 'GO': '52', 'DF': '53',
+}
+# Ordem de peso das UFs (SP, MG e RJ concentram a pauta)
+UFS_POR_PESO = ['SP', 'MG', 'RJ', 'PR', 'RS', 'PA', 'SC', 'GO', 'MT', 'BA', 'ES', 'MS', 'PE', 'AM', 'CE', 'MA',
+                'TO', 'RO', 'AL', 'PI', 'RN', 'PB', 'SE', 'DF', 'AP', 'RR', 'AC']
+
+
+def _pesos_zipf(quantidade):
+    pesos = 1.0 / np.arange(1, quantidade + 1) ** EXPOENTE_ZIPF
+    return pesos / pesos.sum()
+
+
+def codigos_ncm(rng, quantidade=QUANTIDADE_NCM):
+    """Códigos de 8 dígitos agrupados em capítulos (01 a 97, sem o 77) e posições SH4/SH6."""
+    capitulos = np.setdiff1d(np.arange(1, 98), [77])
+    posicoes = rng.choice(capitulos, quantidade * 2) * 1_000_000 + rng.integers(0, 100, quantidade * 2) * 10_000
+    # Sorteio entre os códigos únicos: cortar a lista ordenada deixaria só os capítulos mais baixos
+    unicos = np.unique(posicoes + rng.integers(0, 10_000, quantidade * 2))
+    codigos = np.sort(rng.choice(unicos, quantidade, replace=False))
+    return np.array([f"{codigo:08d}" for codigo in codigos])
+
+
+def codigos_paises(quantidade=QUANTIDADE_PAISES):
+    """Os parceiros conhecidos primeiro (os de maior peso), completados com códigos sequenciais."""
+    outros = [f"{codigo:03d}" for codigo in range(1, 900)
+              if f"{codigo:03d}" not in PAISES_CONHECIDOS and f"{codigo:03d}" not in PAISES_EXCLUIDOS]
+    return np.array(list(PAISES_CONHECIDOS) + outros[:quantidade - len(PAISES_CONHECIDOS)])
+
+
+def linhas_por_ano(linhas, anos, meses_ano_fim):
+    """Distribui as linhas proporcionalmente aos meses de cada ano (o último pode ser parcial)."""
+    meses = np.array([12] * (len(anos) - 1) + [meses_ano_fim])
+    base = linhas * meses // meses.sum()
+    base[:linhas - base.sum()] += 1
+    return dict(zip(anos, base.tolist()))
+
+
+def _coluna_codigos(indices, codigos):
+    return pa.DictionaryArray.from_arrays(pa.array(indices, pa.int32()), pa.array(codigos)).dictionary_decode()
+
+
+def lote_fatos(rng, ano, linhas, meses, ncms, paises, pesos):
+    """Um lote de linhas de fatos de um ano, com as colunas e tipos dos arquivos da release."""
+    indices_ncm = rng.choice(len(ncms), linhas, p=pesos['ncm'])
+    valor = np.maximum(rng.lognormal(9, 2.2, linhas), 1).astype('int64')
+    return pa.table({
+        'CO_ANO': pa.array(np.full(linhas, ano, dtype='int64')),
+        'CO_MES': pa.array(rng.integers(1, meses + 1, linhas, dtype='int64')),
+        'CO_NCM': _coluna_codigos(indices_ncm, ncms),
+        'CO_PAIS': _coluna_codigos(rng.choice(len(paises), linhas, p=pesos['pais']), paises),
+        'SG_UF_NCM': _coluna_codigos(rng.choice(len(UFS_POR_PESO), linhas, p=pesos['uf']), UFS_POR_PESO),
+        'VL_FOB': pa.array(valor),
+        'KG_LIQUIDO': pa.array((valor * rng.uniform(0.05, 20, linhas)).astype('int64')),
+    })
+
+
+def _totais_mundo(tabela, coluna='VL_FOB'):
+    tabela = tabela.group_by(['CO_ANO', 'CO_MES', 'CO_NCM']).aggregate([(coluna, 'sum')])
+    return tabela.select(['CO_ANO', 'CO_MES', 'CO_NCM', f"{coluna}_sum"]).rename_columns(
+        ['CO_ANO', 'CO_MES', 'CO_NCM', 'VL_FOB_MUNDO'])
+
+
+def gerar_fluxo(rng, destino, fluxo, anos_por_arquivo, linhas_ano, meses_ano_fim, ncms, paises, pesos):
+    """Grava os arquivos de fatos e de totais do mundo de um fluxo, lote a lote."""
+    ano_fim = max(linhas_ano)
+    for sufixo, anos in anos_por_arquivo.items():
+        escritor = None
+        mundo = []
+        try:
+            for ano in anos:
+                meses = meses_ano_fim if ano == ano_fim else 12
+                parciais = []
+                for inicio in range(0, linhas_ano[ano], LINHAS_POR_LOTE):
+                    lote = lote_fatos(rng, ano, min(LINHAS_POR_LOTE, linhas_ano[ano] - inicio), meses, ncms, paises, pesos)
+                    if escritor is None:
+                        escritor = pq.ParquetWriter(os.path.join(destino, f"{fluxo}_historico{sufixo}.parquet"), lote.schema)
+                    escritor.write_table(lote)
+                    parciais.append(_totais_mundo(lote))
+                if parciais:
+                    mundo.append(_totais_mundo(pa.concat_tables(parciais), 'VL_FOB_MUNDO'))
+        finally:
+            if escritor is not None:
+                escritor.close()
+        if mundo:
+            pq.write_table(pa.concat_tables(mundo), os.path.join(destino, f"{fluxo}_world_totals{sufixo}.parquet"))
+
+
+def gravar_tabelas_auxiliares(rng, destino, ncms, paises):
+    nomes_paises = {**{codigo: f"País {codigo}" for codigo in paises}, **PAISES_CONHECIDOS, **PAISES_EXCLUIDOS}
+    pd.DataFrame({'CO_PAIS': list(nomes_paises), 'NO_PAIS': list(nomes_paises.values())}).to_csv(
+        os.path.join(destino, 'PAIS.csv'), sep=';', index=False, encoding='latin-1')
+    pd.DataFrame({'CO_UF': list(UFS.values()), 'SG_UF': list(UFS), 'NO_UF': [f"UF {sigla}" for sigla in UFS]}).to_csv(
+        os.path.join(destino, 'UF.csv'), sep=';', index=False, encoding='latin-1')
+    pd.DataFrame({'CO_NCM': ncms, 'NO_NCM_POR': [f"Produto sintético {codigo}" for codigo in ncms]}).to_csv(
+        os.path.join(destino, 'NCM.csv'), sep=';', index=False, encoding='latin-1')
+    tarifados = np.sort(rng.choice(ncms, min(QUANTIDADE_TARIFADOS, len(ncms)), replace=False))
+    pd.DataFrame({'CO_NCM': tarifados}).to_csv(os.path.join(destino, 'lista_ncm_tarifados.csv'), index=False)
+
+
+def gerar(destino, linhas, semente=0, ano_inicio=1997, ano_fim=2025, meses_ano_fim=7, preparar=True):
+    """Gera (e, por padrão, prepara) a pasta de dados; devolve os parâmetros gravados em ``sintetico.json``."""
+    if os.path.isdir(destino) and os.listdir(destino):
+        raise FileExistsError(f"A pasta {destino} não está vazia; escolha outro destino para não misturar bases")
+    if not 1 <= meses_ano_fim <= 12 or ano_inicio > ano_fim:
+        raise ValueError("Período inválido: verifique os anos e --meses-ano-fim (1 a 12)")
+    os.makedirs(destino, exist_ok=True)
+    rng = np.random.default_rng(semente)
+    ncms = codigos_ncm(rng)
+    paises = codigos_paises()
+    # Os pesos de NCM seguem uma ordem aleatória, para os mais frequentes não ficarem no mesmo capítulo
+    pesos = {'ncm': rng.permutation(_pesos_zipf(len(ncms))), 'pais': _pesos_zipf(len(paises)),
+             'uf': _pesos_zipf(len(UFS_POR_PESO))}
+    gravar_tabelas_auxiliares(rng, destino, ncms, paises)
+
+    anos = list(range(ano_inicio, ano_fim + 1))
+    anos_por_arquivo = {'': anos[:-1], f"_{ano_fim}": anos[-1:]}
+    linhas_ano = linhas_por_ano(linhas, anos, meses_ano_fim)
+    inicio = time.perf_counter()
+    for fluxo in preprocessamento.FLUXOS:
+        gerar_fluxo(rng, destino, fluxo, anos_por_arquivo, linhas_ano, meses_ano_fim, ncms, paises, pesos)
+    parametros = {
+        'linhas_por_fluxo': linhas, 'semente': semente, 'ano_inicio': ano_inicio, 'ano_fim': ano_fim,
+        'meses_ano_fim': meses_ano_fim, 'segundos_geracao': round(time.perf_counter() - inicio, 2),
+    }
+    if preparar:
+        inicio = time.perf_counter()
+        preprocessamento.preparar_datasets(destino)
+        parametros['segundos_preparo'] = round(time.perf_counter() - inicio, 2)
+    with open(os.path.join(destino, NOME_PARAMETROS), 'w', encoding='utf-8') as arquivo:
+        json.dump(parametros, arquivo, indent=2)
+    return parametros
+
+
+def _ler_argumentos():
+    parser = argparse.ArgumentParser(description="Gera dados sintéticos do ComexStat para os benchmarks.")
+    parser.add_argument('destino', help="pasta a criar (precisa estar vazia)")
+    parser.add_argument('--linhas', type=lambda valor: int(float(valor)), default=1_000_000,
+                        help="linhas de fatos por fluxo (aceita 1e6, 1e8...)")
+    parser.add_argument('--semente', type=int, default=0)
+    parser.add_argument('--ano-inicio', type=int, default=1997)
+    parser.add_argument('--ano-fim', type=int, default=2025)
+    parser.add_argument('--meses-ano-fim', type=int, default=7, help="meses já publicados do último ano")
+    parser.add_argument('--sem-preparar', action='store_true',
+                        help="grava só os arquivos planos, sem partições, rollups e IPC")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    argumentos = _ler_argumentos()
+    parametros = gerar(argumentos.destino, argumentos.linhas, argumentos.semente, argumentos.ano_inicio,
+                       argumentos.ano_fim, argumentos.meses_ano_fim, preparar=not argumentos.sem_preparar)
+    print(json.dumps(parametros, indent=2))
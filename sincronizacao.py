@@ -0,0 +1,367 @@
+"""Download, verificação e atualização da pasta ``dados``.
+
+Cada release publica um ``manifesto.json`` com a versão e, por arquivo, o
+caminho relativo, o tamanho e o SHA-256:
+
+    {"versao": "2025.07", "arquivos": [{"caminho": "PAIS.csv", "tamanho": 1234, "sha256": "..."}]}
+
+A sincronização monta a nova pasta num diretório de staging ao lado de
+``dados``: arquivos iguais aos locais são reaproveitados por hardlink, os
+demais são baixados com retomada (HTTP Range) e conferidos pelo hash. Só com
+tudo completo e verificado o staging substitui ``dados``, e o manifesto é
+gravado por último, então uma pasta sem manifesto nunca é considerada pronta.
+Arquivos que sobraram no staging de uma tentativa interrompida só são
+reaproveitados se a tentativa era da mesma release e o hash confere.
+
+Releases antigos, só com ``dados.zip``, continuam suportados: o zip é baixado
+com retomada, extraído em paralelo no staging (o CRC de cada membro é
+conferido na leitura) e um manifesto local é gerado a partir do resultado.
+
+Os datasets derivados (partições, rollups e cópias IPC) são reaproveitados
+da pasta atual quando os fatos não mudaram. Quando precisam ser gerados, a
+linha de comando os gera no staging; o app troca a pasta sem eles e chama
+``preparar_em_segundo_plano``, que os gera numa thread enquanto as consultas
+leem os arquivos planos.
+
+Uma pasta ``dados`` já populada sem manifesto (baixada à mão ou montada
+localmente) nunca é substituída: ela é adotada com um manifesto de versão
+``local``, e só é trocada pela release com ``substituir_local=True``
+(``--substituir-local`` na linha de comando).
+
+Uso:
+    python sincronizacao.py URL_MANIFESTO [URL_ZIP] [--substituir-local]
+    python sincronizacao.py --gerar-manifesto DIRETORIO_DADOS VERSAO
+"""
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+import preprocessamento
+
+NOME_MANIFESTO = 'manifesto.json'
+TAMANHO_BLOCO = 1024 * 1024
+BUFFER_ESCRITA = 8 * 1024 * 1024
+TENTATIVAS = 5
+DOWNLOADS_SIMULTANEOS = 4
+VERSAO_LOCAL = 'local'
+
+_preparo = None
+_trava_preparo = threading.Lock()
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem trava entre processos
+    fcntl = None
+
+
+class ErroSincronizacao(Exception):
+    pass
+
+
+def sha256_arquivo(caminho):
+    resumo = hashlib.sha256()
+    with open(caminho, 'rb') as arquivo:
+        for bloco in iter(lambda: arquivo.read(TAMANHO_BLOCO), b''):
+            resumo.update(bloco)
+    return resumo.hexdigest()
+
+
+def ler_manifesto_local(diretorio_dados):
+    try:
+        with open(os.path.join(diretorio_dados, NOME_MANIFESTO), encoding='utf-8') as arquivo:
+            return json.load(arquivo)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def gerar_manifesto(diretorio_dados, versao, calcular_hash=True):
+    """Manifesto dos arquivos de primeiro nível da pasta (os derivados são gerados localmente).
+
+    Sem ``calcular_hash`` o SHA-256 fica ``None`` e é calculado só se o
+    arquivo for comparado com uma release.
+    """
+    arquivos = [
+        {'caminho': nome, 'tamanho': os.path.getsize(os.path.join(diretorio_dados, nome)),
+         'sha256': sha256_arquivo(os.path.join(diretorio_dados, nome)) if calcular_hash else None}
+        for nome in sorted(os.listdir(diretorio_dados))
+        if os.path.isfile(os.path.join(diretorio_dados, nome)) and nome != NOME_MANIFESTO and not nome.endswith('.tmp')
+    ]
+    return {'versao': versao, 'arquivos': arquivos}
+
+
+def _gravar_manifesto(diretorio, manifesto):
+    caminho = os.path.join(diretorio, NOME_MANIFESTO)
+    with open(caminho + '.tmp', 'w', encoding='utf-8') as arquivo:
+        json.dump(manifesto, arquivo, ensure_ascii=False, indent=1)
+    os.replace(caminho + '.tmp', caminho)
+
+
+def dados_completos(diretorio_dados):
+    """Verificação rápida (por tamanho) de que a pasta corresponde ao seu manifesto."""
+    manifesto = ler_manifesto_local(diretorio_dados)
+    if manifesto is None:
+        return False
+    for item in manifesto['arquivos']:
+        caminho = os.path.join(diretorio_dados, item['caminho'])
+        if not os.path.isfile(caminho) or os.path.getsize(caminho) != item['tamanho']:
+            return False
+    return True
+
+
+def baixar_arquivo(sessao, url, destino, sha256=None, tamanho=None):
+    """Baixa ``url`` para ``destino`` retomando de ``destino.part`` quando ele existe."""
+    import requests  # só quem baixa paga a importação; o app só confere a pasta
+
+    parcial = destino + '.part'
+    for tentativa in range(TENTATIVAS):
+        inicio = os.path.getsize(parcial) if os.path.exists(parcial) else 0
+        cabecalhos = {'Range': f'bytes={inicio}-'} if inicio else {}
+        try:
+            with sessao.get(url, headers=cabecalhos, stream=True, timeout=60) as resposta:
+                if resposta.status_code == 416 and inicio and tamanho in (None, inicio):
+                    break  # o .part já está completo
+                resposta.raise_for_status()
+                modo = 'ab' if inicio and resposta.status_code == 206 else 'wb'
+                with open(parcial, modo, buffering=BUFFER_ESCRITA) as arquivo:
+                    for bloco in resposta.iter_content(chunk_size=TAMANHO_BLOCO):
+                        arquivo.write(bloco)
+            break
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError):
+            if tentativa == TENTATIVAS - 1:
+                raise
+            time.sleep(2 ** tentativa)
+
+    if tamanho is not None and os.path.getsize(parcial) != tamanho:
+        raise ErroSincronizacao(f"Tamanho inesperado para {url}: {os.path.getsize(parcial)} != {tamanho}")
+    if sha256 is not None and sha256_arquivo(parcial) != sha256:
+        os.remove(parcial)
+        raise ErroSincronizacao(f"Checksum inválido para {url}")
+    os.replace(parcial, destino)
+    return destino
+
+
+def _vincular(origem, destino):
+    try:
+        os.link(origem, destino)
+    except OSError:
+        shutil.copy2(origem, destino)
+
+
+def _arquivo_reaproveitavel(diretorio_atual, manifesto_atual, item):
+    caminho = os.path.join(diretorio_atual, item['caminho'])
+    if not os.path.isfile(caminho) or os.path.getsize(caminho) != item['tamanho']:
+        return None
+    conhecidos = {anterior['caminho']: anterior['sha256'] for anterior in (manifesto_atual or {}).get('arquivos', [])}
+    # Sem manifesto local (pasta antiga) o hash é recalculado
+    sha256 = conhecidos.get(item['caminho']) or sha256_arquivo(caminho)
+    return caminho if sha256 == item['sha256'] else None
+
+
+def _extrair_membro(caminho_zip, membro, destino):
+    with zipfile.ZipFile(caminho_zip) as arquivo_zip:
+        arquivo_zip.extract(membro, destino)
+
+
+def extrair_em_paralelo(caminho_zip, destino, trabalhadores=DOWNLOADS_SIMULTANEOS):
+    with zipfile.ZipFile(caminho_zip) as arquivo_zip:
+        membros = [membro for membro in arquivo_zip.namelist() if not membro.endswith('/')]
+    with ThreadPoolExecutor(trabalhadores) as executor:
+        list(executor.map(lambda membro: _extrair_membro(caminho_zip, membro, destino), membros))
+
+
+def _trocar_diretorio(staging, diretorio_dados):
+    antigo = diretorio_dados + '.antigo'
+    shutil.rmtree(antigo, ignore_errors=True)
+    if os.path.exists(diretorio_dados):
+        os.replace(diretorio_dados, antigo)
+    os.replace(staging, diretorio_dados)
+    shutil.rmtree(antigo, ignore_errors=True)
+
+
+@contextlib.contextmanager
+def trava_dados(diretorio_dados):
+    """Impede duas sincronizações simultâneas (sessões ou réplicas) da mesma pasta."""
+    with open(diretorio_dados + '.lock', 'w') as arquivo:
+        if fcntl is not None:
+            fcntl.flock(arquivo, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(arquivo, fcntl.LOCK_UN)
+
+
+def _buscar_manifesto(sessao, url_manifesto):
+    resposta = sessao.get(url_manifesto, timeout=30)
+    if resposta.status_code == 404:
+        return None
+    resposta.raise_for_status()
+    return resposta.json()
+
+
+def _preparar_derivados(staging, diretorio_atual, fatos_alterados, gerar=True):
+    """Reaproveita os datasets derivados se os fatos não mudaram; senão, gera de novo no staging (se ``gerar``)."""
+    for nome in os.listdir(staging):  # restos de uma tentativa interrompida
+        if os.path.isdir(os.path.join(staging, nome)):
+            shutil.rmtree(os.path.join(staging, nome))
+    derivados = [nome for nome in os.listdir(diretorio_atual) if os.path.isdir(os.path.join(diretorio_atual, nome))] \
+        if os.path.isdir(diretorio_atual) else []
+    if derivados and not fatos_alterados:
+        for nome in derivados:
+            if not os.path.exists(os.path.join(staging, nome)):
+                shutil.copytree(os.path.join(diretorio_atual, nome), os.path.join(staging, nome), copy_function=_vincular)
+    elif gerar and not os.path.isdir(os.path.join(staging, 'fatos')):
+        preprocessamento.preparar_datasets(staging)
+
+
+def _preparar_no_lugar(diretorio_dados):
+    with trava_dados(diretorio_dados):
+        if preprocessamento.datasets_pendentes(diretorio_dados):  # outra réplica pode ter terminado antes
+            preprocessamento.preparar_datasets(diretorio_dados)
+
+
+def preparar_em_segundo_plano(diretorio_dados):
+    """Gera numa thread os datasets derivados que faltam na pasta; devolve a thread, ou ``None`` se não falta nada.
+
+    Cada dataset só aparece na pasta quando está completo (troca por rename),
+    então o app continua respondendo, pelos arquivos planos, enquanto isso.
+    """
+    global _preparo
+    with _trava_preparo:
+        if _preparo is not None and _preparo.is_alive():
+            return _preparo
+        if not preprocessamento.datasets_pendentes(diretorio_dados):
+            return None
+        _preparo = threading.Thread(target=_preparar_no_lugar, args=(diretorio_dados,), name='preparo-dados', daemon=True)
+        _preparo.start()
+        return _preparo
+
+
+def _preparar_staging(staging, versao):
+    """Cria o staging da ``versao``; restos de uma tentativa para outra release são descartados."""
+    marcador = staging + '.versao'
+    try:
+        with open(marcador, encoding='utf-8') as arquivo:
+            anterior = arquivo.read()
+    except FileNotFoundError:
+        anterior = None
+    if anterior != versao:
+        shutil.rmtree(staging, ignore_errors=True)
+        for resto in (staging + '.zip', staging + '.zip.part'):
+            if os.path.exists(resto):
+                os.remove(resto)
+        with open(marcador, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(versao)
+    os.makedirs(staging, exist_ok=True)
+
+
+def _sincronizar_por_manifesto(sessao, manifesto, url_manifesto, diretorio_dados, staging):
+    manifesto_atual = ler_manifesto_local(diretorio_dados)
+    pendentes = []
+    for item in manifesto['arquivos']:
+        destino = os.path.join(staging, item['caminho'])
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        if os.path.exists(destino):
+            if os.path.getsize(destino) == item['tamanho'] and sha256_arquivo(destino) == item['sha256']:
+                continue  # já baixado e conferido numa tentativa anterior
+            os.remove(destino)
+        local = _arquivo_reaproveitavel(diretorio_dados, manifesto_atual, item)
+        if local:
+            _vincular(local, destino)
+        else:
+            pendentes.append(item)
+
+    def baixar(item):
+        url = urljoin(url_manifesto, item.get('url', item['caminho']))
+        return baixar_arquivo(sessao, url, os.path.join(staging, item['caminho']), item['sha256'], item['tamanho'])
+
+    with ThreadPoolExecutor(DOWNLOADS_SIMULTANEOS) as executor:
+        list(executor.map(baixar, pendentes))
+    return [item['caminho'] for item in pendentes]
+
+
+def _sincronizar_por_zip(sessao, url_zip, staging):
+    caminho_zip = staging + '.zip'
+    baixar_arquivo(sessao, url_zip, caminho_zip)
+    extraido = staging + '.extraido'
+    shutil.rmtree(extraido, ignore_errors=True)
+    extrair_em_paralelo(caminho_zip, extraido)
+    # O zip traz a pasta "dados/" na raiz
+    raiz = os.path.join(extraido, 'dados') if os.path.isdir(os.path.join(extraido, 'dados')) else extraido
+    shutil.rmtree(staging, ignore_errors=True)
+    os.replace(raiz, staging)
+    shutil.rmtree(extraido, ignore_errors=True)
+    os.remove(caminho_zip)
+    return sorted(os.listdir(staging))
+
+
+def _pasta_local(diretorio_dados):
+    """Pasta populada que não veio de uma release (sem manifesto, ou já adotada como local)."""
+    if not os.path.isdir(diretorio_dados) or not os.listdir(diretorio_dados):
+        return False
+    manifesto = ler_manifesto_local(diretorio_dados)
+    return manifesto is None or manifesto.get('versao') == VERSAO_LOCAL
+
+
+def sincronizar(diretorio_dados, url_manifesto, url_zip=None, sessao=None, substituir_local=False,
+                preparar_derivados=True):
+    """Atualiza ``diretorio_dados`` para a versão publicada; devolve a lista de arquivos baixados.
+
+    Uma pasta local (ver ``_pasta_local``) é adotada como está, sem acesso à
+    rede, a menos que ``substituir_local`` seja verdadeiro. Com
+    ``preparar_derivados=False`` os datasets derivados que não puderem ser
+    reaproveitados ficam para ``preparar_em_segundo_plano``.
+    """
+    staging = diretorio_dados + '.staging'
+    with trava_dados(diretorio_dados):
+        if not os.path.exists(diretorio_dados) and os.path.exists(diretorio_dados + '.antigo'):
+            os.replace(diretorio_dados + '.antigo', diretorio_dados)  # troca interrompida entre os dois renames
+        if not substituir_local and _pasta_local(diretorio_dados):
+            _gravar_manifesto(diretorio_dados, gerar_manifesto(diretorio_dados, VERSAO_LOCAL, calcular_hash=False))
+            return []
+        if sessao is None:
+            import requests
+            sessao = requests.Session()
+        manifesto = _buscar_manifesto(sessao, url_manifesto)
+        if manifesto is None and url_zip is None:
+            raise ErroSincronizacao(f"Manifesto não encontrado em {url_manifesto}")
+        versao_publicada = manifesto['versao'] if manifesto is not None else url_zip
+        manifesto_atual = ler_manifesto_local(diretorio_dados)
+        if manifesto_atual is not None and manifesto_atual.get('versao') == versao_publicada and dados_completos(diretorio_dados):
+            return []
+
+        _preparar_staging(staging, versao_publicada)
+        if manifesto is not None:
+            baixados = _sincronizar_por_manifesto(sessao, manifesto, url_manifesto, diretorio_dados, staging)
+        else:
+            baixados = _sincronizar_por_zip(sessao, url_zip, staging)
+            manifesto = gerar_manifesto(staging, versao_publicada)
+
+        _preparar_derivados(staging, diretorio_dados, any(nome.endswith('.parquet') for nome in baixados),
+                            gerar=preparar_derivados)
+        _gravar_manifesto(staging, manifesto)
+        _trocar_diretorio(staging, diretorio_dados)
+        os.remove(staging + '.versao')
+        return baixados
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == '--gerar-manifesto':
+        _gravar_manifesto(sys.argv[2], gerar_manifesto(sys.argv[2], sys.argv[3]))
+    elif 2 <= len(sys.argv) <= 4:
+        argumentos = [argumento for argumento in sys.argv[1:] if argumento != '--substituir-local']
+        diretorio = os.path.join(os.path.dirname(os.path.realpath(__file__)), "dados")
+        baixados = sincronizar(diretorio, argumentos[0], argumentos[1] if len(argumentos) == 2 else None,
+                               substituir_local='--substituir-local' in sys.argv)
+        print(f"{len(baixados)} arquivo(s) baixado(s)")
+    else:
+        print(__doc__)
+        sys.exit(1)
@@ -0,0 +1,134 @@
+"""Tabelas Consolidadas: ordenação no servidor, paginação e exportação em blocos.
+
+O navegador recebe só a página visível. A ordenação é uma permutação das
+linhas do recorte (calculada uma vez e guardada no cache compartilhado), e
+cada página ou bloco de exportação é formatado a partir dela, então o
+custo de formatar nunca passa de ``LINHAS_POR_BLOCO`` linhas por vez.
+
+A tabela de fatos não é montada: ela vem como ``Lotes`` (os memory-maps do
+período) e a ordenação devolve posições nos lotes. Para ordenar, só as
+colunas da ordenação são copiadas. A memória ainda cresce com o recorte,
+4 bytes por linha na permutação (8 acima de 2³¹ linhas no período), mas não
+com a largura da tabela.
+"""
+import gzip
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import analise
+from armazenamento import nomes_por_codigo
+
+TAMANHOS_PAGINA = [50, 100, 500, 1000]
+LINHAS_POR_BLOCO = 100_000
+FORMATOS = {
+    'CSV': {'extensao': 'csv', 'mime': 'text/csv'},
+    'CSV compactado (gzip)': {'extensao': 'csv.gz', 'mime': 'application/gzip'},
+    'Parquet': {'extensao': 'parquet', 'mime': 'application/vnd.apache.parquet'},
+}
+
+# Tabela de fatos: colunas exibidas e colunas dos lotes usadas para ordenar cada uma
+COLUNAS_FATOS = {'SG_UF_NCM': 'UF', 'VL_FOB': 'Valor FOB (US$)', 'KG_LIQUIDO': 'Peso (KG)'}
+ORDEM_EXIBICAO_FATOS = ['Data', 'CO_NCM', 'Produto', 'País', 'UF', 'Valor FOB (US$)', 'Peso (KG)']
+
+
+def ordenacao_fatos(mapa_cod_para_pais, mapa_cod_para_ncm):
+    """Colunas de ordenação da tabela de fatos; ``(coluna, mapa)`` ordena pelos nomes dos códigos."""
+    return {
+        'Valor FOB (US$)': ['VL_FOB'],
+        'Peso (KG)': ['KG_LIQUIDO'],
+        'Data': ['CO_ANO', 'CO_MES'],
+        'CO_NCM': ['CO_NCM'],
+        'Produto': [('CO_NCM', mapa_cod_para_ncm)],
+        'País': [('CO_PAIS', mapa_cod_para_pais)],
+        'UF': ['SG_UF_NCM'],
+    }
+
+
+def formatar_fatos(linhas, mapa_cod_para_pais, mapa_cod_para_ncm) -> pd.DataFrame:
+    """Colunas de exibição das linhas de fatos (aplicado só às linhas da página ou do bloco)."""
+    df_display = analise.adicionar_data(linhas.to_pandas(), 'CO_ANO', 'CO_MES')
+    df_display['Produto'] = nomes_por_codigo(df_display['CO_NCM'], mapa_cod_para_ncm)
+    df_display['País'] = nomes_por_codigo(df_display['CO_PAIS'], mapa_cod_para_pais)
+    df_display = df_display.rename(columns=COLUNAS_FATOS)
+    return df_display.reindex(columns=ORDEM_EXIBICAO_FATOS, fill_value='N/A')
+
+
+def _chave_ordenacao(serie):
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        # Ordem alfabética das categorias, sem converter as linhas para texto
+        categorias = serie.cat.categories
+        posto = np.empty(len(categorias), dtype='int64')
+        posto[np.argsort(categorias.astype(str))] = np.arange(len(categorias))
+        codigos = serie.cat.codes.to_numpy()
+        return np.where(codigos >= 0, posto[codigos], len(categorias))
+    if pd.api.types.is_numeric_dtype(serie):
+        return serie.to_numpy()
+    return pd.factorize(serie, sort=True)[0]
+
+
+def _chave_coluna(df, coluna):
+    coluna, mapa = coluna if isinstance(coluna, tuple) else (coluna, None)
+    return _chave_ordenacao(df[coluna] if mapa is None else nomes_por_codigo(df[coluna], mapa))
+
+
+def ordenar(df, colunas, ascendente=True, posicoes=None) -> np.ndarray:
+    """Permutação das linhas de ``df`` ordenadas pelas colunas (a primeira é a principal).
+
+    Com ``posicoes``, ``df`` são ``Lotes``: só essas linhas são ordenadas e o
+    resultado são as próprias posições, reordenadas.
+    """
+    if posicoes is not None:
+        if not len(posicoes):
+            return posicoes
+        nomes = list(dict.fromkeys(coluna[0] if isinstance(coluna, tuple) else coluna for coluna in colunas))
+        df = df.take(posicoes, nomes).to_pandas()
+    ordem = np.lexsort([_chave_coluna(df, coluna) for coluna in reversed(colunas)])
+    ordem = ordem if ascendente else ordem[::-1]
+    return posicoes[ordem] if posicoes is not None else ordem.astype('int32')
+
+
+def pagina(df, ordem, numero, tamanho, formatar=None):
+    """Linhas da página ``numero`` (a partir de 1), já formatadas."""
+    inicio = (numero - 1) * tamanho
+    linhas = df.take(ordem[inicio:inicio + tamanho])
+    return formatar(linhas) if formatar else linhas
+
+
+def blocos(df, ordem, formatar=None):
+    for inicio in range(0, len(ordem), LINHAS_POR_BLOCO):
+        bloco = df.take(ordem[inicio:inicio + LINHAS_POR_BLOCO])
+        yield formatar(bloco) if formatar else bloco
+
+
+def gravar_csv(blocos_formatados, caminho, compactado=False):
+    """CSV no formato brasileiro (``;`` e vírgula decimal), escrito bloco a bloco."""
+    abrir = gzip.open if compactado else open
+    with abrir(caminho, 'wt', encoding='utf-8-sig', newline='') as arquivo:
+        for numero, bloco in enumerate(blocos_formatados):
+            bloco.to_csv(arquivo, index=False, header=numero == 0, sep=';', decimal=',', date_format='%Y-%m-%d')
+
+
+def gravar_parquet(blocos_formatados, caminho):
+    escritor, esquema = None, None
+    try:
+        for bloco in blocos_formatados:
+            tabela = pa.Table.from_pandas(bloco, preserve_index=False)
+            if escritor is None:
+                esquema = tabela.schema
+                escritor = pq.ParquetWriter(caminho, esquema, compression='zstd')
+            escritor.write_table(tabela.cast(esquema))
+    finally:
+        if escritor is not None:
+            escritor.close()
+
+
+def exportar(df, ordem, formato, caminho, formatar=None):
+    """Grava ``df`` na ordem dada e no formato escolhido (chave de ``FORMATOS``)."""
+    formatados = blocos(df, ordem, formatar)
+    if FORMATOS[formato]['extensao'] == 'parquet':
+        gravar_parquet(formatados, caminho)
+    else:
+        gravar_csv(formatados, caminho, compactado=FORMATOS[formato]['extensao'].endswith('.gz'))
@@ -0,0 +1,54 @@
+"""Imitação local da API do ComexStat (``/general/dates/updated`` e ``POST /general``).
+
+Responde com linhas sintéticas para qualquer mês até o último publicado,
+usando os códigos de NCM e país informados. ``falhas`` faz as primeiras
+consultas ``POST /general`` responderem 503 (com o ``Retry-After`` pedido),
+para exercitar as retentativas.
+"""
+import json
+import threading
+
+import numpy as np
+
+from servidor_local import ServidorLocal, resposta_json
+
+LINHAS_POR_MES = 50
+
+
+class ApiLocal(ServidorLocal):
+    def __init__(self, ano, mes, ncms, paises, ufs=('SP', 'MG'), falhas=0, retry_after='0',
+                 linhas_por_mes=LINHAS_POR_MES):
+        self.ultimo_mes = (ano, mes)
+        self.ncms, self.paises, self.ufs = list(ncms), list(paises), list(ufs)
+        self.falhas, self.retry_after = falhas, retry_after
+        self._trava = threading.Lock()
+        self.linhas_por_mes = linhas_por_mes
+        super().__init__({
+            ('GET', '/general/dates/updated'): resposta_json({'data': {'year': str(ano), 'monthNumber': str(mes)}}),
+            ('POST', '/general'): self._consulta,
+        })
+
+    def linhas(self, corpo):
+        """Linhas que a API devolve para o corpo de uma consulta (determinísticas por mês e fluxo)."""
+        ano, mes = map(int, corpo['period']['from'].split('-'))
+        if (ano, mes) > self.ultimo_mes:
+            return []
+        rng = np.random.default_rng([ano, mes, corpo['flow'] == 'export'])
+        linhas = []
+        for _ in range(self.linhas_por_mes):
+            linha = {'year': str(ano), 'monthNumber': str(mes), 'coNcm': str(rng.choice(self.ncms)),
+                     'metricFOB': str(int(rng.integers(1, 10**6)))}
+            if 'country' in corpo['details']:
+                linha.update(coPais=str(rng.choice(self.paises)), state=str(rng.choice(self.ufs)),
+                             metricKG=str(int(rng.integers(1, 10**5))))
+            linhas.append(linha)
+        return linhas
+
+    def _consulta(self, requisicao):
+        with self._trava:
+            falhar = self.falhas > 0
+            self.falhas -= falhar
+        if falhar:
+            return 503, {'Retry-After': self.retry_after}, b''
+        corpo = json.loads(requisicao['corpo'])
+        return resposta_json({'data': {'list': self.linhas(corpo)}})(requisicao)
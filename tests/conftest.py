@@ -0,0 +1,29 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+# Os módulos do dashboard ficam na raiz do repositório, fora de um pacote
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, 'scripts', 'benchmarks'))
+
+import gerar_dados  # noqa: E402
+
+PERIODO_SINTETICO = {'ano_inicio': 2023, 'ano_fim': 2024, 'meses_ano_fim': 7}
+
+
+@pytest.fixture(scope='session')
+def _dados_sinteticos_base(tmp_path_factory):
+    destino = tmp_path_factory.mktemp('sintetico') / 'dados'
+    gerar_dados.gerar(str(destino), 20_000, **PERIODO_SINTETICO)
+    return destino
+
+
+@pytest.fixture
+def dados_sinteticos(_dados_sinteticos_base, tmp_path):
+    """Cópia, só deste teste, de uma pasta de dados sintética já preparada (2023-01 a 2024-07)."""
+    destino = tmp_path / 'dados'
+    shutil.copytree(_dados_sinteticos_base, destino)
+    return destino
@@ -0,0 +1,81 @@
+"""Servidor HTTP local para os testes da sincronização e da atualização pela API.
+
+Roda numa thread, em porta livre, e registra cada requisição recebida
+(método, caminho, cabeçalhos e corpo). As respostas vêm de ``rotas``, um
+dicionário ``(método, caminho) -> função(requisição) -> (status, cabeçalhos, corpo)``;
+``servir_arquivos`` monta rotas GET para arquivos com suporte a HTTP Range,
+como o servidor de releases.
+"""
+import json
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class ServidorLocal:
+    def __init__(self, rotas=None):
+        self.rotas = dict(rotas or {})
+        self.requisicoes = []
+        servidor = self
+
+        class Manipulador(BaseHTTPRequestHandler):
+            def _responder(self, metodo):
+                tamanho = int(self.headers.get('Content-Length') or 0)
+                requisicao = {'metodo': metodo, 'caminho': self.path, 'cabecalhos': dict(self.headers),
+                              'corpo': self.rfile.read(tamanho) if tamanho else b''}
+                servidor.requisicoes.append(requisicao)
+                rota = servidor.rotas.get((metodo, self.path.split('?')[0]))
+                status, cabecalhos, corpo = rota(requisicao) if rota else (404, {}, b'')
+                self.send_response(status)
+                for nome, valor in cabecalhos.items():
+                    self.send_header(nome, valor)
+                self.send_header('Content-Length', str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+
+            def do_GET(self):
+                self._responder('GET')
+
+            def do_POST(self):
+                self._responder('POST')
+
+            def log_message(self, *argumentos):
+                pass
+
+        self._http = ThreadingHTTPServer(('127.0.0.1', 0), Manipulador)
+        self.url = f"http://127.0.0.1:{self._http.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self._http.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *excecao):
+        self._http.shutdown()
+        self._http.server_close()
+
+    def caminhos(self, metodo='GET'):
+        return [requisicao['caminho'] for requisicao in self.requisicoes if requisicao['metodo'] == metodo]
+
+
+def resposta_json(dados, status=200):
+    return lambda requisicao: (status, {'Content-Type': 'application/json'}, json.dumps(dados).encode())
+
+
+def _arquivo_com_range(caminho):
+    def responder(requisicao):
+        with open(caminho, 'rb') as arquivo:
+            conteudo = arquivo.read()
+        intervalo = re.fullmatch(r'bytes=(\d+)-', requisicao['cabecalhos'].get('Range', ''))
+        if not intervalo:
+            return 200, {}, conteudo
+        inicio = int(intervalo.group(1))
+        if inicio >= len(conteudo):
+            return 416, {'Content-Range': f"bytes */{len(conteudo)}"}, b''
+        return 206, {'Content-Range': f"bytes {inicio}-{len(conteudo) - 1}/{len(conteudo)}"}, conteudo[inicio:]
+    return responder
+
+
+def servir_arquivos(diretorio, prefixo='/'):
+    """Rotas GET para todos os arquivos de ``diretorio`` (lidos a cada requisição)."""
+    return {('GET', prefixo + nome): _arquivo_com_range(os.path.join(diretorio, nome)) for nome in os.listdir(diretorio)}
@@ -0,0 +1,76 @@
+import pandas as pd
+import pytest
+
+import analise
+
+MAPA_NCM = {'01012100': 'Cavalos', '02013000': 'Carne bovina'}
+
+
+def _fatos(linhas):
+    df = pd.DataFrame(linhas, columns=['year', 'monthNumber', 'coNcm', 'metricFOB'])
+    df['coNcm'] = df['coNcm'].astype('category')
+    return df
+
+
+@pytest.mark.parametrize('periodo, esperado', [
+    ((2020, 1, 2024, 12), 'Mensal'),
+    ((2020, 1, 2025, 1), 'Trimestral'),
+    ((2010, 1, 2024, 12), 'Trimestral'),
+    ((2010, 1, 2025, 1), 'Anual'),
+])
+def test_resolucao_automatica(periodo, esperado):
+    assert analise.resolucao_automatica(*periodo) == esperado
+
+
+def test_calcular_indicadores():
+    df_pais = _fatos([(2024, 1, '01012100', 30), (2024, 1, '02013000', 10), (2024, 2, '01012100', 60)])
+    # Categorias em outra ordem e um NCM de fora, como num recorte do mundo independente
+    df_mundo = _fatos([(2024, 1, '99999999', 500), (2024, 1, '02013000', 40), (2024, 2, '01012100', 180)])
+
+    resultado = analise.calcular_indicadores(df_pais, df_mundo, MAPA_NCM)
+
+    assert not resultado['vazio'] and resultado['total'] == 100
+    assert resultado['evolucao']['Data'].tolist() == [pd.Timestamp('2024-01-01'), pd.Timestamp('2024-02-01')]
+    assert resultado['evolucao']['metricFOB'].tolist() == [40, 60]
+    shares = resultado['shares'].set_index('coNcm')
+    assert shares.loc['01012100', 'Produto'] == 'Cavalos'
+    assert shares['Share na Pauta (%)'].to_dict() == {'01012100': 90.0, '02013000': 10.0}
+    assert shares['Coeficiente de Concentração de Produtos (%)'].to_dict() == {'01012100': 50.0, '02013000': 25.0}
+
+
+def test_calcular_indicadores_sem_dados_do_mundo():
+    df_pais = _fatos([(2024, 1, '03021100', 10)])
+    resultado = analise.calcular_indicadores(df_pais, None, MAPA_NCM)
+    # Código sem nome na tabela de NCM aparece como o próprio código
+    assert resultado['shares']['Produto'].tolist() == ['03021100']
+    assert 'Valor FOB Mundo' not in resultado['shares']
+
+
+def test_calcular_saldo():
+    df_exp = analise.preparar_saldo(_fatos([(2024, 1, '01012100', 100), (2024, 2, '02013000', 50)]), MAPA_NCM)
+    df_imp = analise.preparar_saldo(_fatos([(2024, 2, '02013000', 80), (2024, 3, '01012100', 30)]), MAPA_NCM)
+
+    saldo = analise.calcular_saldo(df_exp, df_imp)
+
+    assert saldo['totais'] == {'Exportação': 150, 'Importação': 110, 'Saldo': 40}
+    assert saldo['evolucao']['Saldo'].tolist() == [100, -30, -30]
+    por_produto = saldo['por_produto'].set_index('coNcm')
+    assert por_produto['Saldo'].to_dict() == {'01012100': 70, '02013000': -30}
+    assert por_produto.loc['02013000', 'Produto'] == 'Carne bovina'
+
+
+def test_calcular_saldo_com_um_fluxo_vazio():
+    df_exp = analise.preparar_saldo(_fatos([(2024, 1, '01012100', 100)]), MAPA_NCM)
+    saldo = analise.calcular_saldo(df_exp, analise.preparar_saldo(pd.DataFrame(), MAPA_NCM))
+    assert not saldo['vazio']
+    assert saldo['totais'] == {'Exportação': 100, 'Importação': 0, 'Saldo': 100}
+    assert saldo['por_produto']['Importação'].tolist() == [0]
+
+
+def test_calcular_saldo_com_os_dois_fluxos_vazios():
+    vazio = analise.preparar_saldo(pd.DataFrame(), MAPA_NCM)
+    saldo = analise.calcular_saldo(vazio, vazio)
+    assert saldo['vazio']
+    assert saldo['totais'] == {'Exportação': 0, 'Importação': 0, 'Saldo': 0}
+    assert saldo['por_produto'].empty
+    assert saldo['por_produto'].columns.tolist() == ['coNcm', 'Produto', 'Exportação', 'Importação', 'Saldo']
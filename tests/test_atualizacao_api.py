@@ -0,0 +1,114 @@
+import os
+import shutil
+import time
+
+import pandas as pd
+import pytest
+import requests
+
+import armazenamento
+import atualizacao_api
+from api_local import ApiLocal
+from armazem_compartilhado import ArmazemDados
+
+# A pasta sintética vai até 2024-07; a API já publicou até 2024-09
+ANO_API, MES_API = 2024, 9
+MESES_NOVOS = [(dataset, fluxo, ANO_API, mes) for dataset in atualizacao_api.CONSULTAS
+               for fluxo in atualizacao_api.FLUXOS for mes in (8, 9)]
+
+
+def _api(dados, **opcoes):
+    ncms = pd.read_csv(dados / 'NCM.csv', sep=';', encoding='latin-1', dtype={'CO_NCM': str})['CO_NCM']
+    paises = pd.read_csv(dados / 'PAIS.csv', sep=';', encoding='latin-1', dtype={'CO_PAIS': str})['CO_PAIS']
+    return ApiLocal(ANO_API, MES_API, ncms[:100], paises[:20], **opcoes)
+
+
+def _soma_da_api(api, dataset, fluxo, mes):
+    corpo = {'flow': fluxo, 'period': {'from': f"{ANO_API}-{mes:02d}"},
+             'details': atualizacao_api.CONSULTAS[dataset]['detalhes']}
+    return sum(int(linha['metricFOB']) for linha in api.linhas(corpo))
+
+
+def test_anexa_os_meses_pendentes_e_refaz_os_derivados(dados_sinteticos):
+    versao_antes = armazenamento.versao_dados(str(dados_sinteticos))
+    with _api(dados_sinteticos) as api:
+        gravados = atualizacao_api.atualizar(str(dados_sinteticos), api.url)
+
+    assert sorted(gravados) == sorted(MESES_NOVOS)
+    assert armazenamento.versao_dados(str(dados_sinteticos)) != versao_antes
+    assert not (dados_sinteticos / atualizacao_api.NOME_PENDENCIAS).exists()
+    for dataset in atualizacao_api.CONSULTAS:
+        assert armazenamento.meses_presentes(str(dados_sinteticos), dataset, 'export', ANO_API) == set(range(1, 10))
+
+    # Rollups e cópias IPC dos anos alterados refletem os meses novos
+    armazem = ArmazemDados(str(dados_sinteticos))
+    for dataset in ('fatos', 'uf'):
+        agosto = armazem.consultar(dataset, 'export', ANO_API, 8, ANO_API, 8)
+        assert agosto['VL_FOB'].sum() == _soma_da_api(api, 'fatos', 'export', 8)
+    assert os.path.exists(armazenamento.caminho_ipc(str(dados_sinteticos), 'pais_ncm', 'import', ANO_API))
+
+
+def test_segunda_execucao_nao_consulta_nem_grava(dados_sinteticos):
+    with _api(dados_sinteticos) as api:
+        atualizacao_api.atualizar(str(dados_sinteticos), api.url)
+        versao = armazenamento.versao_dados(str(dados_sinteticos))
+        api.requisicoes.clear()
+        assert atualizacao_api.atualizar(str(dados_sinteticos), api.url) == []
+
+    assert api.caminhos('POST') == []
+    assert armazenamento.versao_dados(str(dados_sinteticos)) == versao
+
+
+def test_repete_consultas_que_falharam(dados_sinteticos):
+    with _api(dados_sinteticos, falhas=2) as api:
+        gravados = atualizacao_api.atualizar(str(dados_sinteticos), api.url)
+
+    assert sorted(gravados) == sorted(MESES_NOVOS)
+    assert len(api.caminhos('POST')) == len(MESES_NOVOS) + 2
+
+
+def test_respeita_retry_after(dados_sinteticos):
+    with _api(dados_sinteticos, falhas=1, retry_after='1') as api:
+        inicio = time.perf_counter()
+        atualizacao_api.atualizar(str(dados_sinteticos), api.url)
+    assert time.perf_counter() - inicio >= 1
+
+
+def test_falha_persistente_nao_grava_meses_pela_metade(dados_sinteticos, monkeypatch):
+    monkeypatch.setattr(atualizacao_api, 'TENTATIVAS', 1)  # sem o backoff de vários segundos
+    versao = armazenamento.versao_dados(str(dados_sinteticos))
+    with _api(dados_sinteticos, falhas=10**6) as api:
+        with pytest.raises(requests.exceptions.RetryError):
+            atualizacao_api.atualizar(str(dados_sinteticos), api.url)
+
+    # Cada consulta iniciada foi feita duas vezes (a original e uma retentativa); as demais foram canceladas
+    assert api.caminhos('POST') and len(api.caminhos('POST')) % 2 == 0
+
+    assert armazenamento.versao_dados(str(dados_sinteticos)) == versao
+    assert not (dados_sinteticos / atualizacao_api.NOME_PENDENCIAS).exists()
+
+
+def test_pendencia_de_execucao_interrompida_e_concluida(dados_sinteticos):
+    with _api(dados_sinteticos) as api:
+        # Meses anexados, mas a execução parou antes de refazer rollups e IPC
+        corpo = {'flow': 'export', 'period': {'from': f"{ANO_API}-08"}, 'details': ['ncm', 'country', 'state']}
+        tabela = atualizacao_api._tabela_da_resposta(api.linhas(corpo), 'fatos')
+        atualizacao_api._registrar_pendencias(str(dados_sinteticos), {'export': {ANO_API}})
+        armazenamento.anexar_meses(str(dados_sinteticos), 'fatos', 'export', tabela, f"parte-{ANO_API}-08")
+        assert ArmazemDados(str(dados_sinteticos)).consultar('uf', 'export', ANO_API, 8, ANO_API, 8).empty
+
+        atualizacao_api.atualizar(str(dados_sinteticos), api.url)
+
+    assert not (dados_sinteticos / atualizacao_api.NOME_PENDENCIAS).exists()
+    agosto = ArmazemDados(str(dados_sinteticos)).consultar('uf', 'export', ANO_API, 8, ANO_API, 8)
+    assert agosto['VL_FOB'].sum() == _soma_da_api(api, 'fatos', 'export', 8)
+
+
+def test_pasta_sem_particoes_falha_antes_de_consultar_a_api(dados_sinteticos):
+    shutil.rmtree(dados_sinteticos / 'fatos')
+    with _api(dados_sinteticos) as api:
+        with pytest.raises(FileNotFoundError, match='preprocessamento.py'):
+            atualizacao_api.atualizar(str(dados_sinteticos), api.url)
+
+    assert api.requisicoes == []
+    assert not (dados_sinteticos / atualizacao_api.NOME_PENDENCIAS).exists()
@@ -0,0 +1,48 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from cache_resultados import CacheResultados, tamanho_em_bytes
+
+
+class Figura:
+    """Objeto sem ``nbytes``, como as figuras do plotly."""
+
+    def __init__(self, pontos):
+        self.dados = list(range(pontos))
+
+
+def _arquivos(diretorio):
+    return sorted(nome for nome in os.listdir(diretorio) if nome.endswith('.pkl'))
+
+
+def test_resultado_volta_da_memoria_e_do_disco(tmp_path):
+    cache = CacheResultados(str(tmp_path), limite_memoria_mb=1, limite_disco_mb=1)
+    df = pd.DataFrame({'valor': [1.0, 2.0]})
+    assert cache.obter('a', lambda: df) is df
+    assert cache.obter('a', lambda: None) is df
+    cache.concluir_gravacoes()
+
+    outro_processo = CacheResultados(str(tmp_path), limite_memoria_mb=1, limite_disco_mb=1)
+    pd.testing.assert_frame_equal(outro_processo.obter('a', lambda: None), df)
+    assert outro_processo.estatisticas()['Acertos (disco)'] == 1
+
+
+def test_resultado_maior_que_o_disco_nao_expulsa_os_demais(tmp_path):
+    cache = CacheResultados(str(tmp_path), limite_memoria_mb=8, limite_disco_mb=1)
+    for chave in ('a', 'b'):
+        cache.obter(chave, lambda: np.zeros(1000))
+    cache.concluir_gravacoes()
+    antes = _arquivos(tmp_path)
+    assert len(antes) == 2
+
+    cache.obter('grande', lambda: np.zeros(2**18))  # 2 MB
+    cache.concluir_gravacoes()
+    assert _arquivos(tmp_path) == antes
+    assert cache.obter('grande', lambda: None) is not None  # continua em memória
+
+
+def test_tamanho_de_objetos_sem_nbytes_pelo_pickle():
+    assert tamanho_em_bytes(Figura(100_000)) > 100_000
+    assert tamanho_em_bytes({'figura': Figura(10), 'linhas': np.zeros(10)}) > 80
@@ -0,0 +1,25 @@
+import armazenamento
+import referencias
+
+
+def test_tarifados_normalizados(tmp_path):
+    caminho = tmp_path / referencias.NOME_NCM_TARIFADOS
+    caminho.write_text("CO_NCM\n84713012\n1012100\n8471.30.19\n\nabc\n 02013000 \n", encoding='utf-8')
+    assert referencias.carregar_ncm_tarifados(caminho) == {'84713012', '01012100', '84713019', '02013000'}
+
+
+def test_compilado_reaproveitado_ate_a_origem_mudar(dados_sinteticos):
+    primeiro = referencias.carregar(str(dados_sinteticos))
+    assert referencias.carregar(str(dados_sinteticos)).assinatura == primeiro.assinatura
+
+    caminho = dados_sinteticos / referencias.NOME_NCM_TARIFADOS
+    caminho.write_text("CO_NCM\n1012100\n", encoding='utf-8')
+    assert referencias.carregar(str(dados_sinteticos)).ncm_tarifados == {'01012100'}
+
+
+def test_compilar_nao_muda_a_versao_dos_dados(dados_sinteticos):
+    versao = armazenamento.versao_dados(str(dados_sinteticos))
+    (dados_sinteticos / referencias.NOME_COMPILADO).unlink(missing_ok=True)
+    referencias.compilar(str(dados_sinteticos))
+    (dados_sinteticos / 'referencias.pkl.abc.tmp').write_bytes(b'parcial')
+    assert armazenamento.versao_dados(str(dados_sinteticos)) == versao
@@ -0,0 +1,150 @@
+import hashlib
+import os
+
+import pytest
+import requests
+
+import sincronizacao
+from servidor_local import ServidorLocal, servir_arquivos
+
+
+def _publicar(diretorio, arquivos, versao):
+    """Grava os arquivos e o manifesto de uma release em ``diretorio``."""
+    os.makedirs(diretorio, exist_ok=True)
+    for nome, conteudo in arquivos.items():
+        with open(os.path.join(diretorio, nome), 'wb') as arquivo:
+            arquivo.write(conteudo)
+    sincronizacao._gravar_manifesto(diretorio, sincronizacao.gerar_manifesto(diretorio, versao))
+
+
+def _ler(caminho):
+    with open(caminho, 'rb') as arquivo:
+        return arquivo.read()
+
+
+@pytest.fixture
+def release(tmp_path):
+    diretorio = tmp_path / 'release'
+    _publicar(diretorio, {'PAIS.csv': b'CO_PAIS;NO_PAIS\n249;Estados Unidos\n', 'NCM.csv': b'CO_NCM\n01011000\n'}, 'v1')
+    return diretorio
+
+
+def _sincronizar(servidor, dados, **opcoes):
+    return sincronizacao.sincronizar(str(dados), f"{servidor.url}/manifesto.json", preparar_derivados=False, **opcoes)
+
+
+def test_download_retomado_pelo_range(tmp_path):
+    conteudo = os.urandom(100_000)
+    (tmp_path / 'release').mkdir()
+    (tmp_path / 'release' / 'fatos.bin').write_bytes(conteudo)
+    destino = tmp_path / 'fatos.bin'
+    (tmp_path / 'fatos.bin.part').write_bytes(conteudo[:40_000])  # download interrompido
+
+    with ServidorLocal(servir_arquivos(tmp_path / 'release')) as servidor:
+        sincronizacao.baixar_arquivo(requests.Session(), f"{servidor.url}/fatos.bin", str(destino),
+                                     hashlib.sha256(conteudo).hexdigest(), len(conteudo))
+
+    assert _ler(destino) == conteudo
+    assert not (tmp_path / 'fatos.bin.part').exists()
+    assert [requisicao['cabecalhos'].get('Range') for requisicao in servidor.requisicoes] == ['bytes=40000-']
+
+
+def test_checksum_invalido_descarta_o_arquivo(tmp_path, release):
+    destino = tmp_path / 'PAIS.csv'
+    with ServidorLocal(servir_arquivos(release)) as servidor:
+        with pytest.raises(sincronizacao.ErroSincronizacao, match='Checksum'):
+            sincronizacao.baixar_arquivo(requests.Session(), f"{servidor.url}/PAIS.csv", str(destino), '0' * 64)
+    assert not destino.exists()
+    assert not (tmp_path / 'PAIS.csv.part').exists()
+
+
+def test_primeira_sincronizacao_troca_o_staging(tmp_path, release):
+    dados = tmp_path / 'dados'
+    with ServidorLocal(servir_arquivos(release)) as servidor:
+        baixados = _sincronizar(servidor, dados)
+
+    assert sorted(baixados) == ['NCM.csv', 'PAIS.csv']
+    assert _ler(dados / 'PAIS.csv') == _ler(release / 'PAIS.csv')
+    assert sincronizacao.ler_manifesto_local(str(dados))['versao'] == 'v1'
+    assert sincronizacao.dados_completos(str(dados))
+    assert not (tmp_path / 'dados.staging').exists()
+    assert not (tmp_path / 'dados.antigo').exists()
+
+
+def test_so_baixa_os_arquivos_alterados(tmp_path, release):
+    dados = tmp_path / 'dados'
+    with ServidorLocal(servir_arquivos(release)) as servidor:
+        _sincronizar(servidor, dados)
+        _publicar(release, {'NCM.csv': b'CO_NCM\n01011000\n84713012\n'}, 'v2')
+        servidor.requisicoes.clear()
+        baixados = _sincronizar(servidor, dados)
+
+    assert baixados == ['NCM.csv']
+    assert servidor.caminhos() == ['/manifesto.json', '/NCM.csv']
+    assert _ler(dados / 'NCM.csv') == b'CO_NCM\n01011000\n84713012\n'
+    assert sincronizacao.ler_manifesto_local(str(dados))['versao'] == 'v2'
+
+
+def test_recupera_troca_interrompida(tmp_path, release):
+    dados = tmp_path / 'dados'
+    with ServidorLocal(servir_arquivos(release)) as servidor:
+        _sincronizar(servidor, dados)
+        os.replace(dados, tmp_path / 'dados.antigo')  # interrompido entre os dois renames
+        servidor.requisicoes.clear()
+        baixados = _sincronizar(servidor, dados)
+
+    assert baixados == []
+    assert servidor.caminhos() == ['/manifesto.json']
+    assert sincronizacao.dados_completos(str(dados))
+    assert not (tmp_path / 'dados.antigo').exists()
+
+
+def test_pasta_local_sem_manifesto_e_adotada(tmp_path, release):
+    dados = tmp_path / 'dados'
+    dados.mkdir()
+    (dados / 'export_historico.parquet').write_bytes(b'gerado localmente')
+
+    with ServidorLocal(servir_arquivos(release)) as servidor:
+        assert _sincronizar(servidor, dados) == []
+        assert servidor.requisicoes == []
+        assert (dados / 'export_historico.parquet').read_bytes() == b'gerado localmente'
+        assert sincronizacao.ler_manifesto_local(str(dados))['versao'] == sincronizacao.VERSAO_LOCAL
+        assert sincronizacao.dados_completos(str(dados))
+
+        baixados = _sincronizar(servidor, dados, substituir_local=True)
+
+    assert sorted(baixados) == ['NCM.csv', 'PAIS.csv']
+    assert not (dados / 'export_historico.parquet').exists()
+
+
+def test_staging_so_reaproveita_arquivos_conferidos(tmp_path, release):
+    dados = tmp_path / 'dados'
+    staging = tmp_path / 'dados.staging'
+    staging.mkdir()
+    # Restos de uma tentativa interrompida da mesma release: um arquivo com o tamanho certo e conteúdo errado
+    (tmp_path / 'dados.staging.versao').write_text('v1', encoding='utf-8')
+    (staging / 'PAIS.csv').write_bytes(b'x' * len(_ler(release / 'PAIS.csv')))
+    (staging / 'NCM.csv').write_bytes(_ler(release / 'NCM.csv'))
+
+    with ServidorLocal(servir_arquivos(release)) as servidor:
+        baixados = _sincronizar(servidor, dados)
+
+    assert baixados == ['PAIS.csv']
+    assert _ler(dados / 'PAIS.csv') == _ler(release / 'PAIS.csv')
+    assert not (tmp_path / 'dados.staging.versao').exists()
+
+
+def test_staging_de_outra_release_e_descartado(tmp_path, release):
+    dados = tmp_path / 'dados'
+    staging = tmp_path / 'dados.staging'
+    staging.mkdir()
+    (tmp_path / 'dados.staging.versao').write_text('v0', encoding='utf-8')
+    (staging / 'NCM.csv').write_bytes(_ler(release / 'NCM.csv'))
+    (staging / 'sobra_da_v0.csv').write_bytes(b'antigo')
+
+    with ServidorLocal(servir_arquivos(release)) as servidor:
+        baixados = _sincronizar(servidor, dados)
+
+    assert sorted(baixados) == ['NCM.csv', 'PAIS.csv']
+    assert not (dados / 'sobra_da_v0.csv').exists()
+    assert sincronizacao.dados_completos(str(dados))
@@ -0,0 +1,64 @@
+import shutil
+
+import numpy as np
+import pyarrow as pa
+import pytest
+
+import armazenamento
+import tabelas
+from armazem_compartilhado import ArmazemDados, Lotes
+
+PERIODO = (2023, 3, 2024, 5)
+MAPA_PAIS = {'105': 'Brasil', '249': 'Estados Unidos', '160': 'China'}
+
+
+def _lotes():
+    # Dicionários diferentes em cada lote, como em anos diferentes dos arquivos IPC
+    lotes = [
+        pa.record_batch({'CO_PAIS': pa.array(['249', '160', '249']).dictionary_encode(), 'VL_FOB': [30, 10, 20]}),
+        pa.record_batch({'CO_PAIS': pa.array(['105', '160']).dictionary_encode(), 'VL_FOB': [50, 40]}),
+    ]
+    return Lotes(lotes, lotes[0].schema)
+
+
+def test_take_copia_so_as_linhas_pedidas_na_ordem_pedida():
+    linhas = _lotes().take([4, 0, 3, 1], ['VL_FOB'])
+    assert linhas.column_names == ['VL_FOB']
+    assert linhas['VL_FOB'].to_pylist() == [40, 30, 50, 10]
+
+
+def test_ordenar_posicoes_pelos_nomes_dos_codigos():
+    lotes = _lotes()
+    posicoes = np.array([0, 1, 3, 4], dtype='int32')
+    ordem = tabelas.ordenar(lotes, [('CO_PAIS', MAPA_PAIS), 'VL_FOB'], posicoes=posicoes)
+    assert lotes.take(ordem)['VL_FOB'].to_pylist() == [50, 10, 40, 30]
+    assert len(tabelas.ordenar(lotes, ['VL_FOB'], posicoes=posicoes[:0])) == 0
+
+
+@pytest.mark.parametrize('com_ipc', [True, False])
+def test_recorte_por_posicoes_igual_a_leitura_do_parquet(dados_sinteticos, com_ipc):
+    if not com_ipc:
+        shutil.rmtree(dados_sinteticos / 'ipc')
+    lotes = ArmazemDados(str(dados_sinteticos)).lotes('fatos', 'export', *PERIODO, sg_uf='SP')
+    posicoes = lotes.filtrar(armazenamento.filtro_consulta(*PERIODO, sg_uf='SP'))
+    esperado = armazenamento.ler_fatos(str(dados_sinteticos), 'export', *PERIODO, sg_uf='SP')
+
+    ordem = tabelas.ordenar(lotes, ['VL_FOB'], ascendente=False, posicoes=posicoes)
+    pagina = tabelas.pagina(lotes, ordem, 1, 50, lambda linhas: tabelas.formatar_fatos(linhas, MAPA_PAIS, {}))
+    assert len(ordem) == len(esperado) > 50
+    assert pagina['Valor FOB (US$)'].tolist() == esperado['VL_FOB'].sort_values(ascending=False).head(50).tolist()
+    assert set(pagina['UF']) == {'SP'}
+
+
+def test_versao_dos_lotes_acompanha_os_arquivos_lidos(dados_sinteticos):
+    shutil.rmtree(dados_sinteticos / 'ipc')
+    armazem = ArmazemDados(str(dados_sinteticos))
+    planos = armazem.lotes('fatos', 'export', *PERIODO, cod_pais='249')
+    assert armazem.lotes('fatos', 'export', *PERIODO, cod_pais='249').versao == planos.versao
+    assert armazem.lotes('fatos', 'export', *PERIODO).versao != planos.versao
+
+    # O preparo em segundo plano grava o IPC: os lotes passam a ser os anos inteiros
+    armazenamento.exportar_ipc(str(dados_sinteticos), 'fatos', 'export')
+    anos_inteiros = armazem.lotes('fatos', 'export', *PERIODO, cod_pais='249')
+    assert len(anos_inteiros) > len(planos)
+    assert anos_inteiros.versao != planos.versao